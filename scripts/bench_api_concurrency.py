@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the sloptimize API
+
+Measures latency of `GET /jobs/{id}/status` and the health check while worker
+processes continuously write results to the same sqlite database. The API is
+driven in-process over ASGI so that any blocking on the event loop shows up
+directly in the measured latencies.
+
+Run with `--blocking` to execute Database calls inline on the event loop, which
+reproduces the behaviour before the async data-access layer for comparison.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent / '..' / 'src'))
+
+
+def writer_loop(db_path: str, job_id: str, stop_at: float) -> None:
+    """Simulate a worker saving results and progress as fast as it can"""
+    from sloptimize.database import Database
+
+    db = Database(db_path)
+    code = "def f(x):\n    return x\n" * 200
+    written = 0
+    while time.time() < stop_at:
+        db.save_file_result(
+            job_id=job_id,
+            file_path=f"pkg/module_{written}.py",
+            original_code=code,
+            optimized_code=code,
+            score=5.0,
+            metrics={"performance_gain": "none"},
+            integration_considerations=["none"],
+        )
+        written += 1
+        db.update_job_progress(job_id, written + 1, written)
+
+
+class BlockingDatabase:
+    """Runs Database methods directly on the event loop, like the original handlers"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+
+        async def method(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return method
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_clients(app, path: str, concurrency: int, duration: float) -> list[float]:
+    """Issue requests from `concurrency` clients for `duration` seconds, returning latencies in ms"""
+    import httpx
+
+    latencies: list[float] = []
+    stop_at = time.perf_counter() + duration
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def client_loop():
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+                # In-process requests may never suspend; yield so clients interleave
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--blocking", action="store_true")
+    args = parser.parse_args()
+
+    db_path = str(Path(tempfile.mkdtemp()) / "bench.db")
+    # Configure before any sloptimize import; the writer processes inherit the environment.
+    # No LLM is called, but importing sloptimize creates the provider's client
+    os.environ.update({"SLOPTIMIZE_DB_PATH": db_path, "LLM_PROVIDER": "fake"})
+
+    from sloptimize.api import main as api
+    from sloptimize.database import Database
+
+    if args.blocking:
+        api.db = BlockingDatabase(Database(db_path))
+
+    job_id = Database(db_path).create_job("https://example.com/bench.git")
+
+    stop_at = time.time() + args.duration + 1
+    writers = [
+        multiprocessing.Process(target=writer_loop, args=(db_path, job_id, stop_at))
+        for _ in range(args.writers)
+    ]
+    for writer in writers:
+        writer.start()
+
+    async def measure():
+        return await asyncio.gather(
+            run_clients(api.app, f"/jobs/{job_id}/status", args.concurrency, args.duration),
+            run_clients(api.app, "/", 1, args.duration),
+        )
+
+    status_latencies, health_latencies = asyncio.run(measure())
+
+    for writer in writers:
+        writer.join()
+
+    report = {
+        "mode": "blocking" if args.blocking else "async",
+        "concurrency": args.concurrency,
+        "writers": args.writers,
+        "duration_s": args.duration,
+    }
+    for name, samples in (("status", status_latencies), ("health", health_latencies)):
+        report[name] = {
+            "requests": len(samples),
+            "rps": round(len(samples) / args.duration, 1),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "max_ms": round(max(samples), 2),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Serialization microbenchmark for the sloptimize API hot endpoints
+
+Seeds a throwaway database with jobs and results, then measures requests/s for
+`GET /jobs` and `GET /jobs/{id}/results` driven in-process over ASGI. The job is
+left in `processing` so the completed-job response cache does not short-circuit
+the serialization being measured.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent / '..' / 'src'))
+
+
+def seed(db, jobs: int, results: int) -> str:
+    """Create `jobs` jobs and attach `results` results to the first one"""
+    from sloptimize.database import JobStatus
+
+    job_ids = [db.create_job(f"https://example.com/repo_{index}.git") for index in range(jobs)]
+    job_id = job_ids[0]
+    db.update_job_status(job_id, JobStatus.PROCESSING)
+    for index in range(results):
+        db.save_file_result(
+            job_id=job_id,
+            file_path=f"pkg/module_{index}.py",
+            original_code="def f(x):\n    return x\n",
+            optimized_code="def f(x):\n    return x\n",
+            score=float(index % 10),
+            metrics={
+                "complexity_improvement": "Flattened nested conditionals",
+                "readability_score": "Improved variable naming",
+                "performance_gain": None,
+            },
+            integration_considerations=[
+                "Method signature changed: `f(x)` now requires a keyword argument",
+                "Remove the unused `typing.List` import",
+            ],
+        )
+    return job_id
+
+
+async def measure(app, path: str, duration: float, concurrency: int) -> dict:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    completed = 0
+    stop_at = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def client_loop():
+            nonlocal completed
+            while time.perf_counter() < stop_at:
+                response = await client.get(path)
+                response.raise_for_status()
+                completed += 1
+                await asyncio.sleep(0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {"requests": completed, "rps": round(completed / elapsed, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--results", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    # Configure before any sloptimize import; no LLM is called, but importing sloptimize creates the provider's client
+    os.environ.update({
+        "SLOPTIMIZE_DB_PATH": str(Path(tempfile.mkdtemp()) / "bench.db"),
+        "LLM_PROVIDER": "fake",
+    })
+
+    from sloptimize.api import main as api
+
+    job_id = seed(api.db.db, args.jobs, args.results)
+
+    async def run():
+        return {
+            "/jobs": await measure(api.app, "/jobs", args.duration, args.concurrency),
+            "/jobs/{id}/results": await measure(
+                api.app, f"/jobs/{job_id}/results", args.duration, args.concurrency
+            ),
+        }
+
+    report = {"jobs": args.jobs, "results": args.results, **asyncio.run(run())}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline benchmark for the sloptimize worker
+
+Generates synthetic repositories, uploads each as a `.tar.gz` job and runs
+`RepositoryProcessor` over it with the fake LLM provider, so the measurement
+covers extraction, discovery, scheduling and database writes without network
+calls or provider cost. Each repository size runs in a fresh process so peak RSS
+is per run. Prints a JSON report with files/s, per-file latency percentiles, DB
+write counts and peak RSS, suitable for comparing between commits.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent / '..' / 'src'))
+
+# Top-level statements that modify the database, with the table they write to;
+# statements run by triggers and FTS internals are traced with a leading "--"
+WRITE_STATEMENT = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+(\w+)", re.IGNORECASE
+)
+FILES_PER_PACKAGE = 100
+
+
+def synthetic_module(index: int, functions: int) -> str:
+    """Source for one generated module, varied by index so every file is distinct"""
+    body = [f'"""Generated module {index}"""\n']
+    for function in range(functions):
+        body.append(
+            f"\ndef handler_{index}_{function}(items):\n"
+            f"    result = []\n"
+            f"    for item in items:\n"
+            f"        if item is not None and item != {function}:\n"
+            f"            result.append(item * {index % 7 + 1})\n"
+            f"    return result\n"
+        )
+    return "".join(body)
+
+
+def write_archive(path: Path, files: int, functions: int) -> None:
+    """Write a `.tar.gz` repository of `files` modules spread over packages"""
+    with tarfile.open(path, "w:gz") as archive:
+        for index in range(files):
+            data = synthetic_module(index, functions).encode("utf-8")
+            info = tarfile.TarInfo(f"repo/pkg_{index // FILES_PER_PACKAGE}/module_{index}.py")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def run_once(files: int, functions: int) -> dict:
+    """Process one synthetic repository of `files` files and measure it; runs in a fresh process"""
+    from sloptimize.database import Database
+    from sloptimize.worker.main import RepositoryProcessor
+
+    writes = {"transactions": 0, "rows": 0, "by_table": {}}
+
+    class CountingDatabase(Database):
+        """Counts write transactions, the rows they change and the tables they touch"""
+
+        @contextlib.contextmanager
+        def _connect(self, check_same_thread: bool = True):
+            tables = set()
+
+            def trace(statement: str):
+                match = WRITE_STATEMENT.match(statement)
+                if match:
+                    tables.add(match.group(1).lower())
+
+            with super()._connect(check_same_thread) as conn:
+                conn.set_trace_callback(trace)
+                yield conn
+                # Includes rows changed by triggers, such as the full-text index
+                changes = conn.total_changes
+            if changes:
+                writes["transactions"] += 1
+                writes["rows"] += changes
+                for table in tables:
+                    writes["by_table"][table] = writes["by_table"].get(table, 0) + 1
+
+    latencies = []
+
+    class TimedProcessor(RepositoryProcessor):
+        """Times each file from reading it to saving its result, excluding time queued"""
+
+        def __init__(self, job_id: str, repo_url: str):
+            super().__init__(job_id, repo_url)
+            self.db = CountingDatabase()
+
+        async def _process_single_file(self, file_path: Path):
+            started = time.perf_counter()
+            await super()._process_single_file(file_path)
+            latencies.append(time.perf_counter() - started)
+
+    archive_path = Path(tempfile.mkdtemp()) / "repo.tar.gz"
+    write_archive(archive_path, files, functions)
+    db = Database()
+    job_id = db.create_jobs([{'repo_url': f"bench:{files}", 'source_archive': str(archive_path)}])[0]
+
+    processor = TimedProcessor(job_id, f"bench:{files}")
+    started = time.perf_counter()
+    # The worker reports per-file errors on stdout; injected errors would flood the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(processor.process())
+    elapsed = time.perf_counter() - started
+
+    job = db.get_job(job_id)
+    latencies.sort()
+    saved = db.get_job_stats(job_id)["result_count"]
+    return {
+        "files": files,
+        "status": job["status"],
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(files / elapsed, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "failed_files": files - saved,
+        "db_write_transactions": writes["transactions"],
+        "db_rows_written": writes["rows"],
+        "db_write_transactions_by_table": dict(sorted(writes["by_table"].items())),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 1000, 10000],
+                        help="Repository sizes to run, from 10 to 50000 files")
+    parser.add_argument("--functions", type=int, default=5, help="Functions per generated module")
+    parser.add_argument("--latency-median", type=float, default=0.02, help="Median provider latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal sigma of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Streamed output rate (0 is instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of provider calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for files in args.files:
+        if not 10 <= files <= 50000:
+            parser.error("--files sizes must be between 10 and 50000")
+
+    # Configure before any sloptimize import; worker processes inherit the environment
+    os.environ.update({
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY_MEDIAN": str(args.latency_median),
+        "FAKE_LLM_LATENCY_SIGMA": str(args.latency_sigma),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "FAKE_LLM_ERROR_RATE": str(args.error_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+        # Generated packages add directory entries on top of the files
+        "ARCHIVE_MAX_FILES": str(max(args.files) * 2),
+    })
+
+    runs = []
+    for files in args.files:
+        os.environ["SLOPTIMIZE_DB_PATH"] = str(Path(tempfile.mkdtemp()) / "bench.db")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            runs.append(pool.submit(run_once, files, args.functions).result())
+
+    report = {
+        "commit": current_commit(),
+        "provider": {
+            "latency_median": args.latency_median,
+            "latency_sigma": args.latency_sigma,
+            "tokens_per_second": args.tokens_per_second,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+        },
+        "functions_per_file": args.functions,
+        "runs": runs,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test for the sloptimize API
+
+Drives a weighted mix of submit, status-poll, results-fetch and summary traffic
+from many concurrent virtual users, either in-process over ASGI (the default)
+or against a running server with `--url`. Submissions upload a small generated
+archive, so no repository is cloned, and in-process runs use the fake LLM
+provider and a fresh database, so the workers the API starts process real jobs
+without network calls or cost. Each virtual user sends its own `X-Real-IP`,
+keeping per-client quotas from throttling the whole test; a server run with
+`--url` must list the load generator in `TRUSTED_PROXIES` for that to apply.
+
+Prints a JSON report with throughput, latency percentiles, status codes and
+error rates per endpoint, plus how the submitted jobs ended. `--soak` also
+prints a JSON line every `--report-interval` seconds with that interval's
+throughput, errors, database lock errors and the API's resident memory, and adds
+the timeline and memory growth to the report.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add the src directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent / '..' / 'src'))
+
+ENDPOINTS = ("submit", "status", "results", "summary")
+DEFAULT_MIX = "submit=1,status=10,results=4,summary=2"
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse `endpoint=weight,...` into relative weights"""
+    mix = {}
+    for part in text.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {endpoint!r}; expected one of {', '.join(ENDPOINTS)}")
+        mix[endpoint] = float(weight or 1)
+    if "submit" not in mix or mix["submit"] <= 0:
+        raise argparse.ArgumentTypeError("the mix needs submit traffic to create jobs to poll")
+    return mix
+
+
+def synthetic_archive(files: int) -> bytes:
+    """A small zip repository of distinct modules to upload"""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for index in range(files):
+            zf.writestr(
+                f"pkg/module_{index}.py",
+                f"def handler_{index}(items):\n"
+                f"    result = []\n"
+                f"    for item in items:\n"
+                f"        result.append(item * {index + 1})\n"
+                f"    return result\n",
+            )
+    return archive.getvalue()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Current resident memory of a process, from /proc on Linux"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def is_lock_error(error: BaseException) -> bool:
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+
+class EndpointStats:
+    """Latencies, status codes and errors of one endpoint"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.status_codes: Counter = Counter()
+        self.exceptions: Counter = Counter()
+        self.db_lock_errors = 0
+
+    def record(self, latency: float, status_code: Optional[int] = None, error: Optional[BaseException] = None):
+        self.latencies.append(latency)
+        if error is not None:
+            self.exceptions[type(error).__name__] += 1
+            self.db_lock_errors += is_lock_error(error)
+        else:
+            self.status_codes[status_code] += 1
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def errors(self) -> int:
+        """Server errors and failed requests; 429 rejections are admission control working, not errors"""
+        return sum(self.exceptions.values()) + sum(
+            count for code, count in self.status_codes.items() if code >= 500
+        )
+
+    def report(self, duration: float) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "rps": round(self.requests / duration, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000 if latencies else 0.0, 2),
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "status_codes": {str(code): count for code, count in sorted(self.status_codes.items())},
+            "exceptions": dict(self.exceptions),
+        }
+
+
+class LoadTest:
+    """Virtual users issuing requests from a weighted endpoint mix"""
+
+    def __init__(self, client, mix: Dict[str, float], archive: bytes, seed: int):
+        self.client = client
+        self.endpoints = list(mix)
+        self.weights = list(mix.values())
+        self.archive = archive
+        self.random = random.Random(seed)
+        self.job_ids: List[str] = []
+        self.stats = {endpoint: EndpointStats() for endpoint in mix}
+        # Replaced at each soak report, so they hold that interval's requests only
+        self.interval_stats = {endpoint: EndpointStats() for endpoint in mix}
+
+    async def request(self, endpoint: str, user: int):
+        if endpoint != "submit" and not self.job_ids:
+            endpoint = "submit"
+        headers = {"X-Real-IP": f"10.{user // 65536 % 256}.{user // 256 % 256}.{user % 256}"}
+        if endpoint == "submit":
+            call = self.client.post(
+                "/upload-repository?name=load-test", content=self.archive, headers=headers,
+            )
+        else:
+            job_id = self.random.choice(self.job_ids)
+            path = {
+                "status": f"/jobs/{job_id}/status",
+                "results": f"/jobs/{job_id}/results?limit=20",
+                "summary": f"/jobs/{job_id}/summary",
+            }[endpoint]
+            call = self.client.get(path, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            response = await call
+        except Exception as e:
+            latency = time.perf_counter() - started
+            for stats in (self.stats, self.interval_stats):
+                stats[endpoint].record(latency, error=e)
+            return
+        latency = time.perf_counter() - started
+        for stats in (self.stats, self.interval_stats):
+            stats[endpoint].record(latency, response.status_code)
+        if endpoint == "submit" and response.status_code == 200:
+            self.job_ids.append(response.json()["job_id"])
+
+    async def user(self, index: int, stop_at: float, think_time: float):
+        while time.perf_counter() < stop_at:
+            endpoint = self.random.choices(self.endpoints, self.weights)[0]
+            await self.request(endpoint, index)
+            # In-process requests may never suspend; always yield so users interleave
+            await asyncio.sleep(think_time)
+
+    def take_interval(self) -> Dict[str, EndpointStats]:
+        stats, self.interval_stats = self.interval_stats, {endpoint: EndpointStats() for endpoint in self.endpoints}
+        return stats
+
+
+async def job_outcomes(client, job_ids: List[str]) -> Dict[str, int]:
+    """Statuses of the submitted jobs at the end of the run"""
+    response = await client.get("/jobs")
+    if response.status_code != 200:
+        return {}
+    submitted = set(job_ids)
+    return dict(Counter(job["status"] for job in response.json() if job["job_id"] in submitted))
+
+
+async def soak_monitor(test: LoadTest, interval: float, server_pid: Optional[int], timeline: List[dict]):
+    started = time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        stats = test.take_interval()
+        point = {
+            "elapsed_s": round(time.perf_counter() - started, 1),
+            "rps": round(sum(s.requests for s in stats.values()) / interval, 1),
+            "errors": sum(s.errors for s in stats.values()),
+            "db_lock_errors": sum(s.db_lock_errors for s in stats.values()),
+            "p99_ms": {
+                endpoint: round(percentile(sorted(s.latencies), 0.99) * 1000, 2) for endpoint, s in stats.items()
+            },
+            "rss_mb": rss_mb(server_pid) if server_pid else None,
+            "jobs_submitted": len(test.job_ids),
+        }
+        timeline.append(point)
+        print(json.dumps(point), file=sys.stderr, flush=True)
+
+
+async def run(args, client, server_pid: Optional[int]) -> dict:
+    test = LoadTest(client, args.mix, synthetic_archive(args.files_per_job), args.seed)
+    timeline: List[dict] = []
+    rss_start = rss_mb(server_pid) if server_pid else None
+
+    monitor = None
+    if args.soak:
+        monitor = asyncio.create_task(soak_monitor(test, args.report_interval, server_pid, timeline))
+
+    started = time.perf_counter()
+    stop_at = started + args.duration
+    await asyncio.gather(*(test.user(index, stop_at, args.think_time) for index in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    if monitor:
+        monitor.cancel()
+
+    report = {
+        "target": args.url or "asgi",
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 1),
+        "mix": args.mix,
+        "endpoints": {endpoint: stats.report(elapsed) for endpoint, stats in test.stats.items()},
+        "total_rps": round(sum(stats.requests for stats in test.stats.values()) / elapsed, 1),
+        "db_lock_errors": sum(stats.db_lock_errors for stats in test.stats.values()) if not args.url else None,
+        "jobs": await job_outcomes(client, test.job_ids),
+    }
+    if args.soak:
+        rss_end = rss_mb(server_pid) if server_pid else None
+        report["rss_mb"] = {
+            "start": rss_start,
+            "end": rss_end,
+            "growth": round(rss_end - rss_start, 1) if rss_start is not None and rss_end is not None else None,
+        }
+        report["timeline"] = timeline
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running API; by default the app is driven in-process over ASGI")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Relative weights of {', '.join(ENDPOINTS)} requests (default {DEFAULT_MIX})")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds each user waits between requests")
+    parser.add_argument("--files-per-job", type=int, default=5, help="Modules in each uploaded archive")
+    parser.add_argument("--latency-median", type=float, default=0.2,
+                        help="Median fake provider latency in seconds, for in-process runs")
+    parser.add_argument("--soak", action="store_true", help="Report throughput, errors and memory over time")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between soak reports")
+    parser.add_argument("--server-pid", type=int, help="With --url, the API process whose memory --soak tracks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        import httpx
+
+        async def run_http():
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+                return await run(args, client, args.server_pid)
+
+        report = asyncio.run(run_http())
+    else:
+        report = run_in_process(args)
+    print(json.dumps(report, indent=2))
+
+
+def run_in_process(args) -> dict:
+    """Run against the app over ASGI with a fresh database and the fake provider"""
+    work_dir = Path(tempfile.mkdtemp())
+    # Configure before any sloptimize import; the workers the API starts inherit the environment
+    os.environ.update({
+        "SLOPTIMIZE_DB_PATH": str(work_dir / "load-test.db"),
+        "UPLOAD_DIR": str(work_dir / "uploads"),
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY_MEDIAN": str(args.latency_median),
+        "FAKE_LLM_SEED": str(args.seed),
+    })
+
+    import httpx
+    from sloptimize.api import main as api
+
+    async def run_asgi():
+        # App exceptions are raised to the client rather than turned into 500s, so lock errors can be told apart
+        transport = httpx.ASGITransport(app=api.app, raise_app_exceptions=True)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            return await run(args, client, os.getpid())
+
+    try:
+        return asyncio.run(run_asgi())
+    finally:
+        for process in api.worker_processes.values():
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
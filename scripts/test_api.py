@@ -4,7 +4,6 @@ Simple test script for the sloptimize API
 """
 
 import requests
-import time
 import json
 
 API_BASE = "http://localhost:8000"
@@ -31,21 +30,32 @@ def test_api():
         job_id = job_data["job_id"]
         print(f"Job submitted: {job_id}")
         
-        # Monitor job progress
+        # Monitor job progress; the stream ends once the job finishes
         print("\n3. Monitoring job progress...")
-        for i in range(30):  # Wait up to 5 minutes
-            response = requests.get(f"{API_BASE}/jobs/{job_id}/status")
-            if response.status_code == 200:
-                status = response.json()
-                print(f"Status: {status['status']} - Progress: {status['progress_percent']:.1f}%")
-                
-                if status['status'] in ['completed', 'failed']:
-                    break
-                    
-            time.sleep(10)
+        response = requests.get(f"{API_BASE}/jobs/{job_id}/events", stream=True, timeout=300)
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line.removeprefix("event: ")
+            elif line.startswith("data: "):
+                data = json.loads(line.removeprefix("data: "))
+                if event == "status":
+                    print(f"Status: {data['status']}")
+                elif event == "progress":
+                    print(f"Progress: {data['progress_percent']:.1f}%")
+                elif event == "file":
+                    print(f"  Finished {data['file_path']}: score {data['score']}")
+        
+        # Get summary
+        print("\n4. Getting summary...")
+        response = requests.get(f"{API_BASE}/jobs/{job_id}/summary")
+        if response.status_code == 200:
+            summary = response.json()
+            print(f"{summary['result_count']} files, average score {summary['average_score']}")
+            print(f"Metric tallies: {summary['metric_tallies']}")
         
         # Get results
-        print("\n4. Getting results...")
+        print("\n5. Getting results...")
         response = requests.get(f"{API_BASE}/jobs/{job_id}/results?limit=5")
         if response.status_code == 200:
             results = response.json()
@@ -57,7 +67,7 @@ def test_api():
         print(f"Failed to submit job: {response.status_code} - {response.text}")
     
     # Test job listing
-    print("\n5. Testing job listing...")
+    print("\n6. Testing job listing...")
     response = requests.get(f"{API_BASE}/jobs")
     if response.status_code == 200:
         jobs = response.json()
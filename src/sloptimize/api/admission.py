@@ -0,0 +1,128 @@
+"""
+Admission control for repository job submissions
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+from ..database import AsyncDatabase, QueueLimitExceeded
+from ..environment import (
+    MAX_JOBS_PER_CLIENT,
+    MAX_QUEUE_DEPTH,
+    MAX_RETRY_AFTER,
+    QUEUE_DRAIN_WINDOW,
+    TRUSTED_PROXIES,
+)
+
+
+def client_id(request: Request) -> str:
+    """Identify the submitting client by the address nginx saw, falling back to the peer address.
+
+    X-Real-IP is only honored from TRUSTED_PROXIES; anyone else could set it to
+    spread their jobs over made-up clients and get around the per-client quota.
+    """
+    peer = request.client.host if request.client else "unknown"
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip and peer in TRUSTED_PROXIES:
+        return real_ip.strip()
+    return peer
+
+
+class AdmissionController:
+    """Bounds the job queue globally and per client.
+
+    A submission is rejected with 429 when the queue already holds
+    `max_queue_depth` unfinished jobs or the client has `max_jobs_per_client` of
+    its own. Retry-After is estimated from how many jobs finished over the last
+    `drain_window` seconds, so clients back off for roughly as long as it takes
+    the backlog to make room instead of retrying into a full queue.
+
+    `create_jobs` enforces the limits in the transaction that inserts the jobs;
+    `admit` is an early check for requests that have work to do before that.
+    More jobs at once than the limits allow even on an empty queue can never be
+    admitted, so they are refused with 413 and no Retry-After instead.
+    """
+
+    db: AsyncDatabase
+    max_queue_depth: int
+    max_jobs_per_client: int
+    drain_window: float
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        max_queue_depth: int = MAX_QUEUE_DEPTH,
+        max_jobs_per_client: int = MAX_JOBS_PER_CLIENT,
+        drain_window: float = QUEUE_DRAIN_WINDOW,
+    ):
+        self.db = db
+        self.max_queue_depth = max_queue_depth
+        self.max_jobs_per_client = max_jobs_per_client
+        self.drain_window = drain_window
+
+    async def queue_status(self, client: Optional[str] = None) -> Dict[str, Any]:
+        """Current queue depth, drain rate and estimated wait for a newly queued job"""
+        stats = await self.db.get_queue_stats(self.drain_window, client)
+        drain_rate = stats["finished"] / self.drain_window * 60
+        depth = stats["pending"] + stats["processing"]
+
+        return {
+            "pending": stats["pending"],
+            "processing": stats["processing"],
+            "depth": depth,
+            "max_depth": self.max_queue_depth,
+            "client_active": stats["client_active"],
+            "max_per_client": self.max_jobs_per_client,
+            "drain_rate_per_minute": drain_rate,
+            "oldest_pending_seconds": round(stats["oldest_pending_seconds"] or 0.0, 1),
+            "estimated_wait_seconds": self._seconds_to_drain(stats["pending"], drain_rate),
+        }
+
+    async def admit(self, client: str, jobs: int = 1):
+        """Raise 429 if `jobs` more jobs from `client` would exceed the queue or client quota"""
+        status = await self.queue_status(client)
+
+        if status["depth"] + jobs > self.max_queue_depth:
+            excess = status["depth"] + jobs - self.max_queue_depth
+            raise self._rejection("Job queue is full", excess, status["drain_rate_per_minute"])
+        if status["client_active"] + jobs > self.max_jobs_per_client:
+            excess = status["client_active"] + jobs - self.max_jobs_per_client
+            raise self._rejection("Too many unfinished jobs for this client", excess, status["drain_rate_per_minute"])
+
+    async def create_jobs(
+        self, repos: List[Dict[str, Any]], client: str, batch_id: Optional[str] = None
+    ) -> List[str]:
+        """Create jobs for `client` if they fit in the queue and its quota, else raise 429"""
+        capacity = min(self.max_queue_depth, self.max_jobs_per_client)
+        if len(repos) > capacity:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{len(repos)} new jobs exceed the {capacity} a client may have queued; submit smaller batches",
+            )
+        try:
+            return await self.db.create_jobs(
+                repos, client, batch_id,
+                max_queue_depth=self.max_queue_depth, max_jobs_per_client=self.max_jobs_per_client,
+            )
+        except QueueLimitExceeded as e:
+            status = await self.queue_status(client)
+            raise self._rejection(e.detail, e.excess, status["drain_rate_per_minute"])
+
+    def _rejection(self, detail: str, excess: int, drain_rate_per_minute: float) -> HTTPException:
+        retry_after = self._seconds_to_drain(excess, drain_rate_per_minute)
+        return HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(retry_after or MAX_RETRY_AFTER)},
+        )
+
+    @staticmethod
+    def _seconds_to_drain(jobs: int, drain_rate_per_minute: float) -> Optional[int]:
+        """Seconds for `jobs` jobs to finish at the observed rate, or None if nothing has finished lately"""
+        if jobs <= 0:
+            return 0
+        if drain_rate_per_minute <= 0:
+            return None
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(jobs / drain_rate_per_minute * 60)))
@@ -0,0 +1,92 @@
+"""
+HTTP caching for immutable job resources
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+
+from ..environment import RESPONSE_CACHE_BYTES
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+NO_CACHE_CONTROL = "no-cache"
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, using weak comparison as RFC 9110 requires"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def cache_key(request: Request) -> str:
+    """Identify a response by path and normalized query parameters"""
+    params = sorted(request.query_params.multi_items())
+    return f"{request.url.path}?{params}"
+
+
+class ResponseCache:
+    """Bounded LRU of serialized response bodies for resources that can no longer change.
+
+    Only responses for finished jobs are stored, so entries never need to be
+    invalidated; the least recently used ones are evicted once the total body size
+    exceeds `max_bytes`. Hits skip the database and serialization entirely, and
+    conditional requests whose If-None-Match matches get a bodyless 304.
+    """
+
+    max_bytes: int
+    _entries: "OrderedDict[str, Tuple[str, bytes]]"
+    _size: int
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def respond(self, request: Request) -> Optional[Response]:
+        """Answer a request from the cache, or return None on a miss"""
+        key = cache_key(request)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        etag, body = entry
+        return self._response(request, etag, body)
+
+    def store(self, request: Request, body: bytes) -> Response:
+        """Cache a serialized JSON body for an immutable resource and answer the request with it"""
+        etag = make_etag(body)
+        key = cache_key(request)
+
+        if len(body) <= self.max_bytes:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+        return self._response(request, etag, body)
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    @staticmethod
+    def _response(request: Request, etag: str, body: bytes) -> Response:
+        headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,152 @@
+"""
+Job progress event fan-out for the sloptimize API
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from ..database import AsyncDatabase, FINISHED_STATUSES
+from ..environment import EVENTS_KEEPALIVE, EVENTS_POLL_INTERVAL
+
+TERMINAL_STATUSES = set(FINISHED_STATUSES)
+
+Event = Tuple[str, Optional[Dict[str, Any]]]
+
+
+def _status_event(job: Dict[str, Any]) -> Event:
+    return "status", {
+        "job_id": job["id"],
+        "status": job["status"],
+        "error_message": job["error_message"],
+    }
+
+
+def _progress_event(job: Dict[str, Any]) -> Event:
+    progress_percent = 0.0
+    if job["total_files"] > 0:
+        progress_percent = job["processed_files"] / job["total_files"] * 100
+    return "progress", {
+        "job_id": job["id"],
+        "total_files": job["total_files"],
+        "processed_files": job["processed_files"],
+        "progress_percent": progress_percent,
+    }
+
+
+def _file_event(result: Dict[str, Any]) -> Event:
+    return "file", {
+        "job_id": result["job_id"],
+        "id": result["id"],
+        "file_path": result["file_path"],
+        "score": result["score"],
+    }
+
+
+class JobEventBroker:
+    """Pushes job status, progress and per-file completion events to subscribers.
+
+    Workers run in separate processes and only communicate through the database,
+    so one polling task per API process reads the state of every watched job in a
+    single query per interval and fans the resulting events out to all of that
+    job's subscribers. Subscriber count therefore doesn't change database load.
+    """
+
+    db: AsyncDatabase
+    interval: float
+    keepalive: float
+    _subscribers: Dict[str, Set[asyncio.Queue]]
+    _jobs: Dict[str, Dict[str, Any]]
+    _cursors: Dict[str, int]
+    _task: Optional[asyncio.Task]
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        interval: float = EVENTS_POLL_INTERVAL,
+        keepalive: float = EVENTS_KEEPALIVE,
+    ):
+        self.db = db
+        self.interval = interval
+        self.keepalive = keepalive
+        self._subscribers = {}
+        self._jobs = {}
+        self._cursors = {}
+        self._task = None
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Event]:
+        """Yield `(event, data)` pairs for a job until it reaches a terminal status.
+
+        The current progress and status are sent first. A `("keepalive", None)`
+        pair is yielded whenever nothing happened for `keepalive` seconds so that
+        the connection can be kept open through proxies.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        if job_id not in self._jobs:
+            job = await self.db.get_job(job_id)
+            self._cursors[job_id] = await self.db.get_result_cursor(job_id)
+            self._jobs[job_id] = job
+        self._subscribers.setdefault(job_id, set()).add(queue)
+
+        queue.put_nowait(_progress_event(self._jobs[job_id]))
+        queue.put_nowait(_status_event(self._jobs[job_id]))
+        self._ensure_polling()
+
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield "keepalive", None
+                    continue
+
+                yield event
+                if event[0] == "status" and event[1]["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id, set())
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+                self._jobs.pop(job_id, None)
+                self._cursors.pop(job_id, None)
+
+    def _ensure_polling(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._poll())
+
+    async def _poll(self):
+        """Poll the database for changes to watched jobs while anyone is subscribed"""
+        while self._subscribers:
+            await asyncio.sleep(self.interval)
+            if not self._cursors:
+                continue
+
+            updates = await self.db.poll_job_updates(dict(self._cursors))
+
+            # Files are published before status so clients see every result of a finished job
+            for result in updates["results"]:
+                job_id = result["job_id"]
+                # The job's last subscriber may have left while the poll ran
+                if job_id not in self._cursors:
+                    continue
+                self._cursors[job_id] = max(self._cursors[job_id], result["rowid"])
+                self._publish(job_id, _file_event(result))
+
+            for job in updates["jobs"]:
+                previous = self._jobs.get(job["id"])
+                if previous is None:
+                    continue
+                self._jobs[job["id"]] = job
+                if (job["processed_files"], job["total_files"]) != (
+                    previous["processed_files"],
+                    previous["total_files"],
+                ):
+                    self._publish(job["id"], _progress_event(job))
+                if job["status"] != previous["status"]:
+                    self._publish(job["id"], _status_event(job))
+
+    def _publish(self, job_id: str, event: Event):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(event)
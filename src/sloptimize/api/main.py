@@ -3,25 +3,90 @@ FastAPI application for sloptimize repository processing
 """
 
 import asyncio
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel, HttpUrl
+import json
+import uuid
+import zlib
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import orjson
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
 import subprocess
 import sys
 from pathlib import Path
 
-from ..database import Database, JobStatus as DbJobStatus
+from ..budget import pricing_configured
+from ..database import AsyncDatabase, JobStatus as DbJobStatus
+from ..environment import (
+    GIT_LS_REMOTE_CONCURRENCY,
+    MAX_BATCH_SIZE,
+    MAX_UPLOAD_BYTES,
+    UPLOAD_DIR,
+    WORKER_CONCURRENCY,
+    WORKER_REAP_INTERVAL,
+)
+from ..main import sloptimize, SloptimizeResult
+from ..metrics import CONTENT_TYPE_LATEST, SUBMISSIONS, create_registry, mark_worker_dead, render
+from ..repository import remote_head
+from ..retention import rehydrate_job
+from ..routing import RoutingPolicy
+from ..singleflight import SingleFlight, content_hash
+from ..worker.archive import ARCHIVE_FORMATS, detect_format
+from .admission import AdmissionController, client_id
+from .cache import ResponseCache, NO_CACHE_CONTROL
+from .events import JobEventBroker, TERMINAL_STATUSES
+
+# Rows serialized per DB thread hop when streaming an export
+EXPORT_CHUNK_ROWS = 200
 
 app = FastAPI(title="Sloptimize API", version="0.1.0")
-db = Database()
+db = AsyncDatabase()
+broker = JobEventBroker(db)
+optimize_flights = SingleFlight()
+submission_flights = SingleFlight()
+response_cache = ResponseCache()
+admission = AdmissionController(db)
+worker_processes: Dict[str, subprocess.Popen] = {}
+worker_supervisor: Optional[asyncio.Task] = None
+metrics_registry = create_registry(db.db)
 
 class RepositoryRequest(BaseModel):
     repo_url: HttpUrl
+    force: bool = False
+    # Stop dispatching files once the job has used this many tokens or dollars
+    max_tokens: Optional[int] = Field(None, gt=0)
+    max_cost_usd: Optional[float] = Field(None, gt=0)
+    # Model routing for the job's files; defaults to ROUTING_POLICY
+    routing_policy: Optional[RoutingPolicy] = None
     
+class BatchRequest(BaseModel):
+    repo_urls: List[HttpUrl] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    force: bool = False
+    # Applied to each job in the batch
+    max_tokens: Optional[int] = Field(None, gt=0)
+    max_cost_usd: Optional[float] = Field(None, gt=0)
+    routing_policy: Optional[RoutingPolicy] = None
+
+class OptimizeRequest(BaseModel):
+    code: str
+
 class JobResponse(BaseModel):
     job_id: str
     status: str
     message: str
+    duplicate: bool = False
+
+class QueueStatusResponse(BaseModel):
+    pending: int
+    processing: int
+    depth: int
+    max_depth: int
+    client_active: int
+    max_per_client: int
+    drain_rate_per_minute: float
+    oldest_pending_seconds: float
+    estimated_wait_seconds: Optional[int]
 
 class JobStatusResponse(BaseModel):
     job_id: str
@@ -34,6 +99,32 @@ class JobStatusResponse(BaseModel):
     total_files: int = 0
     processed_files: int = 0
     progress_percent: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    routing_policy: Optional[str] = None
+
+class BatchJob(BaseModel):
+    repo_url: str
+    job_id: str
+    status: str
+    duplicate: bool = False
+
+class BatchResponse(BaseModel):
+    batch_id: Optional[str]
+    jobs: List[BatchJob]
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    total_jobs: int
+    status_counts: Dict[str, int]
+    total_files: int
+    processed_files: int
+    progress_percent: float
+    jobs: List[JobStatusResponse]
 
 class FileResult(BaseModel):
     id: str
@@ -42,78 +133,552 @@ class FileResult(BaseModel):
     metrics: Dict[str, Any]
     integration_considerations: List[str]
     created_at: str
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    llm_retries: Optional[int] = None
+    duration_seconds: Optional[float] = None
+    cost_usd: Optional[float] = None
+    model: Optional[str] = None
+    model_tier: Optional[str] = None
+
+class JobSummaryResponse(BaseModel):
+    job_id: str
+    result_count: int = 0
+    average_score: Optional[float] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    score_histogram: Dict[str, int] = {}
+    metric_tallies: Dict[str, int] = {}
+
+class SearchResult(BaseModel):
+    id: str
+    job_id: str
+    file_path: str
+    score: float
+    snippet: str
+    rank: float
+    created_at: str
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    next_offset: Optional[int] = None
+
+def _job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a jobs row like JobStatusResponse"""
+    progress_percent = 0.0
+    if job['total_files'] > 0:
+        progress_percent = (job['processed_files'] / job['total_files']) * 100
+    
+    return {
+        'job_id': job['id'],
+        'repo_url': job['repo_url'],
+        'status': job['status'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'completed_at': job['completed_at'],
+        'error_message': job['error_message'],
+        'total_files': job['total_files'],
+        'processed_files': job['processed_files'],
+        'progress_percent': progress_percent,
+        'input_tokens': job['input_tokens'],
+        'output_tokens': job['output_tokens'],
+        'cached_tokens': job['cached_tokens'],
+        'cost_usd': job['cost_usd'],
+        'max_tokens': job['max_tokens'],
+        'max_cost_usd': job['max_cost_usd'],
+        'routing_policy': job['routing_policy'],
+    }
+
+def _file_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape an undecoded file_results row like FileResult, embedding the stored JSON columns verbatim"""
+    return {
+        'id': result['id'],
+        'file_path': result['file_path'],
+        'score': result['score'],
+        'metrics': orjson.Fragment(result['metrics']),
+        'integration_considerations': orjson.Fragment(result['integration_considerations']),
+        'created_at': result['created_at'],
+        'input_tokens': result['input_tokens'],
+        'output_tokens': result['output_tokens'],
+        'cached_tokens': result['cached_tokens'],
+        'llm_retries': result['llm_retries'],
+        'duration_seconds': result['duration_seconds'],
+        'cost_usd': result['cost_usd'],
+        'model': result['model'],
+        'model_tier': result['model_tier'],
+    }
+
+def _json_response(body: bytes) -> Response:
+    return Response(body, media_type="application/json")
+
+def _cacheable_response(request: Request, job: Dict[str, Any], body: bytes) -> Response:
+    """Serve a job resource, as an immutable cached response once the job is completed.
+
+    Results of a completed job never change, so its serialized body is cached in
+    process and sent with a strong ETag and immutable Cache-Control, letting
+    browsers and nginx reuse it. Anything else must be revalidated every time.
+    """
+    if job['status'] in (DbJobStatus.COMPLETED, DbJobStatus.PARTIAL):
+        return response_cache.store(request, body)
+    
+    response = _json_response(body)
+    response.headers["Cache-Control"] = NO_CACHE_CONTROL
+    return response
 
 def run_worker_process(job_id: str, repo_url: str):
     """Start worker process detached from API"""
-    worker_script = Path(__file__).parent.parent / "worker" / "main.py"
-    subprocess.Popen([
-        sys.executable, str(worker_script), job_id, repo_url
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return subprocess.Popen([
+        sys.executable, "-m", "sloptimize.worker.main", job_id, repo_url
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def start_pending_workers():
+    """Start workers for the oldest pending jobs while fewer than WORKER_CONCURRENCY jobs are processing.
+
+    The bound is global: jobs processing under the worker daemon or another API
+    process take slots too, and a worker only claims its job while one is free.
+    Jobs that don't get a slot stay pending until the supervisor finds one free,
+    or for the worker daemon.
+    """
+    for job_id, process in list(worker_processes.items()):
+        if process.poll() is not None:
+            mark_worker_dead(process.pid)
+            del worker_processes[job_id]
+    
+    # Workers that haven't claimed their job yet still see it as pending, but will take a slot
+    pending_jobs = await db.get_pending_jobs(WORKER_CONCURRENCY + len(worker_processes))
+    unclaimed = sum(job['id'] in worker_processes for job in pending_jobs)
+    free_slots = WORKER_CONCURRENCY - await db.count_jobs(DbJobStatus.PROCESSING) - unclaimed
+    
+    for job in [job for job in pending_jobs if job['id'] not in worker_processes][:max(free_slots, 0)]:
+        worker_processes[job['id']] = run_worker_process(job['id'], job['repo_url'])
+    
+    if worker_processes:
+        _ensure_supervising()
+
+def _ensure_supervising():
+    global worker_supervisor
+    loop = asyncio.get_running_loop()
+    if worker_supervisor is None or worker_supervisor.done() or worker_supervisor.get_loop() is not loop:
+        worker_supervisor = loop.create_task(supervise_workers())
+
+async def supervise_workers():
+    """Reap finished workers and fill their slots every WORKER_REAP_INTERVAL while any are running"""
+    while worker_processes:
+        await asyncio.sleep(WORKER_REAP_INTERVAL)
+        await start_pending_workers()
+
+def _check_budget(max_cost_usd: Optional[float]):
+    """Refuse a dollar budget that could never be reached because usage has no price"""
+    if max_cost_usd is not None and not pricing_configured():
+        raise HTTPException(
+            status_code=400,
+            detail="max_cost_usd needs LLM_INPUT_PRICE or LLM_OUTPUT_PRICE to be configured; use max_tokens instead"
+        )
+
+async def _find_duplicate(repo_url: str, force: bool) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Resolve the remote HEAD and, unless forced, an existing job that makes a new one redundant"""
+    head_sha = await remote_head(repo_url)
+    if force:
+        return head_sha, None
+    return head_sha, await db.find_duplicate_job(repo_url, head_sha)
 
 @app.post("/process-repository", response_model=JobResponse)
-async def process_repository(request: RepositoryRequest, background_tasks: BackgroundTasks):
-    """Submit a repository for processing"""
-    try:
-        job_id = db.create_job(str(request.repo_url))
+async def process_repository(request: RepositoryRequest, http_request: Request, background_tasks: BackgroundTasks):
+    """Submit a repository for processing.
+
+    Returns the existing job instead of starting a new one when the repository is
+    already queued or processing, or when a completed job already covers its
+    current HEAD, unless `force` is set. New jobs are refused with 429 while the
+    queue or the client's quota is full.
+    """
+    repo_url = str(request.repo_url)
+    client = client_id(http_request)
+    _check_budget(request.max_cost_usd)
+    
+    led = False
+    
+    async def submit() -> JobResponse:
+        nonlocal led
+        led = True
+        head_sha, existing = await _find_duplicate(repo_url, request.force)
+        if existing:
+            SUBMISSIONS.labels(outcome="duplicate").inc()
+            return JobResponse(
+                job_id=existing['id'],
+                status=existing['status'],
+                message="Existing job returned for this repository; set force=true to reprocess",
+                duplicate=True
+            )
         
-        # Start worker process in background
-        background_tasks.add_task(run_worker_process, job_id, str(request.repo_url))
+        try:
+            job_id, = await admission.create_jobs([{
+                'repo_url': repo_url, 'head_sha': head_sha,
+                'max_tokens': request.max_tokens, 'max_cost_usd': request.max_cost_usd,
+                'routing_policy': request.routing_policy,
+            }], client)
+        except HTTPException:
+            SUBMISSIONS.labels(outcome="rejected").inc()
+            raise
+        SUBMISSIONS.labels(outcome="accepted").inc()
+        
+        # Start worker processes in background
+        background_tasks.add_task(start_pending_workers)
         
         return JobResponse(
             job_id=job_id,
             status="pending",
             message="Repository processing started"
         )
+    
+    try:
+        if request.force:
+            return await submit()
+        # Identical submissions from one client racing each other resolve to the same new job;
+        # other clients and options are admitted on their own
+        key = json.dumps([
+            repo_url, client, request.max_tokens, request.max_cost_usd, request.routing_policy,
+        ])
+        response = await submission_flights.do(key, submit)
+        if not led and not response.duplicate:
+            SUBMISSIONS.labels(outcome="duplicate").inc()
+            return response.model_copy(update={
+                'duplicate': True,
+                'message': "Existing job returned for this repository; set force=true to reprocess",
+            })
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start processing: {str(e)}")
+
+@app.post("/process-repositories", response_model=BatchResponse)
+async def process_repositories(request: BatchRequest, http_request: Request, background_tasks: BackgroundTasks):
+    """Submit many repositories as one batch.
+
+    Each URL is deduplicated like a single submission. The new jobs are admitted
+    as a group, created in one transaction under a shared batch ID and handed to
+    the scheduler once; `batch_id` is null when every URL was a duplicate.
+    """
+    client = client_id(http_request)
+    _check_budget(request.max_cost_usd)
+    repo_urls = list(dict.fromkeys(str(url) for url in request.repo_urls))
+    lookups = asyncio.Semaphore(GIT_LS_REMOTE_CONCURRENCY)
+    
+    async def lookup(repo_url: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        async with lookups:
+            return await _find_duplicate(repo_url, request.force)
+    
+    try:
+        found = await asyncio.gather(*(lookup(repo_url) for repo_url in repo_urls))
+        new_repos = [
+            {
+                'repo_url': repo_url, 'head_sha': head_sha,
+                'max_tokens': request.max_tokens, 'max_cost_usd': request.max_cost_usd,
+                'routing_policy': request.routing_policy,
+            }
+            for repo_url, (head_sha, existing) in zip(repo_urls, found)
+            if existing is None
+        ]
+        
+        batch_id = None
+        job_ids = iter([])
+        if new_repos:
+            batch_id = str(uuid.uuid4())
+            try:
+                job_ids = iter(await admission.create_jobs(new_repos, client, batch_id))
+            except HTTPException:
+                SUBMISSIONS.labels(outcome="rejected").inc(len(new_repos))
+                raise
+            background_tasks.add_task(start_pending_workers)
+        
+        jobs = []
+        for repo_url, (_, existing) in zip(repo_urls, found):
+            if existing:
+                jobs.append(BatchJob(repo_url=repo_url, job_id=existing['id'], status=existing['status'], duplicate=True))
+            else:
+                jobs.append(BatchJob(repo_url=repo_url, job_id=next(job_ids), status="pending"))
+        
+        SUBMISSIONS.labels(outcome="accepted").inc(len(new_repos))
+        SUBMISSIONS.labels(outcome="duplicate").inc(len(repo_urls) - len(new_repos))
+        return BatchResponse(batch_id=batch_id, jobs=jobs)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start processing: {str(e)}")
 
+@app.get("/batches/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch_status(batch_id: str):
+    """Get aggregate progress of a batch and the status of each of its jobs"""
+    jobs = await db.get_batch_jobs(batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    status_counts: Dict[str, int] = {}
+    for job in jobs:
+        status_counts[job['status']] = status_counts.get(job['status'], 0) + 1
+    finished = sum(status_counts.get(status, 0) for status in TERMINAL_STATUSES)
+    
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        total_jobs=len(jobs),
+        status_counts=status_counts,
+        total_files=sum(job['total_files'] for job in jobs),
+        processed_files=sum(job['processed_files'] for job in jobs),
+        progress_percent=finished / len(jobs) * 100,
+        jobs=[_job_status(job) for job in jobs]
+    )
+
+@app.post("/upload-repository", response_model=JobResponse)
+async def upload_repository(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    name: str = Query("upload", max_length=200),
+    format: Optional[str] = Query(None, description="Expected archive format, checked against the upload"),
+    max_tokens: Optional[int] = Query(None, gt=0, description="Token budget for the job"),
+    max_cost_usd: Optional[float] = Query(None, gt=0, description="Dollar budget for the job"),
+    routing_policy: Optional[RoutingPolicy] = Query(None, description="Model routing for the job's files"),
+):
+    """Submit a `.tar.gz` or `.zip` archive for processing instead of a git URL.
+
+    The request body is the raw archive. It is streamed to `UPLOAD_DIR` chunk by
+    chunk and never held in memory; the worker extracts it in place of a clone.
+    """
+    if format is not None and format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=415, detail=f"Unsupported format: {format}")
+    _check_budget(max_cost_usd)
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Archive exceeds {MAX_UPLOAD_BYTES} bytes")
+    
+    # Refuse before reading what may be a large body
+    client = client_id(request)
+    try:
+        await admission.admit(client)
+    except HTTPException:
+        SUBMISSIONS.labels(outcome="rejected").inc()
+        raise
+    
+    upload_dir = Path(UPLOAD_DIR).resolve()
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    upload_id = str(uuid.uuid4())
+    spool_path = upload_dir / f"{upload_id}.partial"
+    archive_path: Optional[Path] = None
+    
+    try:
+        size = 0
+        header = b""
+        with open(spool_path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Archive exceeds {MAX_UPLOAD_BYTES} bytes")
+                if len(header) < 4:
+                    header = (header + chunk)[:4]
+                f.write(chunk)
+        
+        archive_format = detect_format(header)
+        if archive_format is None or (format is not None and format != archive_format):
+            raise HTTPException(status_code=415, detail="Upload is not a .tar.gz or .zip archive")
+        
+        archive_path = spool_path.with_name(f"{upload_id}.{archive_format}")
+        spool_path.rename(archive_path)
+        # Checked again as the job is inserted, since other jobs may have been admitted during the upload
+        try:
+            job_ids = await admission.create_jobs(
+                [{
+                    'repo_url': f"upload:{name}", 'source_archive': str(archive_path),
+                    'max_tokens': max_tokens, 'max_cost_usd': max_cost_usd,
+                    'routing_policy': routing_policy,
+                }], client
+            )
+        except HTTPException:
+            SUBMISSIONS.labels(outcome="rejected").inc()
+            raise
+    except BaseException:
+        spool_path.unlink(missing_ok=True)
+        if archive_path is not None:
+            archive_path.unlink(missing_ok=True)
+        raise
+    
+    SUBMISSIONS.labels(outcome="accepted").inc()
+    background_tasks.add_task(start_pending_workers)
+    
+    return JobResponse(
+        job_id=job_ids[0],
+        status="pending",
+        message="Archive upload accepted for processing"
+    )
+
+@app.post("/optimize", response_model=SloptimizeResult)
+async def optimize(request: OptimizeRequest):
+    """Optimize a single snippet synchronously.
+
+    Concurrent requests with identical code share one LLM call and all receive its result.
+    """
+    try:
+        return await optimize_flights.do(
+            content_hash(request.code),
+            lambda: asyncio.to_thread(sloptimize, request.code)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Optimization failed: {str(e)}")
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for the API, workers and job queue"""
+    return Response(await db.run(render, metrics_registry), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/queue", response_model=QueueStatusResponse)
+async def get_queue_status(request: Request):
+    """Get queue depth, drain rate and the estimated wait for a new job"""
+    return await admission.queue_status(client_id(request))
+
 @app.get("/jobs/{job_id}/status", response_model=JobStatusResponse)
-async def get_job_status(job_id: str):
+async def get_job_status(job_id: str, request: Request):
     """Get job status and progress"""
-    job = db.get_job(job_id)
+    if cached := response_cache.respond(request):
+        return cached
+    
+    job = await db.get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    progress_percent = 0.0
-    if job['total_files'] > 0:
-        progress_percent = (job['processed_files'] / job['total_files']) * 100
+    return _cacheable_response(request, job, orjson.dumps(_job_status(job)))
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream status, progress and per-file completion events for a job as Server-Sent Events"""
+    job = await db.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        async for event, data in broker.subscribe(job_id):
+            if data is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
     
-    return JobStatusResponse(
-        job_id=job['id'],
-        repo_url=job['repo_url'],
-        status=job['status'],
-        created_at=job['created_at'],
-        started_at=job['started_at'],
-        completed_at=job['completed_at'],
-        error_message=job['error_message'],
-        total_files=job['total_files'],
-        processed_files=job['processed_files'],
-        progress_percent=progress_percent
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @app.get("/jobs/{job_id}/results", response_model=List[FileResult])
-async def get_job_results(job_id: str, limit: Optional[int] = None, order_by_score: bool = True):
+async def get_job_results(job_id: str, request: Request,
+                          limit: Optional[int] = None, order_by_score: bool = True):
     """Get optimization results for a job"""
-    job = db.get_job(job_id)
+    if cached := response_cache.respond(request):
+        return cached
+    
+    job = await db.get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
+    if job['archived_at']:
+        await db.run(rehydrate_job, db.db, job_id)
+    
+    # Stored JSON columns are passed through undecoded and serialized with orjson
     if limit:
-        results = db.get_top_results(job_id, limit)
+        results = await db.get_top_results(job_id, limit, decode_json=False)
     else:
-        results = db.get_job_results(job_id, order_by_score)
-    
-    return [
-        FileResult(
-            id=result['id'],
-            file_path=result['file_path'],
-            score=result['score'],
-            metrics=result['metrics'],
-            integration_considerations=result['integration_considerations'],
-            created_at=result['created_at']
-        )
-        for result in results
-    ]
+        results = await db.get_job_results(job_id, order_by_score, decode_json=False)
+    
+    body = orjson.dumps([_file_result(result) for result in results])
+    return _cacheable_response(request, job, body)
+
+def _next_ndjson_chunk(rows: Iterator[Dict[str, Any]], include_code: bool) -> bytes:
+    """Serialize the next batch of result rows as NDJSON lines"""
+    lines = []
+    for result in islice(rows, EXPORT_CHUNK_ROWS):
+        record = FileResult(**result).model_dump()
+        if include_code:
+            record['original_code'] = result['original_code']
+            record['optimized_code'] = result['optimized_code']
+        lines.append(json.dumps(record) + "\n")
+    return "".join(lines).encode()
+
+@app.get("/jobs/{job_id}/results.ndjson")
+async def export_job_results(job_id: str, request: Request, order_by_score: bool = True,
+                             include_code: bool = False):
+    """Stream all results for a job as newline-delimited JSON, gzip-encoded when the client accepts it.
+
+    Rows are read from a database cursor and written in small chunks, so memory use
+    stays flat regardless of job size and clients can start consuming immediately.
+    """
+    job = await db.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job['archived_at']:
+        await db.run(rehydrate_job, db.db, job_id)
+    
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    
+    async def ndjson_stream():
+        rows = db.db.iter_job_results(job_id, order_by_score)
+        compressor = zlib.compressobj(wbits=31) if use_gzip else None
+        try:
+            while chunk := await db.run(_next_ndjson_chunk, rows, include_code):
+                if compressor:
+                    # Sync flush hands each chunk to the client instead of holding it in the compressor
+                    chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                yield chunk
+            if compressor:
+                yield compressor.flush()
+        finally:
+            await db.run(rows.close)
+    
+    headers = {
+        "Content-Disposition": f'attachment; filename="{job_id}.ndjson"',
+        "X-Accel-Buffering": "no",
+    }
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson", headers=headers)
+
+@app.get("/jobs/{job_id}/summary", response_model=JobSummaryResponse)
+async def get_job_summary(job_id: str, request: Request):
+    """Get aggregate score and metric statistics for a job without scanning its results"""
+    if cached := response_cache.respond(request):
+        return cached
+    
+    job = await db.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    stats = await db.get_job_stats(job_id)
+    
+    average_score = None
+    if stats['result_count'] > 0:
+        average_score = stats['score_sum'] / stats['result_count']
+    
+    summary = JobSummaryResponse(
+        job_id=job_id,
+        result_count=stats['result_count'],
+        average_score=average_score,
+        min_score=stats['score_min'],
+        max_score=stats['score_max'],
+        score_histogram=stats['score_histogram'],
+        metric_tallies=stats['metric_tallies']
+    )
+    return _cacheable_response(request, job, orjson.dumps(summary.model_dump()))
+
+@app.get("/search", response_model=SearchResponse)
+async def search(q: str, job_id: Optional[str] = None,
+                 limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """Search results across all jobs by file path, integration considerations and optimized code"""
+    try:
+        # Fetch one extra row to know whether another page exists
+        results = await db.search_results(q, job_id, limit + 1, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return SearchResponse(
+        results=[SearchResult(**result) for result in results[:limit]],
+        next_offset=offset + limit if len(results) > limit else None
+    )
 
 @app.get("/jobs", response_model=List[JobStatusResponse])
 async def get_jobs(status: Optional[str] = None):
@@ -125,22 +690,8 @@ async def get_jobs(status: Optional[str] = None):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid status")
     
-    jobs = db.get_jobs(job_status)
-    return [
-        JobStatusResponse(
-            job_id=job['id'],
-            repo_url=job['repo_url'],
-            status=job['status'],
-            created_at=job['created_at'],
-            started_at=job['started_at'],
-            completed_at=job['completed_at'],
-            error_message=job['error_message'],
-            total_files=job['total_files'],
-            processed_files=job['processed_files'],
-            progress_percent=(job['processed_files'] / job['total_files'] * 100) if job['total_files'] > 0 else 0.0
-        )
-        for job in jobs
-    ]
+    jobs = await db.get_jobs(job_status)
+    return _json_response(orjson.dumps([_job_status(job) for job in jobs]))
 
 @app.get("/")
 async def root():
@@ -0,0 +1,71 @@
+"""
+Token and dollar accounting for jobs, and the budgets that cap them
+"""
+
+from typing import Dict, Optional
+
+from .environment import (
+    LLM_CACHED_INPUT_PRICE,
+    LLM_FAST_CACHED_INPUT_PRICE,
+    LLM_FAST_INPUT_PRICE,
+    LLM_FAST_OUTPUT_PRICE,
+    LLM_INPUT_PRICE,
+    LLM_OUTPUT_PRICE,
+)
+from .routing import FAST_TIER, STRONG_TIER
+
+# Per-million-token input, cached input and output prices of each routing tier
+PRICES = {
+    STRONG_TIER: (LLM_INPUT_PRICE, LLM_CACHED_INPUT_PRICE, LLM_OUTPUT_PRICE),
+    FAST_TIER: (LLM_FAST_INPUT_PRICE, LLM_FAST_CACHED_INPUT_PRICE, LLM_FAST_OUTPUT_PRICE),
+}
+
+
+def pricing_configured() -> bool:
+    """Whether provider prices are set, so that usage has a dollar cost"""
+    return any(input_price > 0 or output_price > 0 for input_price, _, output_price in PRICES.values())
+
+
+def token_cost(input_tokens: int, output_tokens: int, cached_tokens: int = 0, tier: str = STRONG_TIER) -> float:
+    """Dollar cost of provider usage at a routing tier's per-million-token prices.
+
+    Cached tokens are part of the input count and are charged at the cached rate instead.
+    """
+    input_price, cached_input_price, output_price = PRICES[tier]
+    uncached = max(input_tokens - cached_tokens, 0)
+    return (
+        uncached * input_price
+        + cached_tokens * cached_input_price
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+class JobBudget:
+    """Tracks a job's spend against its optional token and dollar caps.
+
+    Tokens are input plus output tokens. Usage is charged after each file, so a
+    job overshoots its cap by at most the files that were already in flight.
+    """
+
+    max_tokens: Optional[int]
+    max_cost_usd: Optional[float]
+    tokens: int
+    cost_usd: float
+
+    def __init__(self, max_tokens: Optional[int] = None, max_cost_usd: Optional[float] = None):
+        self.max_tokens = max_tokens
+        self.max_cost_usd = max_cost_usd
+        self.tokens = 0
+        self.cost_usd = 0.0
+
+    def charge(self, usage: Dict[str, int], cost_usd: float) -> float:
+        """Add a file's usage and its dollar cost, priced per call by `token_cost`, to the job"""
+        self.tokens += usage["input_tokens"] + usage["output_tokens"]
+        self.cost_usd += cost_usd
+        return cost_usd
+
+    @property
+    def exhausted(self) -> bool:
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            return True
+        return self.max_cost_usd is not None and self.cost_usd >= self.max_cost_usd
@@ -2,28 +2,102 @@
 Database operations for sloptimize API
 """
 
+import asyncio
+import math
 import sqlite3
 import json
+import time
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from typing import List, Dict, Any, Optional, Callable, Iterator
 from enum import Enum
 from pathlib import Path
 
+from .environment import DB_PATH, DB_THREADS, DB_BUSY_TIMEOUT
+
 class JobStatus(str, Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
+    # Stopped at its token or dollar budget with only some files processed
+    PARTIAL = "partial"
     FAILED = "failed"
 
+FINISHED_STATUSES = (JobStatus.COMPLETED, JobStatus.PARTIAL, JobStatus.FAILED)
+
+# Width of the score ranges counted in job_stats.score_histogram
+SCORE_BUCKET_WIDTH = 1.0
+
+# Metric values the LLM uses to say a metric did not improve
+_UNREPORTED_METRIC_VALUES = {"", "none", "n/a", "na", "no change", "unchanged", "0", "0%"}
+
+class QueueLimitExceeded(Exception):
+    """Raised when new jobs would exceed the queue depth or the client's quota"""
+    
+    def __init__(self, detail: str, excess: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.excess = excess
+
 class Database:
-    def __init__(self, db_path: str = "sloptimize.db"):
+    # Columns added after the original schema, applied to new and existing databases alike
+    MIGRATED_COLUMNS = {
+        'jobs': {
+            'archived_at': 'TIMESTAMP',
+            'archive_path': 'TEXT',
+            'rehydrated_at': 'TIMESTAMP',
+            'head_sha': 'TEXT',
+            'client_id': 'TEXT',
+            'batch_id': 'TEXT',
+            'source_archive': 'TEXT',
+            'max_tokens': 'INTEGER',
+            'max_cost_usd': 'REAL',
+            'input_tokens': 'INTEGER NOT NULL DEFAULT 0',
+            'output_tokens': 'INTEGER NOT NULL DEFAULT 0',
+            'cached_tokens': 'INTEGER NOT NULL DEFAULT 0',
+            'cost_usd': 'REAL NOT NULL DEFAULT 0',
+            'profile_path': 'TEXT',
+            'routing_policy': 'TEXT',
+        },
+        'file_results': {
+            'input_tokens': 'INTEGER',
+            'output_tokens': 'INTEGER',
+            'cached_tokens': 'INTEGER',
+            'llm_retries': 'INTEGER',
+            'duration_seconds': 'REAL',
+            'cost_usd': 'REAL',
+            'model': 'TEXT',
+            'model_tier': 'TEXT',
+        },
+    }
+    
+    def __init__(self, db_path: str = DB_PATH):
         self.db_path = db_path
         self.init_database()
     
+    @contextmanager
+    def _connect(self, check_same_thread: bool = True) -> Iterator[sqlite3.Connection]:
+        """Open a connection that waits on writer locks, committing and closing it on exit"""
+        conn = sqlite3.connect(
+            self.db_path, timeout=DB_BUSY_TIMEOUT, check_same_thread=check_same_thread
+        )
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
     def init_database(self):
         """Initialize database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            # Only takes effect on a new database; retention converts older files with a full VACUUM
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL lets API readers proceed while a worker holds the write lock
+            conn.execute("PRAGMA journal_mode=WAL")
+            
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS jobs (
                     id TEXT PRIMARY KEY,
@@ -53,34 +127,174 @@ class Database:
                 )
             """)
             
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_stats (
+                    job_id TEXT PRIMARY KEY,
+                    result_count INTEGER NOT NULL DEFAULT 0,
+                    score_sum REAL NOT NULL DEFAULT 0,
+                    score_min REAL,
+                    score_max REAL,
+                    score_histogram TEXT NOT NULL DEFAULT '{}',
+                    metric_tallies TEXT NOT NULL DEFAULT '{}',
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (job_id) REFERENCES jobs (id)
+                )
+            """)
+            
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            
             conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_created_at ON result_cache(created_at)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_file_results_job_id ON file_results(job_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_file_results_score ON file_results(score DESC)")
             
+            self._init_search_index(conn)
+            
+            for table, columns in self.MIGRATED_COLUMNS.items():
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for column, column_type in columns.items():
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_repo_url ON jobs(repo_url, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch_id ON jobs(batch_id)")
+            
             conn.commit()
     
-    def create_job(self, repo_url: str) -> str:
+    @staticmethod
+    def _init_search_index(conn: sqlite3.Connection):
+        """Create the FTS5 index over file_results, kept in sync by triggers"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'file_results_fts'"
+        ).fetchone()
+        
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS file_results_fts USING fts5(
+                file_path, integration_considerations, optimized_code,
+                content='file_results'
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS file_results_fts_insert AFTER INSERT ON file_results BEGIN
+                INSERT INTO file_results_fts (rowid, file_path, integration_considerations, optimized_code)
+                VALUES (new.rowid, new.file_path, new.integration_considerations, new.optimized_code);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS file_results_fts_delete AFTER DELETE ON file_results BEGIN
+                INSERT INTO file_results_fts (file_results_fts, rowid, file_path, integration_considerations, optimized_code)
+                VALUES ('delete', old.rowid, old.file_path, old.integration_considerations, old.optimized_code);
+            END
+        """)
+        
+        if not exists:
+            # Index results stored before the search index existed
+            conn.execute("INSERT INTO file_results_fts (file_results_fts) VALUES ('rebuild')")
+    
+    def create_job(self, repo_url: str, head_sha: Optional[str] = None, client_id: Optional[str] = None,
+                   max_tokens: Optional[int] = None, max_cost_usd: Optional[float] = None,
+                   routing_policy: Optional[str] = None) -> str:
         """Create a new job and return its ID"""
-        job_id = str(uuid.uuid4())
+        return self.create_jobs([{
+            'repo_url': repo_url, 'head_sha': head_sha, 'max_tokens': max_tokens, 'max_cost_usd': max_cost_usd,
+            'routing_policy': routing_policy,
+        }], client_id)[0]
+    
+    def create_jobs(
+        self,
+        repos: List[Dict[str, Optional[str]]],
+        client_id: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        max_queue_depth: Optional[int] = None,
+        max_jobs_per_client: Optional[int] = None,
+    ) -> List[str]:
+        """Create a job for each `{'repo_url', 'head_sha', 'source_archive', 'max_tokens', 'max_cost_usd',
+        'routing_policy'}` in one transaction and return their IDs in order.
+
+        `source_archive` is the path of an uploaded archive to process instead of
+        cloning `repo_url`; `max_tokens` and `max_cost_usd` are optional budgets;
+        `routing_policy` overrides ROUTING_POLICY for the job.
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT INTO jobs (id, repo_url, status) VALUES (?, ?, ?)",
-                (job_id, repo_url, JobStatus.PENDING)
+        With `max_queue_depth` or `max_jobs_per_client`, the unfinished jobs are
+        counted under the same write lock as the insert, so concurrent submissions
+        can't overshoot the limits; QueueLimitExceeded is raised instead.
+        """
+        job_ids = [str(uuid.uuid4()) for _ in repos]
+        
+        with self._connect() as conn:
+            if max_queue_depth is not None or max_jobs_per_client is not None:
+                conn.execute("BEGIN IMMEDIATE")
+                self._check_queue_limits(conn, len(repos), client_id, max_queue_depth, max_jobs_per_client)
+            conn.executemany(
+                """
+                INSERT INTO jobs
+                (id, repo_url, status, head_sha, client_id, batch_id, source_archive, max_tokens, max_cost_usd,
+                 routing_policy)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        job_id, repo['repo_url'], JobStatus.PENDING, repo.get('head_sha'),
+                        client_id, batch_id, repo.get('source_archive'),
+                        repo.get('max_tokens'), repo.get('max_cost_usd'), repo.get('routing_policy')
+                    )
+                    for job_id, repo in zip(job_ids, repos)
+                ]
             )
+            # Start every job with a stats row, so only jobs recorded before job_stats existed are rebuilt
+            for job_id in job_ids:
+                self._write_job_stats(conn, self._empty_job_stats(job_id))
             conn.commit()
         
-        return job_id
+        return job_ids
+    
+    @staticmethod
+    def _check_queue_limits(conn: sqlite3.Connection, jobs: int, client_id: Optional[str],
+                            max_queue_depth: Optional[int], max_jobs_per_client: Optional[int]):
+        depth, client_active = conn.execute(
+            "SELECT COUNT(*), COUNT(*) FILTER (WHERE client_id = ?) FROM jobs WHERE status IN (?, ?)",
+            (client_id, JobStatus.PENDING, JobStatus.PROCESSING)
+        ).fetchone()
+        
+        if max_queue_depth is not None and depth + jobs > max_queue_depth:
+            raise QueueLimitExceeded("Job queue is full", depth + jobs - max_queue_depth)
+        if max_jobs_per_client is not None and client_active + jobs > max_jobs_per_client:
+            raise QueueLimitExceeded(
+                "Too many unfinished jobs for this client", client_active + jobs - max_jobs_per_client
+            )
+    
+    def get_batch_jobs(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Get the jobs submitted together as a batch, in submission order"""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                "SELECT * FROM jobs WHERE batch_id = ? ORDER BY rowid", (batch_id,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
     
     def update_job_status(self, job_id: str, status: JobStatus, error_message: Optional[str] = None):
         """Update job status"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             if status == JobStatus.PROCESSING:
                 conn.execute(
                     "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
                     (status, datetime.now(), job_id)
                 )
-            elif status in [JobStatus.COMPLETED, JobStatus.FAILED]:
+            elif status in FINISHED_STATUSES:
                 conn.execute(
                     "UPDATE jobs SET status = ?, completed_at = ?, error_message = ? WHERE id = ?",
                     (status, datetime.now(), error_message, job_id)
@@ -92,18 +306,106 @@ class Database:
                 )
             conn.commit()
     
+    def claim_job(self, job_id: str, max_processing: Optional[int] = None) -> bool:
+        """Atomically move a pending job to processing; False if another worker got it first.
+
+        With `max_processing`, the claim also fails while that many jobs are already
+        processing, bounding workers across every process sharing the database.
+        """
+        limit_clause = "AND (SELECT COUNT(*) FROM jobs WHERE status = ?) < ?" if max_processing is not None else ""
+        limit_params = (JobStatus.PROCESSING, max_processing) if max_processing is not None else ()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ? {limit_clause}",
+                (JobStatus.PROCESSING, datetime.now(), job_id, JobStatus.PENDING, *limit_params)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+    
     def update_job_progress(self, job_id: str, total_files: int, processed_files: int):
         """Update job progress"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute(
                 "UPDATE jobs SET total_files = ?, processed_files = ? WHERE id = ?",
                 (total_files, processed_files, job_id)
             )
             conn.commit()
     
+    def update_job_head(self, job_id: str, head_sha: str):
+        """Record the commit a job actually processed"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET head_sha = ? WHERE id = ?", (head_sha, job_id))
+            conn.commit()
+    
+    def update_job_profile(self, job_id: str, profile_path: str):
+        """Record the directory a profiled job writes its profile artifacts to"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET profile_path = ? WHERE id = ?", (profile_path, job_id))
+            conn.commit()
+    
+    def find_duplicate_job(self, repo_url: str, head_sha: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Find an existing job that makes a new submission of `repo_url` redundant.
+
+        A pending or processing job for the URL always matches. A completed job
+        matches only when it processed `head_sha`, the remote's current HEAD.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("""
+                SELECT * FROM jobs
+                WHERE repo_url = ?
+                  AND (status IN (?, ?) OR (status = ? AND head_sha = ?))
+                ORDER BY status = ? DESC, created_at DESC
+                LIMIT 1
+            """, (
+                repo_url, JobStatus.PENDING, JobStatus.PROCESSING,
+                JobStatus.COMPLETED, head_sha, JobStatus.COMPLETED
+            )).fetchone()
+            return dict(row) if row else None
+    
+    def count_jobs(self, status: JobStatus) -> int:
+        """Count the jobs with a status"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+    
+    def get_pending_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        """Get the oldest pending jobs, in the order they should be started"""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at, rowid LIMIT ?",
+                (JobStatus.PENDING, limit)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_queue_stats(self, drain_window: float, client_id: Optional[str] = None) -> Dict[str, Any]:
+        """Queue depth, age of the oldest pending job and jobs finished in the last `drain_window` seconds"""
+        finished_since = datetime.now() - timedelta(seconds=drain_window)
+        
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("""
+                SELECT
+                    COUNT(*) FILTER (WHERE status = ?) AS pending,
+                    COUNT(*) FILTER (WHERE status = ?) AS processing,
+                    COUNT(*) FILTER (WHERE status IN (?, ?) AND client_id = ?) AS client_active,
+                    (SELECT COUNT(*) FROM jobs WHERE status IN (?, ?, ?) AND completed_at >= ?) AS finished,
+                    (julianday('now') - julianday(MIN(created_at) FILTER (WHERE status = ?))) * 86400
+                        AS oldest_pending_seconds
+                FROM jobs
+                WHERE status IN (?, ?)
+            """, (
+                JobStatus.PENDING, JobStatus.PROCESSING,
+                JobStatus.PENDING, JobStatus.PROCESSING, client_id,
+                *FINISHED_STATUSES, finished_since,
+                JobStatus.PENDING,
+                JobStatus.PENDING, JobStatus.PROCESSING
+            )).fetchone()
+            return dict(row)
+    
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Get job by ID"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
             row = cursor.fetchone()
@@ -111,7 +413,7 @@ class Database:
     
     def get_jobs(self, status: Optional[JobStatus] = None) -> List[Dict[str, Any]]:
         """Get all jobs, optionally filtered by status"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             if status:
                 cursor = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC", (status,))
@@ -121,26 +423,62 @@ class Database:
     
     def save_file_result(self, job_id: str, file_path: str, original_code: str, 
                         optimized_code: str, score: float, metrics: Dict[str, Any], 
-                        integration_considerations: List[str]):
-        """Save optimization result for a file"""
+                        integration_considerations: List[str],
+                        input_tokens: Optional[int] = None, output_tokens: Optional[int] = None,
+                        cached_tokens: Optional[int] = None, llm_retries: Optional[int] = None,
+                        duration_seconds: Optional[float] = None, cost_usd: Optional[float] = None,
+                        model: Optional[str] = None, model_tier: Optional[str] = None):
+        """Save optimization result for a file, with the provider usage, cost, time it took and model that answered.
+
+        The usage is added to the job's totals in the same transaction.
+        """
         result_id = str(uuid.uuid4())
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute("""
                 INSERT INTO file_results 
-                (id, job_id, file_path, original_code, optimized_code, score, metrics, integration_considerations)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                (id, job_id, file_path, original_code, optimized_code, score, metrics, integration_considerations,
+                 input_tokens, output_tokens, cached_tokens, llm_retries, duration_seconds, cost_usd, model, model_tier)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 result_id, job_id, file_path, original_code, optimized_code, score,
-                json.dumps(metrics), json.dumps(integration_considerations)
+                json.dumps(metrics), json.dumps(integration_considerations),
+                input_tokens, output_tokens, cached_tokens, llm_retries, duration_seconds, cost_usd, model, model_tier
             ))
+            self._add_job_usage(conn, job_id, input_tokens, output_tokens, cached_tokens, cost_usd)
+            # Runs inside the insert's write transaction, so concurrent workers can't interleave
+            stats = self._read_job_stats(conn, job_id) or self._empty_job_stats(job_id)
+            self._accumulate_job_stats(stats, score, metrics)
+            self._write_job_stats(conn, stats)
             conn.commit()
         
         return result_id
     
-    def get_job_results(self, job_id: str, order_by_score: bool = True) -> List[Dict[str, Any]]:
-        """Get all results for a job, optionally ordered by score"""
-        with sqlite3.connect(self.db_path) as conn:
+    def add_job_usage(self, job_id: str, input_tokens: Optional[int], output_tokens: Optional[int],
+                      cached_tokens: Optional[int], cost_usd: Optional[float]):
+        """Add provider usage that produced no result, such as a failed call, to a job's totals"""
+        with self._connect() as conn:
+            self._add_job_usage(conn, job_id, input_tokens, output_tokens, cached_tokens, cost_usd)
+            conn.commit()
+    
+    @staticmethod
+    def _add_job_usage(conn: sqlite3.Connection, job_id: str, input_tokens: Optional[int],
+                       output_tokens: Optional[int], cached_tokens: Optional[int], cost_usd: Optional[float]):
+        conn.execute("""
+            UPDATE jobs SET input_tokens = input_tokens + ?, output_tokens = output_tokens + ?,
+                cached_tokens = cached_tokens + ?, cost_usd = cost_usd + ?
+            WHERE id = ?
+        """, (input_tokens or 0, output_tokens or 0, cached_tokens or 0, cost_usd or 0.0, job_id))
+    
+    def get_job_results(self, job_id: str, order_by_score: bool = True,
+                        decode_json: bool = True) -> List[Dict[str, Any]]:
+        """Get all results for a job, optionally ordered by score.
+
+        With `decode_json=False` the metrics and integration considerations are
+        returned as their stored JSON text, for callers that pass them straight
+        through to a response.
+        """
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             order_clause = "ORDER BY score DESC" if order_by_score else "ORDER BY created_at"
             cursor = conn.execute(
@@ -150,14 +488,16 @@ class Database:
             results = []
             for row in cursor.fetchall():
                 result = dict(row)
-                result['metrics'] = json.loads(result['metrics'])
-                result['integration_considerations'] = json.loads(result['integration_considerations'])
+                if decode_json:
+                    result['metrics'] = json.loads(result['metrics'])
+                    result['integration_considerations'] = json.loads(result['integration_considerations'])
                 results.append(result)
             return results
     
-    def get_top_results(self, job_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_top_results(self, job_id: str, limit: int = 10,
+                        decode_json: bool = True) -> List[Dict[str, Any]]:
         """Get top results by score for a job"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute(
                 "SELECT * FROM file_results WHERE job_id = ? ORDER BY score DESC LIMIT ?",
@@ -165,8 +505,361 @@ class Database:
             )
             results = []
             for row in cursor.fetchall():
+                result = dict(row)
+                if decode_json:
+                    result['metrics'] = json.loads(result['metrics'])
+                    result['integration_considerations'] = json.loads(result['integration_considerations'])
+                results.append(result)
+            return results
+    
+    def iter_job_results(self, job_id: str, order_by_score: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield every stored result row for a job without loading them all into memory.
+
+        The connection may be advanced from different threads (one at a time), so the
+        API can hand each step of a streaming export to whichever DB thread is free.
+        """
+        with self._connect(check_same_thread=False) as conn:
+            conn.row_factory = sqlite3.Row
+            order_clause = "ORDER BY score DESC" if order_by_score else "ORDER BY created_at"
+            cursor = conn.execute(
+                f"SELECT * FROM file_results WHERE job_id = ? {order_clause}",
+                (job_id,)
+            )
+            for row in cursor:
                 result = dict(row)
                 result['metrics'] = json.loads(result['metrics'])
                 result['integration_considerations'] = json.loads(result['integration_considerations'])
-                results.append(result)
-            return results
\ No newline at end of file
+                yield result
+    
+    def get_archivable_jobs(self, older_than: datetime, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get finished jobs whose results have not been touched since `older_than` and are still live"""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute("""
+                SELECT * FROM jobs
+                WHERE status IN (?, ?, ?)
+                  AND archived_at IS NULL
+                  AND COALESCE(rehydrated_at, completed_at) < ?
+                ORDER BY completed_at
+                LIMIT ?
+            """, (*FINISHED_STATUSES, older_than, limit))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def mark_job_archived(self, job_id: str, archive_path: str):
+        """Record that a job's results now live in an archive file"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET archived_at = ?, archive_path = ? WHERE id = ?",
+                (datetime.now(), archive_path, job_id)
+            )
+            conn.commit()
+    
+    def delete_job_results(self, job_id: str, batch_size: int = 500) -> int:
+        """Delete an archived job's results in bounded batches, committing between them to keep lock times short.
+
+        Each batch only deletes while the job is still marked archived, so a
+        re-hydration that lands between batches stops the purge instead of leaving
+        a live job with missing results.
+        """
+        deleted = 0
+        while True:
+            with self._connect() as conn:
+                cursor = conn.execute("""
+                    DELETE FROM file_results WHERE rowid IN (
+                        SELECT rowid FROM file_results WHERE job_id = ? LIMIT ?
+                    ) AND EXISTS (
+                        SELECT 1 FROM jobs WHERE id = ? AND archived_at IS NOT NULL
+                    )
+                """, (job_id, batch_size, job_id))
+                conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+    
+    def restore_job_results(self, job_id: str, results: Iterator[Dict[str, Any]]) -> int:
+        """Re-insert archived result rows for a job and mark it live again"""
+        restored = 0
+        with self._connect() as conn:
+            for result in results:
+                # Concurrent rehydrations of the same job insert the same primary keys, so duplicates are skipped
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO file_results
+                    (id, job_id, file_path, original_code, optimized_code, score, metrics, integration_considerations, created_at,
+                     input_tokens, output_tokens, cached_tokens, llm_retries, duration_seconds, cost_usd,
+                     model, model_tier)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    result['id'], job_id, result['file_path'], result['original_code'],
+                    result['optimized_code'], result['score'], json.dumps(result['metrics']),
+                    json.dumps(result['integration_considerations']), result['created_at'],
+                    # Archives written before usage was tracked don't have these columns
+                    result.get('input_tokens'), result.get('output_tokens'), result.get('cached_tokens'),
+                    result.get('llm_retries'), result.get('duration_seconds'), result.get('cost_usd'),
+                    result.get('model'), result.get('model_tier')
+                ))
+                restored += cursor.rowcount
+            conn.execute(
+                "UPDATE jobs SET archived_at = NULL, rehydrated_at = ? WHERE id = ?",
+                (datetime.now(), job_id)
+            )
+            conn.commit()
+        return restored
+    
+    def compact(self, max_pages: Optional[int] = None):
+        """Return free pages to the filesystem with an incremental vacuum.
+
+        Databases created before auto_vacuum was enabled get a one-time full VACUUM
+        to switch them to incremental mode.
+        """
+        with self._connect() as conn:
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        
+        # VACUUM can't run inside a transaction, so use an autocommit connection
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT, isolation_level=None)
+        try:
+            if auto_vacuum != 2:
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                # VACUUM may renumber file_results rowids, which the search index refers to
+                conn.execute("INSERT INTO file_results_fts (file_results_fts) VALUES ('rebuild')")
+            elif max_pages is None:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+            else:
+                conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        finally:
+            conn.close()
+    
+    def get_result_cursor(self, job_id: str) -> int:
+        """Get the rowid of a job's newest result, used as a starting point for change polling"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(MAX(rowid), 0) FROM file_results WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+            return row[0]
+    
+    def poll_job_updates(self, cursors: Dict[str, int]) -> Dict[str, List[Dict[str, Any]]]:
+        """Read the current rows of several jobs and their results stored after each cursor.
+
+        `cursors` maps job IDs to the last result rowid already seen. Everything is
+        read in one connection so a single poll serves every watched job.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            placeholders = ", ".join("?" for _ in cursors)
+            jobs = conn.execute(
+                f"SELECT * FROM jobs WHERE id IN ({placeholders})",
+                tuple(cursors)
+            ).fetchall()
+            
+            results = []
+            for job_id, cursor in cursors.items():
+                rows = conn.execute("""
+                    SELECT rowid, id, job_id, file_path, score, created_at
+                    FROM file_results WHERE job_id = ? AND rowid > ?
+                    ORDER BY rowid
+                """, (job_id, cursor))
+                results.extend(dict(row) for row in rows)
+            
+            return {'jobs': [dict(job) for job in jobs], 'results': results}
+    
+    def search_results(self, query: str, job_id: Optional[str] = None,
+                       limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Full-text search over result file paths, integration considerations and optimized code.
+
+        `query` uses FTS5 syntax, so phrases ("signature changed"), prefixes (pars*)
+        and column filters (integration_considerations: imports) are supported.
+        Results are ordered by bm25 relevance, weighting path and considerations
+        matches above matches in the code. Raises ValueError for malformed queries.
+        """
+        job_clause = "AND r.job_id = ?" if job_id else ""
+        params = [query, job_id] if job_id else [query]
+        
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            try:
+                cursor = conn.execute(f"""
+                    SELECT r.id, r.job_id, r.file_path, r.score, r.created_at,
+                           snippet(file_results_fts, -1, '<mark>', '</mark>', '...', 12) AS snippet,
+                           bm25(file_results_fts, 5.0, 3.0, 1.0) AS rank
+                    FROM file_results_fts
+                    JOIN file_results r ON r.rowid = file_results_fts.rowid
+                    WHERE file_results_fts MATCH ? {job_clause}
+                    ORDER BY rank
+                    LIMIT ? OFFSET ?
+                """, (*params, limit, offset))
+                return [dict(row) for row in cursor.fetchall()]
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Invalid search query: {e}") from e
+    
+    def get_job_stats(self, job_id: str) -> Dict[str, Any]:
+        """Get the incrementally maintained summary statistics for a job"""
+        with self._connect() as conn:
+            stats = self._read_job_stats(conn, job_id)
+        
+        if stats is None:
+            # Jobs recorded before job_stats existed are summarized once, then kept up to date
+            stats = self.rebuild_job_stats(job_id)
+        return stats
+    
+    def rebuild_job_stats(self, job_id: str) -> Dict[str, Any]:
+        """Recompute a job's statistics from its stored results"""
+        stats = self._empty_job_stats(job_id)
+        
+        with self._connect() as conn:
+            # Read and replace under one write lock, so a result saved meanwhile is neither lost nor counted twice
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "SELECT score, metrics FROM file_results WHERE job_id = ?",
+                (job_id,)
+            )
+            for score, metrics in cursor:
+                self._accumulate_job_stats(stats, score, json.loads(metrics))
+            self._write_job_stats(conn, stats)
+            conn.commit()
+        
+        return stats
+    
+    @staticmethod
+    def _empty_job_stats(job_id: str) -> Dict[str, Any]:
+        return {
+            'job_id': job_id,
+            'result_count': 0,
+            'score_sum': 0.0,
+            'score_min': None,
+            'score_max': None,
+            'score_histogram': {},
+            'metric_tallies': {},
+        }
+    
+    @staticmethod
+    def _accumulate_job_stats(stats: Dict[str, Any], score: float, metrics: Dict[str, Any]):
+        """Fold a single result into a job's statistics"""
+        stats['result_count'] += 1
+        stats['score_sum'] += score
+        stats['score_min'] = score if stats['score_min'] is None else min(stats['score_min'], score)
+        stats['score_max'] = score if stats['score_max'] is None else max(stats['score_max'], score)
+        
+        bucket = str(math.floor(score / SCORE_BUCKET_WIDTH) * SCORE_BUCKET_WIDTH)
+        histogram = stats['score_histogram']
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+        
+        tallies = stats['metric_tallies']
+        for name, value in metrics.items():
+            if value is not None and str(value).strip().lower() not in _UNREPORTED_METRIC_VALUES:
+                tallies[name] = tallies.get(name, 0) + 1
+    
+    @staticmethod
+    def _read_job_stats(conn: sqlite3.Connection, job_id: str) -> Optional[Dict[str, Any]]:
+        cursor = conn.execute(
+            """SELECT job_id, result_count, score_sum, score_min, score_max,
+                      score_histogram, metric_tallies
+               FROM job_stats WHERE job_id = ?""",
+            (job_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row[0],
+            'result_count': row[1],
+            'score_sum': row[2],
+            'score_min': row[3],
+            'score_max': row[4],
+            'score_histogram': json.loads(row[5]),
+            'metric_tallies': json.loads(row[6]),
+        }
+    
+    @staticmethod
+    def _write_job_stats(conn: sqlite3.Connection, stats: Dict[str, Any]):
+        conn.execute("""
+            INSERT OR REPLACE INTO job_stats
+            (job_id, result_count, score_sum, score_min, score_max, score_histogram, metric_tallies, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            stats['job_id'], stats['result_count'], stats['score_sum'],
+            stats['score_min'], stats['score_max'],
+            json.dumps(stats['score_histogram']), json.dumps(stats['metric_tallies']),
+            datetime.now()
+        ))
+    
+    def get_cached_result(self, key: str, max_age: float) -> Optional[str]:
+        """Get a cached value stored less than `max_age` seconds ago"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM result_cache WHERE key = ? AND created_at >= ?",
+                (key, time.time() - max_age)
+            ).fetchone()
+            return row[0] if row else None
+    
+    def store_cached_result(self, key: str, value: str, max_age: float):
+        """Cache a value, dropping entries older than `max_age` seconds"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, now)
+            )
+            conn.execute("DELETE FROM result_cache WHERE created_at < ?", (now - max_age,))
+            conn.commit()
+    
+    def take_rate_limit_token(self, name: str, rate: float, burst: float) -> float:
+        """Take a token from the named token bucket; returns 0 if one was taken, else seconds until one is available.
+
+        The bucket refills at `rate` tokens per second up to `burst`. It lives in the
+        database so that every process sharing the file draws from the same budget.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            # Take the write lock before reading so concurrent processes can't spend the same token
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (name,)
+            ).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(now - row[1], 0) * rate)
+            
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            
+            conn.execute("""
+                INSERT INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            """, (name, tokens, now))
+            conn.commit()
+            return wait
+
+
+class AsyncDatabase:
+    """Async facade over Database for use inside the API event loop.
+
+    Every Database method is exposed as a coroutine that runs the blocking sqlite
+    call on a dedicated pool of DB threads, so a slow query or a lock held by a
+    worker process never stalls unrelated requests on the event loop.
+    """
+
+    db: Database
+    _executor: ThreadPoolExecutor
+
+    def __init__(self, db: Optional[Database] = None, max_threads: int = DB_THREADS):
+        self.db = db or Database()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_threads, thread_name_prefix="sloptimize-db"
+        )
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking callable on the DB threads and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args: Any, **kwargs: Any) -> Any:
+            return await self.run(attr, *args, **kwargs)
+
+        return method
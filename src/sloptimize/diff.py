@@ -0,0 +1,23 @@
+"""
+Unified diffs between input code and its optimized version
+"""
+
+import difflib
+
+NO_NEWLINE_MARKER = "\\ No newline at end of file\n"
+
+
+def unified_diff(original: str, updated: str, name: str = "snippet.py", context: int = 3) -> str:
+    """Unified diff that turns `original` into `updated`, applicable with `patch` or `git apply`.
+
+    Returns an empty string when the two are identical.
+    """
+    lines = difflib.unified_diff(
+        original.splitlines(keepends=True),
+        updated.splitlines(keepends=True),
+        fromfile=f"a/{name}",
+        tofile=f"b/{name}",
+        n=context,
+    )
+    # difflib leaves a final line without its newline; patch tools expect an explicit marker
+    return "".join(line if line.endswith("\n") else f"{line}\n{NO_NEWLINE_MARKER}" for line in lines)
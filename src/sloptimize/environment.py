@@ -22,10 +22,114 @@ XAI_BASE_URL = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")
 # Model Configuration
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "o1-3")
 GROK_MODEL = os.getenv("GROK_MODEL", "grok-4")
+# Fast, cheap models tried first when routing cascades
+OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-4o-mini")
+GROK_FAST_MODEL = os.getenv("GROK_FAST_MODEL", "grok-3-mini")
 
-# Provider Configuration
+# Provider Configuration ("openai", "grok", or "fake"/"cassette" for benchmarks, tests and offline runs)
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 
+# Model Routing Configuration, the default for jobs that don't choose a policy:
+# "strong" uses only the model above, "fast" only the fast model, and "cascade"
+# tries the fast model first and escalates to the strong one when needed
+ROUTING_POLICY = os.getenv("ROUTING_POLICY", "strong")
+# Under "cascade", snippets over either limit go straight to the strong model
+ROUTING_FAST_MAX_CHARS = int(os.getenv("ROUTING_FAST_MAX_CHARS", "6000"))
+ROUTING_FAST_MAX_BRANCHES = int(os.getenv("ROUTING_FAST_MAX_BRANCHES", "40"))
+# Fast answers that leave the code unchanged are redone by the strong model (0 disables)
+ROUTING_ESCALATE_UNCHANGED = bool(int(os.getenv("ROUTING_ESCALATE_UNCHANGED", "1")))
+
+# Fake Provider Configuration
+# Latency is lognormal around the median; sigma widens the tail (0 makes it constant)
+FAKE_LLM_LATENCY_MEDIAN = float(os.getenv("FAKE_LLM_LATENCY_MEDIAN", "0.5"))
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))
+# Output tokens streamed per second after the latency (0 streams instantly)
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0"))
+# Fraction of requests that fail with FakeProviderError
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+# Cassette Provider Configuration (LLM_PROVIDER=cassette)
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "cassettes")
+# "replay" records misses from CASSETTE_PROVIDER, "strict" fails on a miss, "record" re-records everything
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "replay")
+CASSETTE_PROVIDER = os.getenv("CASSETTE_PROVIDER", "openai")
+
+# Pricing Configuration, in USD per million tokens of the configured model (0 leaves cost untracked)
+LLM_INPUT_PRICE = float(os.getenv("LLM_INPUT_PRICE", "0"))
+LLM_CACHED_INPUT_PRICE = float(os.getenv("LLM_CACHED_INPUT_PRICE", str(LLM_INPUT_PRICE)))
+LLM_OUTPUT_PRICE = float(os.getenv("LLM_OUTPUT_PRICE", "0"))
+# Prices of the fast model, defaulting to those of the configured model
+LLM_FAST_INPUT_PRICE = float(os.getenv("LLM_FAST_INPUT_PRICE", str(LLM_INPUT_PRICE)))
+LLM_FAST_CACHED_INPUT_PRICE = float(os.getenv("LLM_FAST_CACHED_INPUT_PRICE", str(LLM_FAST_INPUT_PRICE)))
+LLM_FAST_OUTPUT_PRICE = float(os.getenv("LLM_FAST_OUTPUT_PRICE", str(LLM_OUTPUT_PRICE)))
+
+# Tracing Configuration
+# Append finished spans as JSON lines to this file (empty disables the file)
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Also export spans over OTLP/HTTP, e.g. http://localhost:4318/v1/traces (needs opentelemetry-sdk)
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+
+# Database Configuration
+DB_PATH = os.getenv("SLOPTIMIZE_DB_PATH", "sloptimize.db")
+DB_THREADS = int(os.getenv("DB_THREADS", "4"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "30"))
+
+# API Configuration
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+GIT_LS_REMOTE_TIMEOUT = float(os.getenv("GIT_LS_REMOTE_TIMEOUT", "10"))
+GIT_LS_REMOTE_CONCURRENCY = int(os.getenv("GIT_LS_REMOTE_CONCURRENCY", "16"))
+
+# Archive Upload Configuration
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+ARCHIVE_MAX_FILES = int(os.getenv("ARCHIVE_MAX_FILES", "50000"))
+ARCHIVE_MAX_EXTRACTED_BYTES = int(os.getenv("ARCHIVE_MAX_EXTRACTED_BYTES", str(1024 * 1024 * 1024)))
+ARCHIVE_MAX_RATIO = float(os.getenv("ARCHIVE_MAX_RATIO", "100"))
+
+# Admission Control Configuration
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "100"))
+MAX_JOBS_PER_CLIENT = int(os.getenv("MAX_JOBS_PER_CLIENT", "10"))
+# URLs accepted per batch; by default no more than one client may have queued at once
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", str(min(MAX_QUEUE_DEPTH, MAX_JOBS_PER_CLIENT))))
+QUEUE_DRAIN_WINDOW = int(os.getenv("QUEUE_DRAIN_WINDOW", "3600"))
+MAX_RETRY_AFTER = int(os.getenv("MAX_RETRY_AFTER", "3600"))
+# Peers, such as the nginx proxy, whose X-Real-IP header is trusted as the client address
+TRUSTED_PROXIES = {
+    address.strip() for address in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if address.strip()
+}
+
+# Worker Configuration
+# Jobs processing at once across the API and the worker daemon, and seconds between checks for finished workers
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_REAP_INTERVAL = float(os.getenv("WORKER_REAP_INTERVAL", "5"))
+# Directory for per-job profiles (empty disables profiling) and the sampling interval in seconds
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+
+# Metrics Configuration (METRICS_PORT=0 disables the worker daemon's exporter)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+
+# Job Event Stream Configuration
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+
+# Retention Configuration (RETENTION_DAYS=0 disables archival)
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "0"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives")
+
 # MCP Server Configuration
 MCP_HOST = os.getenv("MCP_HOST", "0.0.0.0")
-MCP_PORT = int(os.getenv("MCP_PORT", "8000"))
\ No newline at end of file
+MCP_PORT = int(os.getenv("MCP_PORT", "8000"))
+MCP_BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "4"))
+MCP_BATCH_MAX_SNIPPETS = int(os.getenv("MCP_BATCH_MAX_SNIPPETS", "50"))
+MCP_PROGRESS_INTERVAL = float(os.getenv("MCP_PROGRESS_INTERVAL", "0.5"))
+# Processes serving MCP on the same port; above 1 the server runs stateless behind a supervisor
+MCP_PROCESSES = int(os.getenv("MCP_PROCESSES", "1"))
+# Results shared by all MCP processes through the database (0 disables the cache)
+MCP_CACHE_TTL = float(os.getenv("MCP_CACHE_TTL", "86400"))
+# Provider requests per minute across all MCP processes (0 disables the limiter)
+LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0"))
+LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", "10"))
\ No newline at end of file
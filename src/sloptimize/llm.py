@@ -1,12 +1,29 @@
-from typing import Optional, TypeVar, Type
+from typing import Callable, Optional, TypeVar, Type
 from pydantic import BaseModel
 from openai import OpenAI
 from xai_sdk import Client
 from xai_sdk.chat import system, user, assistant
 import time
+import hashlib
+import json
 import logging
+import os
+import random
+import tempfile
+import threading
+from pathlib import Path
 from pydantic_core import ValidationError
+from .metrics import record_llm_usage
+from .tracing import record_retry, record_usage, span
 from .environment import (
+    CASSETTE_DIR,
+    CASSETTE_MODE,
+    CASSETTE_PROVIDER,
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_LATENCY_MEDIAN,
+    FAKE_LLM_LATENCY_SIGMA,
+    FAKE_LLM_SEED,
+    FAKE_LLM_TOKENS_PER_SECOND,
     OPENAI_API_KEY,
     OPENAI_MODEL,
     XAI_API_KEY,
@@ -15,6 +32,21 @@ from .environment import (
 
 T = TypeVar("T", bound=BaseModel)
 
+# Called with a short status message and the number of output tokens streamed so far
+ProgressCallback = Callable[[str, int], None]
+
+
+def _record_usage(provider: str, input_tokens: Optional[int], output_tokens: Optional[int],
+                  cached_tokens: Optional[int] = None):
+    """Count a call's tokens in the metrics and on the current trace span"""
+    record_llm_usage(provider, input_tokens, output_tokens)
+    record_usage(input_tokens, output_tokens, cached_tokens)
+
+
+def _openai_cached_tokens(usage) -> Optional[int]:
+    details = getattr(usage, "input_tokens_details", None)
+    return getattr(details, "cached_tokens", None)
+
 """
 LLM client configuration for OpenAI and Grok
 
@@ -32,11 +64,62 @@ API INVESTIGATION FINDINGS:
 IMPLEMENTATION STRATEGY:
 - LLMClient: Uses OpenAI responses API for OpenAI models
 - GrokClient: Uses native xAI SDK for Grok models
+- FakeClient: Deterministic local provider for benchmarks and offline runs
+- CassetteClient: Records another provider's responses to disk and replays them
 - Both expose same __call__ interface for consistency
 - TypeVar T ensures type safety - returns the exact Pydantic model type passed in
 """
 
 
+class CompletionCancelled(Exception):
+    """Raised when a completion is abandoned through its CancelToken"""
+
+
+class CancelToken:
+    """Thread-safe cancellation signal for an in-flight completion.
+
+    The caller cancels from any thread; the client checks `cancelled` between
+    steps and registers a callback with `on_cancel` to abort a request that is
+    blocked waiting on the provider.
+    """
+
+    _event: threading.Event
+    _callbacks: list[Callable[[], None]]
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Run `callback` on cancellation, immediately if already cancelled"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep for up to `timeout` seconds, returning early with True if cancelled"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise CompletionCancelled("Completion was cancelled")
+
+
 class LLMClient:
     """Wrapper for OpenAI LLM interactions.
 
@@ -58,6 +141,8 @@ class LLMClient:
         response_model: Type[T],
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancelToken] = None,
     ) -> T:
         """Complete a chat conversation with structured output using the responses API.
 
@@ -70,10 +155,27 @@ class LLMClient:
             response_model: The type to parse the response into.
             temperature: Controls randomness in generation (default: 0.7).
             max_tokens: Optional limit on output tokens.
+            on_progress: Optional callback for request and streaming progress.
+            cancel_token: Optional token that aborts the request when cancelled.
 
         Returns:
             Parsed response of type T.
         """
+        with span("provider.call", provider="openai", model=self.model):
+            if on_progress is not None or cancel_token is not None:
+                return self._stream(
+                    messages, response_model, temperature, max_tokens,
+                    on_progress or (lambda message, tokens: None), cancel_token or CancelToken(),
+                )
+            return self._parse(messages, response_model, temperature, max_tokens)
+
+    def _parse(
+        self,
+        messages: list[dict[str, str]],
+        response_model: Type[T],
+        temperature: float,
+        max_tokens: Optional[int],
+    ) -> T:
         response = self.client.responses.parse(
             model=self.model,
             input=messages,
@@ -81,6 +183,53 @@ class LLMClient:
             temperature=temperature,
             max_output_tokens=max_tokens,
         )
+        if response.usage:
+            _record_usage(
+                "openai", response.usage.input_tokens, response.usage.output_tokens,
+                _openai_cached_tokens(response.usage),
+            )
+        return response.output_parsed
+
+    def _stream(
+        self,
+        messages: list[dict[str, str]],
+        response_model: Type[T],
+        temperature: float,
+        max_tokens: Optional[int],
+        on_progress: ProgressCallback,
+        cancel_token: CancelToken,
+    ) -> T:
+        """Stream the completion so progress can be reported and the request aborted mid-flight"""
+        cancel_token.raise_if_cancelled()
+        with self.client.responses.stream(
+            model=self.model,
+            input=messages,
+            text_format=response_model,
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+        ) as stream:
+            # Closing the stream drops the connection, which stops generation on the provider side
+            cancel_token.on_cancel(stream.close)
+            on_progress("Request sent", 0)
+
+            streamed = 0
+            try:
+                for event in stream:
+                    cancel_token.raise_if_cancelled()
+                    if event.type == "response.output_text.delta":
+                        streamed += 1
+                        on_progress("Streaming response", streamed)
+                response = stream.get_final_response()
+            except Exception:
+                # Reading a stream closed by cancel() fails with a transport error
+                cancel_token.raise_if_cancelled()
+                raise
+
+        if response.usage:
+            _record_usage(
+                "openai", response.usage.input_tokens, response.usage.output_tokens,
+                _openai_cached_tokens(response.usage),
+            )
         return response.output_parsed
 
 
@@ -107,48 +256,282 @@ class GrokClient:
         temperature: float = 0.7,
         max_tokens: int | None = None,
         max_retries: int = 2,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancelToken] = None,
     ) -> T:
         """Complete a chat conversation with structured output using the xAI SDK.
 
         This method creates a chat, appends messages, and parses the response into
         a Pydantic model. It supports retries on validation, connection, or timeout errors
         with exponential backoff.
+
+        The SDK only parses structured output from complete responses, so progress
+        stops at "Request sent" and cancellation takes effect between attempts
+        rather than aborting a request already in flight.
         """
-        for attempt in range(max_retries + 1):
-            try:
-                chat = self.client.chat.create(
-                    model=self.model,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
-                for message in messages:
-                    if message["role"] == "system":
-                        chat.append(system(message["content"]))
-                    elif message["role"] == "user":
-                        chat.append(user(message["content"]))
-                    elif message["role"] == "assistant":
-                        chat.append(assistant(message["content"]))
-                    else:
-                        raise ValueError(f"Unsupported role: {message['role']}")
-                response, parsed_object = chat.parse(response_model)
-                return parsed_object
-            except (ValidationError, ConnectionError, TimeoutError) as e:
-                if attempt == max_retries:
-                    logging.error(f"Failed after {max_retries + 1} attempts: {e}")
-                    raise
-                wait_time = 2**attempt
-                logging.warning(
-                    f"Attempt {attempt + 1} failed: {e}. Retrying in {wait_time}s..."
-                )
-                time.sleep(wait_time)
+        with span("provider.call", provider="grok", model=self.model):
+            for attempt in range(max_retries + 1):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                if on_progress is not None:
+                    on_progress("Request sent", 0)
+                try:
+                    chat = self.client.chat.create(
+                        model=self.model,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                    )
+                    for message in messages:
+                        if message["role"] == "system":
+                            chat.append(system(message["content"]))
+                        elif message["role"] == "user":
+                            chat.append(user(message["content"]))
+                        elif message["role"] == "assistant":
+                            chat.append(assistant(message["content"]))
+                        else:
+                            raise ValueError(f"Unsupported role: {message['role']}")
+                    response, parsed_object = chat.parse(response_model)
+                    _record_usage(
+                        "grok", response.usage.prompt_tokens, response.usage.completion_tokens,
+                        getattr(response.usage, "cached_prompt_text_tokens", None),
+                    )
+                    return parsed_object
+                except (ValidationError, ConnectionError, TimeoutError) as e:
+                    if attempt == max_retries:
+                        logging.error(f"Failed after {max_retries + 1} attempts: {e}")
+                        raise
+                    wait_time = 2**attempt
+                    record_retry()
+                    logging.warning(
+                        f"Attempt {attempt + 1} failed: {e}. Retrying in {wait_time}s..."
+                    )
+                    time.sleep(wait_time)
 
 
-openai_client = LLMClient(
-    client=OpenAI(api_key=OPENAI_API_KEY),
-    model=OPENAI_MODEL,
-)
+class FakeProviderError(Exception):
+    """Failure injected by FakeClient to simulate a provider error"""
 
-grok_client = GrokClient(
-    client=Client(api_key=XAI_API_KEY),
-    model=GROK_MODEL,
-)
+
+class FakeClient:
+    """Deterministic local provider for benchmarks and offline runs.
+
+    Answers with the optimization response shape sloptimize requests, echoing the
+    last user message back as the optimized code. Each request waits a latency
+    drawn from a lognormal distribution around `latency_median` seconds, then
+    streams an output token per four characters at `tokens_per_second` (0 streams
+    instantly), and fails with FakeProviderError at `error_rate`. Random draws are
+    seeded from `seed` and the request content, so the same request always gets the
+    same latency and outcome regardless of concurrency or order.
+    """
+
+    model: str
+    latency_median: float
+    latency_sigma: float
+    tokens_per_second: float
+    error_rate: float
+    seed: int
+
+    def __init__(
+        self,
+        latency_median: float = FAKE_LLM_LATENCY_MEDIAN,
+        latency_sigma: float = FAKE_LLM_LATENCY_SIGMA,
+        tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        seed: int = FAKE_LLM_SEED,
+        model: str = "fake",
+    ) -> None:
+        self.model = model
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.seed = seed
+
+    def __call__(
+        self,
+        messages: list[dict[str, str]],
+        response_model: Type[T],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> T:
+        """Simulate a structured completion, honouring progress and cancellation like LLMClient"""
+        cancel_token = cancel_token or CancelToken()
+        on_progress = on_progress or (lambda message, tokens: None)
+        code = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        digest = hashlib.sha256(f"{self.seed}\0{code}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+
+        with span("provider.call", provider="fake", model=self.model):
+            cancel_token.raise_if_cancelled()
+            on_progress("Request sent", 0)
+            latency = self.latency_median * rng.lognormvariate(0, self.latency_sigma)
+            cancel_token.wait(latency)
+            cancel_token.raise_if_cancelled()
+            if rng.random() < self.error_rate:
+                raise FakeProviderError("Injected provider error")
+
+            output_tokens = max(len(code) // 4, 1)
+            if max_tokens is not None:
+                output_tokens = min(output_tokens, max_tokens)
+            for streamed in range(1, output_tokens + 1):
+                if self.tokens_per_second > 0:
+                    cancel_token.wait(1 / self.tokens_per_second)
+                cancel_token.raise_if_cancelled()
+                on_progress("Streaming response", streamed)
+
+            input_tokens = sum(len(m["content"]) for m in messages) // 4
+            _record_usage("fake", input_tokens, output_tokens)
+            return response_model.model_validate({
+                "optimized_code": code,
+                "metrics": {"complexity_improvement": None, "readability_score": None, "performance_gain": None},
+                "score": round(rng.uniform(0, 10), 1),
+                "integration_considerations": [],
+            })
+
+
+class CassetteMiss(LookupError):
+    """Raised in strict mode when no cassette was recorded for a request"""
+
+
+CASSETTE_MODES = ("record", "replay", "strict")
+
+
+class CassetteClient:
+    """Records structured responses from another provider to disk and replays them offline.
+
+    Each request is keyed by a hash of its normalized messages, parameters,
+    response schema and recording provider, and stored as `<hash>.json` in
+    `directory`. In "replay" mode hits are served from disk and misses are
+    recorded from `provider`; "strict" fails on a miss instead, so a run is
+    guaranteed to stay offline; "record" always calls the provider and
+    overwrites the cassette. Cassettes are written atomically, so parallel runs
+    can record into the same directory. `model` records from that model instead
+    of the provider's default, and is part of the key when set. The recorded
+    call's token usage is stored with the response and counted again on replay.
+    """
+
+    model: str
+    directory: Path
+    mode: str
+    provider: str
+    provider_model: Optional[str]
+    _client: Optional[Callable[..., BaseModel]]
+
+    def __init__(
+        self,
+        directory: str = CASSETTE_DIR,
+        mode: str = CASSETTE_MODE,
+        provider: str = CASSETTE_PROVIDER,
+        client: Optional[Callable[..., BaseModel]] = None,
+        model: Optional[str] = None,
+    ) -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Invalid CASSETTE_MODE: {mode}. Must be one of {', '.join(CASSETTE_MODES)}")
+        if provider == "cassette":
+            raise ValueError("CASSETTE_PROVIDER must name a real provider")
+        self.model = f"cassette:{provider}:{model}" if model else f"cassette:{provider}"
+        self.directory = Path(directory)
+        self.mode = mode
+        self.provider = provider
+        self.provider_model = model
+        # The recording provider is only created on a miss, so replays need no credentials
+        self._client = client
+
+    def __call__(
+        self,
+        messages: list[dict[str, str]],
+        response_model: Type[T],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> T:
+        """Replay the recorded response for this request, recording it first if the mode allows"""
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        request = self._normalize(messages, response_model, temperature, max_tokens)
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+        path = self.directory / f"{key}.json"
+
+        with span("provider.call", provider="cassette", model=self.model, cassette=key) as call:
+            if self.mode != "record" and path.exists():
+                call.set(replayed=True)
+                cassette = json.loads(path.read_text())
+                # Cassettes recorded before usage was stored replay without it
+                if usage := cassette.get("usage"):
+                    _record_usage("cassette", usage["input_tokens"], usage["output_tokens"], usage["cached_tokens"])
+                return response_model.model_validate(cassette["response"])
+            if self.mode == "strict":
+                raise CassetteMiss(f"No cassette recorded for request {key}")
+
+            if self._client is None:
+                self._client = create_client(self.provider, self.provider_model)
+            response = self._client(
+                messages, response_model, temperature=temperature, max_tokens=max_tokens,
+                on_progress=on_progress, cancel_token=cancel_token,
+            )
+            usage = call.usage()
+            self._write(path, {
+                "request": request,
+                "response": response.model_dump(mode="json"),
+                "usage": {counter: usage[counter] for counter in ("input_tokens", "output_tokens", "cached_tokens")},
+            })
+            return response
+
+    def _normalize(
+        self,
+        messages: list[dict[str, str]],
+        response_model: Type[BaseModel],
+        temperature: float,
+        max_tokens: Optional[int],
+    ) -> dict:
+        """Reduce a request to what determines its response, ignoring insignificant whitespace"""
+        request = {
+            "provider": self.provider,
+            "messages": [
+                {
+                    "role": message["role"],
+                    "content": "\n".join(line.rstrip() for line in message["content"].strip().splitlines()),
+                }
+                for message in messages
+            ],
+            "response_schema": response_model.model_json_schema(),
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        # Only set for non-default models, so cassettes recorded before model routing still match
+        if self.provider_model:
+            request["model"] = self.provider_model
+        return request
+
+    def _write(self, path: Path, cassette: dict) -> None:
+        """Write a cassette via a temporary file and rename, so readers never see a partial one"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".partial")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(cassette, f, indent=2, sort_keys=True)
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+
+def create_client(provider: str, model: Optional[str] = None):
+    """Build the client for an LLM_PROVIDER; only the selected provider's SDK client is created.
+
+    `model` overrides the provider's configured model.
+    """
+    if provider == "openai":
+        return LLMClient(client=OpenAI(api_key=OPENAI_API_KEY), model=model or OPENAI_MODEL)
+    if provider == "grok":
+        return GrokClient(client=Client(api_key=XAI_API_KEY), model=model or GROK_MODEL)
+    if provider == "fake":
+        return FakeClient(model=model or "fake")
+    if provider == "cassette":
+        return CassetteClient(model=model)
+    raise ValueError(
+        f"Invalid LLM_PROVIDER: {provider}. Must be 'openai', 'grok', 'fake' or 'cassette'"
+    )
@@ -2,22 +2,22 @@
 Main sloptimize functionality
 """
 
+import functools
+import hashlib
+import logging
 import os
 from typing import Dict, Any, List, Optional
 import pydantic
 # import weave
 
-from .environment import LLM_PROVIDER
-from .llm import openai_client, grok_client
+from .budget import token_cost
+from .environment import LLM_PROVIDER, ROUTING_POLICY
+from .llm import CancelToken, CompletionCancelled, ProgressCallback
+from .metrics import LLM_ESCALATIONS
+from .routing import FAST_TIER, STRONG_TIER, ModelRouter, escalation_reason, route
+from .tracing import record_cost, span
 
-if LLM_PROVIDER == "openai":
-    client = openai_client
-elif LLM_PROVIDER == "grok":
-    client = grok_client
-else:
-    raise ValueError(
-        f"Invalid LLM_PROVIDER: {LLM_PROVIDER}. Must be 'openai' or 'grok'"
-    )
+router = ModelRouter(LLM_PROVIDER)
 
 
 # schemas for interaction with the LLM
@@ -66,32 +66,93 @@ class OptimizationAssessment(pydantic.BaseModel):
     recommendations: Optional[List[str]]
 
 
+class TokenUsage(pydantic.BaseModel):
+    """Provider usage of a sloptimize call, including any retries"""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    llm_retries: int = 0
+
+
 class SloptimizeResult(pydantic.BaseModel):
     """Internal result type for sloptimize operations"""
 
     source_code: str
     assessment: OptimizationAssessment
     integration_considerations: List[str]
+    usage: TokenUsage = TokenUsage()
+    # Model that produced the result and its routing tier, "fast" or "strong"
+    model: Optional[str] = None
+    model_tier: Optional[str] = None
 
 
+@functools.lru_cache(maxsize=None)
 def _get_system_prompt() -> str:
-    """Load system prompt from PROMPT.md"""
+    """Load system prompt from PROMPT.md, once per process"""
     prompt_path = os.path.join(os.path.dirname(__file__), "PROMPT.md")
     with open(prompt_path, "r") as f:
         return f.read()
 
 
+@functools.lru_cache(maxsize=None)
+def _system_prompt_hash() -> str:
+    return hashlib.sha256(_get_system_prompt().encode("utf-8")).hexdigest()
+
+
+def result_cache_key(code: str, routing_policy: Optional[str] = None) -> str:
+    """Key a result by everything that determines it: provider, routing, models, prompt and code"""
+    request = "\0".join([
+        LLM_PROVIDER, routing_policy or ROUTING_POLICY, router.strong.model, router.fast.model,
+        _system_prompt_hash(), code,
+    ])
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def _complete(
+    tier: str,
+    messages: List[Dict[str, str]],
+    on_progress: Optional[ProgressCallback],
+    cancel_token: Optional[CancelToken],
+) -> LLMOptimizationResponse:
+    with span("completion", model_tier=tier) as attempt:
+        try:
+            return router.client(tier)(
+                messages,
+                LLMOptimizationResponse,
+                temperature=0.3,
+                on_progress=on_progress,
+                cancel_token=cancel_token,
+            )
+        finally:
+            # Priced at this tier's rates, so an escalated request pays each model's own price
+            usage = attempt.usage()
+            record_cost(token_cost(usage["input_tokens"], usage["output_tokens"], usage["cached_tokens"], tier))
+
+
 # @weave.op()
-def sloptimize(code: str) -> SloptimizeResult:
+def sloptimize(
+    code: str,
+    on_progress: Optional[ProgressCallback] = None,
+    cancel_token: Optional[CancelToken] = None,
+    routing_policy: Optional[str] = None,
+) -> SloptimizeResult:
     """
     Analyze and optimize the provided code
 
     Args:
         code: Source code to analyze and optimize
+        on_progress: Optional callback for request and streaming progress
+        cancel_token: Optional token that aborts the LLM request when cancelled
+        routing_policy: "strong", "fast" or "cascade"; defaults to ROUTING_POLICY
 
     Returns:
-        SloptimizeResult with optimized code, assessment, and considerations
+        SloptimizeResult with optimized code, assessment, considerations, token usage
+        and the model that answered
     """
+    policy = routing_policy or ROUTING_POLICY
+    tier, reason = route(code, policy)
+
     # Prepare messages for LLM
     messages = [
         {
@@ -104,21 +165,48 @@ def sloptimize(code: str) -> SloptimizeResult:
         },
     ]
 
-    # Get structured LLM response
-    completion = client(messages, LLMOptimizationResponse, temperature=0.3)
-
-    # Convert LLM response to internal format
-    assessment = OptimizationAssessment(
-        score=completion.score,
-        metrics=completion.metrics.model_dump(),
-        recommendations=None,  # No longer in LLM response
-    )
-
-    return SloptimizeResult(
-        source_code=completion.optimized_code,
-        assessment=assessment,
-        integration_considerations=completion.integration_considerations,
-    )
+    with span("sloptimize", provider=LLM_PROVIDER, routing_policy=policy, code_chars=len(code)) as call:
+        # Get structured LLM response, from the fast model first when the policy allows
+        completion = None
+        if tier == FAST_TIER:
+            try:
+                completion = _complete(FAST_TIER, messages, on_progress, cancel_token)
+            except CompletionCancelled:
+                raise
+            except Exception as e:
+                if policy != "cascade":
+                    raise
+                logging.warning(f"Fast model failed, escalating: {e}")
+                reason = "error"
+            else:
+                if policy == "cascade":
+                    reason = escalation_reason(code, completion)
+            if reason is not None:
+                tier, completion = STRONG_TIER, None
+        if reason is not None:
+            LLM_ESCALATIONS.labels(reason=reason).inc()
+
+        if completion is None:
+            completion = _complete(STRONG_TIER, messages, on_progress, cancel_token)
+        model = router.client(tier).model
+        call.set(model=model, model_tier=tier, routing_reason=reason)
+
+        # Convert LLM response to internal format
+        with span("parse"):
+            assessment = OptimizationAssessment(
+                score=completion.score,
+                metrics=completion.metrics.model_dump(),
+                recommendations=None,  # No longer in LLM response
+            )
+
+            return SloptimizeResult(
+                source_code=completion.optimized_code,
+                assessment=assessment,
+                integration_considerations=completion.integration_considerations,
+                usage=TokenUsage(**call.usage()),
+                model=model,
+                model_tier=tier,
+            )
 
 
 # weave.init("sloptimize")
@@ -0,0 +1,151 @@
+"""
+Prometheus metrics for the sloptimize API, worker daemon and workers
+
+Workers run in separate processes, so when `PROMETHEUS_MULTIPROC_DIR` is set
+every process writes its samples there and the exporter aggregates all of them.
+Each service gets its own directory, inherited by the workers it starts, and
+wipes it when it starts; files of exited workers keep their counts until then.
+The queue gauges are read from the database, so only the API exports them.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import multiprocess
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from .database import Database, JobStatus
+from .tracing import Span, span
+
+# Covers a fast DB write through a multi-minute LLM call or clone
+STAGE_BUCKETS = (0.005, 0.025, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_DURATION = Histogram(
+    "sloptimize_stage_duration_seconds",
+    "Time spent in each stage of processing a repository job",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "sloptimize_llm_tokens_total",
+    "Tokens sent to and received from the LLM provider",
+    ["provider", "direction"],
+)
+LLM_ESCALATIONS = Counter(
+    "sloptimize_llm_escalations_total",
+    "Requests routed past the fast model to the strong one, by reason",
+    ["reason"],
+)
+ERRORS = Counter(
+    "sloptimize_errors_total",
+    "Errors raised while processing jobs, by stage and exception type",
+    ["stage", "type"],
+)
+SUBMISSIONS = Counter(
+    "sloptimize_submissions_total",
+    "Repository submissions by outcome: accepted, duplicate or rejected",
+    ["outcome"],
+)
+JOBS_FINISHED = Counter(
+    "sloptimize_jobs_finished_total",
+    "Repository jobs that reached a terminal status",
+    ["status"],
+)
+
+
+@contextmanager
+def track_stage(stage: str, **attributes: Any) -> Iterator[Span]:
+    """Observe the duration of a stage and trace it as a span, counting it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        with span(stage, **attributes) as stage_span:
+            yield stage_span
+    except Exception as e:
+        ERRORS.labels(stage=stage, type=type(e).__name__).inc()
+        raise
+    finally:
+        STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - started)
+
+
+def record_llm_usage(provider: str, input_tokens: Optional[int], output_tokens: Optional[int]):
+    """Count the tokens of one LLM call, when the provider reported them"""
+    if input_tokens:
+        LLM_TOKENS.labels(provider=provider, direction="input").inc(input_tokens)
+    if output_tokens:
+        LLM_TOKENS.labels(provider=provider, direction="output").inc(output_tokens)
+
+
+class QueueCollector:
+    """Reports queue depth and active workers from the database at scrape time.
+
+    The database is the one place that sees jobs from every API process, worker
+    and daemon, so reading it on scrape is exact and needs no cross-process state.
+    """
+
+    db: Database
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def describe(self):
+        # Avoid a database query when the collector is registered
+        return []
+
+    def collect(self):
+        stats = self.db.get_queue_stats(drain_window=0)
+
+        depth = GaugeMetricFamily(
+            "sloptimize_queue_depth", "Jobs waiting for or being processed by a worker", labels=["status"]
+        )
+        depth.add_metric([JobStatus.PENDING.value], stats["pending"])
+        depth.add_metric([JobStatus.PROCESSING.value], stats["processing"])
+        yield depth
+
+        yield GaugeMetricFamily(
+            "sloptimize_active_workers", "Workers currently processing a job", value=stats["processing"]
+        )
+        yield GaugeMetricFamily(
+            "sloptimize_oldest_pending_seconds",
+            "Age of the oldest job still waiting for a worker",
+            value=stats["oldest_pending_seconds"] or 0.0,
+        )
+
+
+def create_registry(db: Optional[Database] = None) -> CollectorRegistry:
+    """Registry to export: every process's samples in multiprocess mode, plus the queue gauges"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    if db is not None:
+        registry.register(QueueCollector(db))
+    return registry
+
+
+def mark_worker_dead(pid: int):
+    """Drop the live samples of an exited worker process in multiprocess mode"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
+
+
+def render(registry: CollectorRegistry) -> bytes:
+    """Serialize a registry in the Prometheus text exposition format"""
+    return generate_latest(registry)
+
+
+def start_exporter(port: int, db: Optional[Database] = None):
+    """Serve /metrics from a background thread, for processes without an HTTP server"""
+    start_http_server(port, registry=create_registry(db))
@@ -0,0 +1,50 @@
+"""
+Git helpers shared by the API and workers
+"""
+
+import asyncio
+import contextlib
+import os
+from pathlib import Path
+from typing import Optional
+
+from .environment import GIT_LS_REMOTE_TIMEOUT
+
+# Never block on a credentials prompt for private or missing repositories
+_GIT_ENV = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+
+
+async def _git_output(*args: str, timeout: float) -> Optional[str]:
+    """Run a git command and return its stdout, or None if it fails or times out"""
+    process = await asyncio.create_subprocess_exec(
+        "git",
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=_GIT_ENV,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        # The process may have exited on its own right at the timeout
+        with contextlib.suppress(ProcessLookupError):
+            process.kill()
+        await process.wait()
+        return None
+
+    if process.returncode != 0:
+        return None
+    return stdout.decode().strip()
+
+
+async def remote_head(repo_url: str, timeout: float = GIT_LS_REMOTE_TIMEOUT) -> Optional[str]:
+    """Resolve the commit a remote's HEAD points at with `git ls-remote`, without cloning"""
+    output = await _git_output("ls-remote", repo_url, "HEAD", timeout=timeout)
+    if not output:
+        return None
+    return output.split()[0]
+
+
+async def local_head(checkout: Path, timeout: float = GIT_LS_REMOTE_TIMEOUT) -> Optional[str]:
+    """Get the commit checked out in a local clone"""
+    return await _git_output("-C", str(checkout), "rev-parse", "HEAD", timeout=timeout)
@@ -0,0 +1,119 @@
+"""
+Retention, archival and compaction of old jobs
+
+Finished jobs older than the retention age have their results exported to a
+gzip-compressed JSONL archive and deleted from the live database, which is then
+incrementally vacuumed. The job row and its summary statistics stay behind, so
+listings and summaries keep working; the results are re-hydrated from the
+archive the next time they are requested.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from .database import Database
+from .environment import ARCHIVE_DIR, RETENTION_BATCH_SIZE, RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+def archive_job(db: Database, job: Dict[str, Any], archive_dir: Path) -> Path:
+    """Export a job and all of its results to `<archive_dir>/<job_id>.jsonl.gz`.
+
+    The first line holds the job row and each following line one result. The file
+    is written under a temporary name and renamed once complete, so a crash never
+    leaves a truncated archive that could be mistaken for a good one.
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archive_path = archive_dir / f"{job['id']}.jsonl.gz"
+    partial_path = archive_path.with_suffix(".partial")
+
+    with open(partial_path, "wb") as raw:
+        with gzip.open(raw, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "job", **job}, default=str) + "\n")
+            for result in db.iter_job_results(job["id"]):
+                f.write(json.dumps({"type": "result", **result}, default=str) + "\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial_path, archive_path)
+
+    return archive_path
+
+
+def read_archive(archive_path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the result rows stored in a job archive"""
+    with gzip.open(archive_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.pop("type") == "result":
+                yield record
+
+
+def rehydrate_job(db: Database, job_id: str) -> int:
+    """Restore an archived job's results into the live database, returning the number of rows restored"""
+    job = db.get_job(job_id)
+    if not job or not job["archived_at"]:
+        return 0
+
+    restored = db.restore_job_results(job_id, read_archive(Path(job["archive_path"])))
+    logger.info(f"Re-hydrated {restored} results for job {job_id}")
+    return restored
+
+
+def run_retention(
+    db: Database,
+    max_age_days: float = RETENTION_DAYS,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    archive_dir: Path = Path(ARCHIVE_DIR),
+) -> Dict[str, int]:
+    """Archive and purge every finished job older than `max_age_days`, then compact the database"""
+    older_than = datetime.now() - timedelta(days=max_age_days)
+    archived_jobs = 0
+    deleted_results = 0
+
+    while jobs := db.get_archivable_jobs(older_than, limit=batch_size):
+        for job in jobs:
+            archive_path = job["archive_path"]
+            # Results never change after completion, so a re-hydrated job reuses its archive
+            if not archive_path or not Path(archive_path).exists():
+                archive_path = str(archive_job(db, job, archive_dir))
+
+            # Marked first so readers re-hydrate from the archive; a re-hydration stops the deletes
+            db.mark_job_archived(job["id"], archive_path)
+            deleted_results += db.delete_job_results(job["id"], batch_size)
+            archived_jobs += 1
+
+            logger.info(f"Archived job {job['id']} to {archive_path}")
+
+    if archived_jobs:
+        db.compact()
+
+    return {"archived_jobs": archived_jobs, "deleted_results": deleted_results}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """CLI entry point for running a retention pass"""
+    parser = argparse.ArgumentParser(description="Archive and purge old sloptimize jobs")
+    parser.add_argument("--max-age-days", type=float, default=RETENTION_DAYS or 30)
+    parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    parser.add_argument("--archive-dir", type=Path, default=Path(ARCHIVE_DIR))
+    parser.add_argument("--rehydrate", metavar="JOB_ID", help="Restore one archived job instead")
+    args = parser.parse_args(argv)
+
+    db = Database()
+    if args.rehydrate:
+        print(f"Restored {rehydrate_job(db, args.rehydrate)} results")
+        return
+
+    summary = run_retention(db, args.max_age_days, args.batch_size, args.archive_dir)
+    print(f"Archived {summary['archived_jobs']} jobs, deleted {summary['deleted_results']} results")
+
+
+if __name__ == "__main__":
+    main()
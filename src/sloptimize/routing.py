@@ -0,0 +1,112 @@
+"""
+Model cascade routing between a fast, cheap model and the strong configured model
+
+Under the "cascade" policy a snippet that is large or has many branches goes
+straight to the strong model, and anything else goes to the fast model first.
+The fast model's answer is escalated to the strong model when the call fails,
+the structured output is missing, the optimized code is empty, the optimized
+Python no longer parses, or, with `ROUTING_ESCALATE_UNCHANGED`, the answer
+leaves the code unchanged apart from formatting and comments. An unchanged
+answer is the fast model finding nothing to improve, which is where the strong
+model is most likely to find what it missed. The "fast" and "strong" policies
+pin every request to one tier.
+"""
+
+import ast
+from typing import Any, Literal, Optional, Tuple, get_args
+
+from .environment import (
+    CASSETTE_PROVIDER,
+    GROK_FAST_MODEL,
+    OPENAI_FAST_MODEL,
+    ROUTING_ESCALATE_UNCHANGED,
+    ROUTING_FAST_MAX_BRANCHES,
+    ROUTING_FAST_MAX_CHARS,
+)
+from .llm import create_client
+
+RoutingPolicy = Literal["strong", "fast", "cascade"]
+ROUTING_POLICIES = get_args(RoutingPolicy)
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+
+# Nodes that add a path through the code, counted as its complexity
+BRANCH_NODES = (
+    ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.Try, ast.ExceptHandler,
+    ast.With, ast.AsyncWith, ast.BoolOp, ast.comprehension, ast.match_case,
+)
+
+
+def fast_model(provider: str) -> str:
+    """The fast model of a provider"""
+    if provider == "openai":
+        return OPENAI_FAST_MODEL
+    if provider == "grok":
+        return GROK_FAST_MODEL
+    if provider == "fake":
+        return "fake-fast"
+    if provider == "cassette":
+        return fast_model(CASSETTE_PROVIDER)
+    raise ValueError(f"Invalid LLM_PROVIDER: {provider}")
+
+
+def _parse(code: str) -> Optional[ast.AST]:
+    try:
+        return ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+
+def route(code: str, policy: str) -> Tuple[str, Optional[str]]:
+    """The tier a request starts on, with the reason when a cascade skips the fast model"""
+    if policy not in ROUTING_POLICIES:
+        raise ValueError(f"Invalid routing policy: {policy}. Must be one of {', '.join(ROUTING_POLICIES)}")
+    if policy == "strong":
+        return STRONG_TIER, None
+    if policy == "fast":
+        return FAST_TIER, None
+
+    if len(code) > ROUTING_FAST_MAX_CHARS:
+        return STRONG_TIER, "size"
+    tree = _parse(code)
+    if tree is not None and sum(isinstance(node, BRANCH_NODES) for node in ast.walk(tree)) > ROUTING_FAST_MAX_BRANCHES:
+        return STRONG_TIER, "complexity"
+    return FAST_TIER, None
+
+
+def _unchanged(code: str, optimized_code: str) -> bool:
+    """Whether optimized code only reformats the original: the same AST for Python, the same non-whitespace otherwise"""
+    tree = _parse(code)
+    if tree is not None:
+        optimized = _parse(optimized_code)
+        return optimized is not None and ast.dump(optimized) == ast.dump(tree)
+    return "".join(optimized_code.split()) == "".join(code.split())
+
+
+def escalation_reason(code: str, completion: Any) -> Optional[str]:
+    """Why the fast model's answer should be redone by the strong model, or None to keep it"""
+    if completion is None:
+        return "invalid"
+    if not completion.optimized_code.strip():
+        return "empty"
+    # Only Python is checked; snippets that never parsed, such as other languages, pass
+    if _parse(code) is not None and _parse(completion.optimized_code) is None:
+        return "syntax"
+    if ROUTING_ESCALATE_UNCHANGED and _unchanged(code, completion.optimized_code):
+        return "unchanged"
+    return None
+
+
+class ModelRouter:
+    """A provider's client for each tier"""
+
+    provider: str
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.strong = create_client(provider)
+        self.fast = create_client(provider, fast_model(provider))
+
+    def client(self, tier: str):
+        return self.fast if tier == FAST_TIER else self.strong
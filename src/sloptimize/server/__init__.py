@@ -1,18 +1,212 @@
-from fastmcp import FastMCP
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+from fastmcp import Context, FastMCP
+from pydantic import BaseModel
 from ..main import (
     sloptimize,
+    OptimizationAssessment,
     SloptimizeResult,
+    TokenUsage,
 )
-from ..environment import MCP_HOST, MCP_PORT
+from ..database import AsyncDatabase
+from ..diff import unified_diff
+from ..environment import (
+    LLM_PROVIDER,
+    LLM_RATE_BURST,
+    LLM_RATE_LIMIT,
+    MCP_BATCH_CONCURRENCY,
+    MCP_BATCH_MAX_SNIPPETS,
+    MCP_CACHE_TTL,
+    MCP_HOST,
+    MCP_PORT,
+    MCP_PROCESSES,
+    MCP_PROGRESS_INTERVAL,
+)
+from ..llm import CancelToken, ProgressCallback
+from ..singleflight import SingleFlight, content_hash
+from .shared import SharedRateLimiter, SharedResultCache
 
 __all__ = [
+    "create_http_app",
     "start_mcp_server",
 ]
 
 mcp = FastMCP("Sloptimize")
 
+# Identical snippets, within a batch or across concurrent calls, share one LLM call
+optimize_flights = SingleFlight()
+
+# Shared by every server process through the database; created on first use so
+# that importing the server does not open it
+result_cache: Optional[SharedResultCache] = None
+rate_limiter: Optional[SharedRateLimiter] = None
+
+
+def _shared() -> Tuple[SharedResultCache, SharedRateLimiter]:
+    global result_cache, rate_limiter
+    if result_cache is None or rate_limiter is None:
+        db = AsyncDatabase()
+        result_cache = SharedResultCache(db, MCP_CACHE_TTL)
+        rate_limiter = SharedRateLimiter(db, f"llm:{LLM_PROVIDER}", LLM_RATE_LIMIT, LLM_RATE_BURST)
+    return result_cache, rate_limiter
+
+
+async def optimize(
+    code: str,
+    on_progress: Optional[ProgressCallback] = None,
+    cancel_token: Optional[CancelToken] = None,
+) -> SloptimizeResult:
+    """Serve a snippet from the shared cache, or optimize it within the shared provider rate limit"""
+    cache, limiter = _shared()
+    cached = await cache.get(code)
+    if cached is not None:
+        # Served without a provider call, so it used no tokens
+        return cached.model_copy(update={"usage": TokenUsage()})
+
+    await limiter.acquire()
+    result = await asyncio.to_thread(sloptimize, code, on_progress, cancel_token)
+    await cache.put(code, result)
+    return result
+
+
+OutputFormat = Literal["full", "diff"]
+
+
+class SloptimizeToolResult(BaseModel):
+    """Tool result carrying either the full optimized code or a unified diff against the input"""
+
+    format: OutputFormat
+    source_code: Optional[str] = None
+    diff: Optional[str] = None
+    assessment: OptimizationAssessment
+    integration_considerations: List[str]
+    usage: TokenUsage
+    model: Optional[str] = None
+    model_tier: Optional[str] = None
+
+
+def format_result(code: str, result: SloptimizeResult, format: OutputFormat) -> SloptimizeToolResult:
+    """Shape a result for the requested format, falling back to full code when the diff is larger"""
+    if format == "diff":
+        diff = unified_diff(code, result.source_code)
+        if len(diff) < len(result.source_code):
+            return SloptimizeToolResult(
+                format="diff",
+                diff=diff,
+                assessment=result.assessment,
+                integration_considerations=result.integration_considerations,
+                usage=result.usage,
+                model=result.model,
+                model_tier=result.model_tier,
+            )
+    return SloptimizeToolResult(
+        format="full",
+        source_code=result.source_code,
+        assessment=result.assessment,
+        integration_considerations=result.integration_considerations,
+        usage=result.usage,
+        model=result.model,
+        model_tier=result.model_tier,
+    )
+
+
+def _progress_message(message: str, tokens: int) -> str:
+    return f"{message} ({tokens} tokens)" if tokens else message
+
+
+def _throttled_progress(report: Callable[[str, int], Awaitable[None]]) -> ProgressCallback:
+    """Progress callback for the LLM thread that schedules `report` on the calling event loop"""
+    loop = asyncio.get_running_loop()
+    last_report = (None, 0.0)
+
+    def on_progress(message: str, tokens: int):
+        # Runs on the LLM thread; streamed tokens are reported at most every MCP_PROGRESS_INTERVAL
+        nonlocal last_report
+        now = time.monotonic()
+        if message == last_report[0] and now - last_report[1] < MCP_PROGRESS_INTERVAL:
+            return
+        last_report = (message, now)
+        asyncio.run_coroutine_threadsafe(report(message, tokens), loop)
+
+    return on_progress
+
+
+async def sloptimize_tool(code: str, ctx: Context, format: OutputFormat = "full") -> SloptimizeToolResult:
+    """Run sloptimize for an MCP call with progress notifications, aborting the LLM request if the call is cancelled"""
+    cancel_token = CancelToken()
+    on_progress = _throttled_progress(
+        lambda message, tokens: ctx.report_progress(1 + tokens, message=_progress_message(message, tokens))
+    )
+
+    await ctx.report_progress(0, message="Queued")
+    try:
+        result = await optimize(code, on_progress, cancel_token)
+        return format_result(code, result, format)
+    except asyncio.CancelledError:
+        # The client cancelled the call or disconnected; stop paying for the completion
+        cancel_token.cancel()
+        raise
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of one snippet in a batch: its result, or the error that prevented it"""
+
+    result: Optional[SloptimizeToolResult] = None
+    error: Optional[str] = None
+
+
+async def sloptimize_batch(
+    snippets: Dict[str, str], ctx: Context, format: OutputFormat = "full"
+) -> Dict[str, BatchItemResult]:
+    """Optimize many named snippets concurrently and return their results keyed by name.
+
+    Progress counts finished snippets, with each snippet's LLM progress in between.
+    Cancelling the call aborts the LLM requests no other call is still waiting on.
+    """
+    if len(snippets) > MCP_BATCH_MAX_SNIPPETS:
+        raise ValueError(f"At most {MCP_BATCH_MAX_SNIPPETS} snippets can be optimized in one batch")
+
+    semaphore = asyncio.Semaphore(MCP_BATCH_CONCURRENCY)
+    total = len(snippets)
+    finished = 0
+
+    async def optimize_snippet(name: str, code: str) -> BatchItemResult:
+        nonlocal finished
+        on_progress = _throttled_progress(
+            lambda message, tokens: ctx.report_progress(
+                finished, total, message=f"{name}: {_progress_message(message, tokens)}"
+            )
+        )
+
+        async def flight() -> SloptimizeResult:
+            cancel_token = CancelToken()
+            try:
+                return await optimize(code, on_progress, cancel_token)
+            except asyncio.CancelledError:
+                # Every call waiting on this snippet was cancelled; stop paying for the completion
+                cancel_token.cancel()
+                raise
+
+        async with semaphore:
+            try:
+                result = await optimize_flights.do(content_hash(code), flight)
+                item = BatchItemResult(result=format_result(code, result, format))
+            except Exception as e:
+                item = BatchItemResult(error=f"{type(e).__name__}: {e}")
+
+        finished += 1
+        await ctx.report_progress(finished, total, message=f"{name}: {'failed' if item.error else 'done'}")
+        return item
+
+    await ctx.report_progress(0, total, message="Queued")
+    results = await asyncio.gather(*(optimize_snippet(name, code) for name, code in snippets.items()))
+    return dict(zip(snippets, results))
+
+
 mcp.tool(
-    sloptimize,
+    sloptimize_tool,
+    name="sloptimize",
     description="""
     Analyze and optimize Python code for better performance, readability, and maintainability.
 
@@ -42,19 +236,74 @@ mcp.tool(
         You may need to edit other parts of the codebase or file, and you should
         propose those changes at the same time as the optimized code.
 
+    Output Format:
+        For long snippets pass format="diff" to receive a unified diff against the
+        code you sent instead of the full optimized code, and apply it as an edit.
+        When the diff would be larger than the code itself, the full code is
+        returned instead; check the result's `format` field.
+
     Args:
         code: Python source code to analyze and optimize
+        format: "full" (default) for the complete optimized code in `source_code`,
+            or "diff" for a unified diff in `diff`
+
+    Returns:
+        Structured optimization result with code or diff, assessment, and integration notes.
+    """,
+)
+
+mcp.tool(
+    sloptimize_batch,
+    description="""
+    Analyze and optimize several Python snippets in one call.
+
+    Prefer this over repeated `sloptimize` calls when cleaning up a whole module
+    or several files: the snippets are optimized concurrently, so the batch takes
+    about as long as its slowest snippet.
+
+    Pass each function, class or file as its own entry, named so you can match the
+    results back to where the code came from (e.g. "utils.py:parse_args"). Apply
+    each result as you would a `sloptimize` result, including its integration notes.
+
+    Args:
+        snippets: Mapping of snippet name to Python source code
+        format: "full" or "diff", applied to every snippet as in `sloptimize`
 
     Returns:
-        Structured optimization result with code, assessment, and integration notes.
+        Mapping of snippet name to either `result` (the same structure `sloptimize`
+        returns) or `error`, describing why that snippet could not be optimized.
+        A failed snippet does not affect the others.
     """,
 )
 
 
-def start_mcp_server(host: str = MCP_HOST, port: int = MCP_PORT) -> None:
-    """Starts the FastMCP server using SSE transport on the specified host and port.
+def create_http_app():
+    """ASGI app serving MCP over stateless streamable HTTP, for running under a process supervisor.
 
-    This function is typically called to launch the server in a development or production environment,
-    binding to the given host and port for incoming connections.
+    Stateless sessions let any process answer any request, so calls need no
+    affinity to the process that initialized the session. Cancellation then
+    arrives as a client disconnect rather than a notification.
     """
-    mcp.run(transport="http", host=host, port=port, path="/")
+    return mcp.http_app(path="/", stateless_http=True)
+
+
+def start_mcp_server(host: str = MCP_HOST, port: int = MCP_PORT, processes: int = MCP_PROCESSES) -> None:
+    """Starts the FastMCP server using HTTP transport on the specified host and port.
+
+    With more than one process, uvicorn binds the port once and supervises
+    `processes` workers that all accept on it, restarting any that exit. They
+    share the result cache and the provider rate limit through the database.
+    """
+    if processes <= 1:
+        mcp.run(transport="http", host=host, port=port, path="/")
+        return
+
+    import uvicorn
+
+    uvicorn.run(
+        "sloptimize.server:create_http_app",
+        factory=True,
+        host=host,
+        port=port,
+        workers=processes,
+    )
@@ -0,0 +1,58 @@
+"""
+Result cache and provider rate limiter shared by every MCP server process
+"""
+
+import asyncio
+from typing import Optional
+
+from ..database import AsyncDatabase
+from ..main import SloptimizeResult, result_cache_key
+
+
+class SharedResultCache:
+    """Optimization results cached in the database, so a snippet optimized by one
+    process is served from the cache by all of them until it is `ttl` seconds old.
+    """
+
+    db: AsyncDatabase
+    ttl: float
+
+    def __init__(self, db: AsyncDatabase, ttl: float):
+        self.db = db
+        self.ttl = ttl
+
+    async def get(self, code: str) -> Optional[SloptimizeResult]:
+        if self.ttl <= 0:
+            return None
+        value = await self.db.get_cached_result(result_cache_key(code), self.ttl)
+        return SloptimizeResult.model_validate_json(value) if value else None
+
+    async def put(self, code: str, result: SloptimizeResult):
+        if self.ttl > 0:
+            await self.db.store_cached_result(result_cache_key(code), result.model_dump_json(), self.ttl)
+
+
+class SharedRateLimiter:
+    """Token bucket in the database that limits provider requests across all processes.
+
+    Allows `per_minute` requests per minute on average with bursts of up to
+    `burst`; a `per_minute` of 0 disables the limit.
+    """
+
+    db: AsyncDatabase
+    name: str
+    per_minute: float
+    burst: float
+
+    def __init__(self, db: AsyncDatabase, name: str, per_minute: float, burst: float):
+        self.db = db
+        self.name = name
+        self.per_minute = per_minute
+        self.burst = burst
+
+    async def acquire(self):
+        """Wait until a request may be sent to the provider"""
+        if self.per_minute <= 0:
+            return
+        while wait := await self.db.take_rate_limit_token(self.name, self.per_minute / 60, self.burst):
+            await asyncio.sleep(wait)
@@ -0,0 +1,69 @@
+"""
+Request coalescing for identical in-flight work
+"""
+
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+def content_hash(content: str) -> str:
+    """Key identical inputs to the same flight"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome with every caller.
+
+    The first caller for a key starts the work; callers that arrive while it is
+    still running await the same task instead of starting their own, and all of
+    them receive its result or exception. Once it finishes the key is released,
+    so later calls start fresh. A caller that is cancelled stops waiting without
+    cancelling the work for the others; when the last caller is cancelled the
+    work is cancelled too, since nobody is left to receive it.
+    """
+
+    _inflight: Dict[str, asyncio.Task]
+    _waiters: Dict[asyncio.Task, int]
+
+    def __init__(self):
+        self._inflight = {}
+        self._waiters = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Await `func()` for `key`, joining a call already in flight when there is one"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._release(key, done))
+
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._leave(key, task)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    def _leave(self, key: str, task: asyncio.Task):
+        if task not in self._waiters:
+            return
+        self._waiters[task] -= 1
+        if self._waiters[task] == 0 and not task.done():
+            # Every caller was cancelled; later callers start fresh instead of joining the cancelled work
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            task.cancel()
+
+    def _release(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._waiters.pop(task, None)
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
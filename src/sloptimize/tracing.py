@@ -0,0 +1,225 @@
+"""
+Lightweight tracing of sloptimize calls, provider requests and worker stages
+
+Spans nest through a context variable, so a provider call made while a worker
+processes a file becomes a child of that file's span, across asyncio tasks and
+`asyncio.to_thread`. Token counts, retries and dollar costs recorded inside a
+span are added to it and every span enclosing it, which gives per-file and
+per-job totals.
+
+Finished spans are appended as JSON lines to `TRACE_FILE`, and exported over
+OTLP to `TRACE_OTLP_ENDPOINT` when the OpenTelemetry SDK is installed. Spans are
+always collected, since the worker persists their totals, but only exported
+when one of those is configured.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from .environment import TRACE_FILE, TRACE_OTLP_ENDPOINT
+
+# Counters that roll up from a span to all of its ancestors
+USAGE_COUNTERS = ("input_tokens", "output_tokens", "cached_tokens", "llm_retries")
+
+
+class Span:
+    """A timed operation with attributes, a parent and rolled-up usage counters"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent: Optional["Span"]
+    attributes: Dict[str, Any]
+    start_time: float
+    duration: Optional[float]
+    error: Optional[str]
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+        self._otel = None
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the span started, or its duration once finished"""
+        if self.duration is not None:
+            return self.duration
+        return time.perf_counter() - self._started
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def add(self, counter: str, amount: float):
+        """Add to a usage counter on this span and every span enclosing it"""
+        span = self
+        while span is not None:
+            span.attributes[counter] = span.attributes.get(counter, 0) + amount
+            span = span.parent
+
+    def usage(self) -> Dict[str, int]:
+        """Usage counters accumulated so far, zero when nothing was recorded"""
+        return {counter: self.attributes.get(counter, 0) for counter in USAGE_COUNTERS}
+
+    @property
+    def cost_usd(self) -> float:
+        """Dollar cost recorded so far, zero when nothing was recorded"""
+        return self.attributes.get("cost_usd", 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("sloptimize_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Run the enclosed block as a span nested in the current one, exporting it when done"""
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    _exporter.start(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._started
+        _current_span.reset(token)
+        _exporter.finish(current)
+
+
+def record_usage(input_tokens: Optional[int], output_tokens: Optional[int], cached_tokens: Optional[int] = None):
+    """Add a provider call's token counts to the current span and its ancestors"""
+    current = _current_span.get()
+    if current is None:
+        return
+    for counter, amount in (
+        ("input_tokens", input_tokens),
+        ("output_tokens", output_tokens),
+        ("cached_tokens", cached_tokens),
+    ):
+        if amount:
+            current.add(counter, amount)
+
+
+def record_cost(cost_usd: float):
+    """Add the dollar cost of provider usage to the current span and its ancestors"""
+    current = _current_span.get()
+    if current is not None and cost_usd:
+        current.add("cost_usd", cost_usd)
+
+
+def record_retry():
+    """Count a retried provider request on the current span and its ancestors"""
+    current = _current_span.get()
+    if current is not None:
+        current.add("llm_retries", 1)
+
+
+class SpanExporter:
+    """Writes finished spans to a JSONL file and mirrors them to OpenTelemetry.
+
+    The file is opened in append mode and each span is written with a single
+    write, so concurrent workers can share one trace file. The OpenTelemetry
+    tracer is created on first use and only if its packages are installed.
+    """
+
+    trace_file: str
+    otlp_endpoint: str
+
+    def __init__(self, trace_file: str = TRACE_FILE, otlp_endpoint: str = TRACE_OTLP_ENDPOINT):
+        self.trace_file = trace_file
+        self.otlp_endpoint = otlp_endpoint
+        self._lock = threading.Lock()
+        self._tracer = None
+        self._tracer_loaded = False
+
+    def start(self, span: Span):
+        tracer = self._get_tracer()
+        if tracer is None:
+            return
+        from opentelemetry import trace
+
+        parent = span.parent._otel if span.parent is not None else None
+        context = trace.set_span_in_context(parent) if parent is not None else None
+        span._otel = tracer.start_span(span.name, context=context, start_time=int(span.start_time * 1e9))
+
+    def finish(self, span: Span):
+        if span._otel is not None:
+            self._finish_otel(span)
+        if self.trace_file:
+            line = (json.dumps(span.to_dict(), default=str) + "\n").encode("utf-8")
+            with self._lock:
+                fd = os.open(self.trace_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line)
+                finally:
+                    os.close(fd)
+
+    def _finish_otel(self, span: Span):
+        from opentelemetry.trace import Status, StatusCode
+
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                span._otel.set_attribute(f"sloptimize.{key}", value)
+        if span.error:
+            span._otel.set_status(Status(StatusCode.ERROR, span.error))
+        span._otel.end(end_time=int((span.start_time + span.duration) * 1e9))
+
+    def _get_tracer(self):
+        if self._tracer_loaded or not self.otlp_endpoint:
+            return self._tracer
+        with self._lock:
+            if not self._tracer_loaded:
+                self._tracer = self._create_tracer()
+                self._tracer_loaded = True
+        return self._tracer
+
+    def _create_tracer(self):
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            logging.warning(
+                "TRACE_OTLP_ENDPOINT is set but opentelemetry-sdk and "
+                "opentelemetry-exporter-otlp-proto-http are not installed; spans are not exported over OTLP"
+            )
+            return None
+
+        provider = TracerProvider(resource=Resource.create({"service.name": "sloptimize"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=self.otlp_endpoint)))
+        return provider.get_tracer("sloptimize")
+
+
+_exporter = SpanExporter()
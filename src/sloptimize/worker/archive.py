@@ -0,0 +1,154 @@
+"""
+Safe extraction of uploaded repository archives
+"""
+
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, Optional, Set, Tuple
+
+from ..environment import ARCHIVE_MAX_EXTRACTED_BYTES, ARCHIVE_MAX_FILES, ARCHIVE_MAX_RATIO
+
+ARCHIVE_FORMATS = {
+    "tar.gz": b"\x1f\x8b",
+    "zip": b"PK\x03\x04",
+}
+
+COPY_CHUNK_BYTES = 64 * 1024
+
+
+class ArchiveError(Exception):
+    """Raised for archives that are malformed, unsupported or unsafe to extract"""
+
+
+def detect_format(header: bytes) -> Optional[str]:
+    """Identify an archive format from its leading magic bytes"""
+    for archive_format, magic in ARCHIVE_FORMATS.items():
+        if header.startswith(magic):
+            return archive_format
+    return None
+
+
+def _safe_relative_path(name: str) -> Optional[PurePosixPath]:
+    """Normalize a member name to a path inside the destination, or None if it would escape it"""
+    path = PurePosixPath(name.replace("\\", "/"))
+    if path.is_absolute() or ".." in path.parts or not path.parts:
+        return None
+    # Reject Windows drive letters such as "C:" that PurePosixPath treats as plain names
+    if ":" in path.parts[0]:
+        return None
+    return path
+
+
+def _tar_members(archive: tarfile.TarFile) -> Iterator[Tuple[str, int, int, Optional[BinaryIO]]]:
+    for member in archive:
+        # Links, devices and directories are never extracted; files are recreated from their data only
+        if not member.isreg():
+            yield member.name, 0, 0, None
+            continue
+        yield member.name, member.size, member.size, archive.extractfile(member)
+
+
+def _zip_members(archive: zipfile.ZipFile) -> Iterator[Tuple[str, int, int, Optional[BinaryIO]]]:
+    for info in archive.infolist():
+        # Symlinks are stored as files whose Unix mode marks them as links
+        is_symlink = (info.external_attr >> 16) & 0o170000 == 0o120000
+        if info.is_dir() or is_symlink:
+            yield info.filename, 0, 0, None
+            continue
+        with archive.open(info) as source:
+            yield info.filename, info.file_size, info.compress_size, source
+
+
+def extract_archive(
+    archive_path: Path,
+    destination: Path,
+    extensions: Set[str],
+    max_file_size: int,
+    max_files: int = ARCHIVE_MAX_FILES,
+    max_total_bytes: int = ARCHIVE_MAX_EXTRACTED_BYTES,
+    max_ratio: float = ARCHIVE_MAX_RATIO,
+) -> int:
+    """Extract supported files from a `.tar.gz` or `.zip` archive and return how many were written.
+
+    Only regular files with one of `extensions` and at most `max_file_size` bytes
+    are written, and only below `destination`; members that would escape it
+    raise ArchiveError. Zip members compressed more than `max_ratio` times are
+    skipped, file sizes are enforced on the bytes actually decompressed rather
+    than the sizes the archive declares, and the whole archive is rejected once
+    it has more than `max_files` entries or `max_total_bytes` of content.
+    """
+    with open(archive_path, "rb") as f:
+        archive_format = detect_format(f.read(4))
+
+    try:
+        if archive_format == "tar.gz":
+            with tarfile.open(archive_path, mode="r:gz") as archive:
+                return _extract_members(
+                    _tar_members(archive), destination, extensions, max_file_size,
+                    max_files, max_total_bytes, max_ratio=None,
+                )
+        if archive_format == "zip":
+            with zipfile.ZipFile(archive_path) as archive:
+                return _extract_members(
+                    _zip_members(archive), destination, extensions, max_file_size,
+                    max_files, max_total_bytes, max_ratio,
+                )
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, OSError) as e:
+        raise ArchiveError(f"Could not read archive: {e}") from e
+
+    raise ArchiveError("Unsupported archive format; expected .tar.gz or .zip")
+
+
+def _extract_members(
+    members: Iterator[Tuple[str, int, int, Optional[BinaryIO]]],
+    destination: Path,
+    extensions: Set[str],
+    max_file_size: int,
+    max_files: int,
+    max_total_bytes: int,
+    max_ratio: Optional[float],
+) -> int:
+    destination = destination.resolve()
+    extracted = 0
+    # Skipped tar members are still decompressed to reach the next one, so they count too
+    total_bytes = 0
+
+    for count, (name, size, compressed_size, source) in enumerate(members, start=1):
+        if count > max_files:
+            raise ArchiveError(f"Archive has more than {max_files} entries")
+        total_bytes += size
+        if total_bytes > max_total_bytes:
+            raise ArchiveError(f"Archive expands to more than {max_total_bytes} bytes")
+        if source is None:
+            continue
+
+        relative = _safe_relative_path(name)
+        if relative is None:
+            raise ArchiveError(f"Unsafe path in archive: {name}")
+        if relative.suffix.lower() not in extensions or size > max_file_size:
+            continue
+        if max_ratio is not None and size > max_ratio * max(compressed_size, 1):
+            continue
+
+        target = destination.joinpath(*relative.parts)
+        if not target.resolve().is_relative_to(destination):
+            raise ArchiveError(f"Unsafe path in archive: {name}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        written = 0
+        with open(target, "wb") as out:
+            while chunk := source.read(COPY_CHUNK_BYTES):
+                written += len(chunk)
+                if written > max_file_size:
+                    break
+                out.write(chunk)
+
+        # The declared size lied; drop the file rather than keep a truncated copy
+        if written > max_file_size:
+            target.unlink()
+            continue
+
+        extracted += 1
+
+    return extracted
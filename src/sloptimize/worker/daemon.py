@@ -5,6 +5,7 @@ Daemon wrapper for the sloptimize worker process
 import sys
 import os
 import signal
+import threading
 import time
 import logging
 import multiprocessing
@@ -16,6 +17,9 @@ import daemon.pidfile
 from typing import Optional
 
 from ..database import Database, JobStatus
+from ..environment import METRICS_PORT, PROFILE_DIR, RETENTION_DAYS, RETENTION_INTERVAL, WORKER_CONCURRENCY
+from ..metrics import mark_worker_dead, start_exporter
+from ..retention import run_retention
 
 
 class WorkerDaemon:
@@ -24,13 +28,17 @@ class WorkerDaemon:
     def __init__(self, 
                  pid_file: str = "/tmp/sloptimize-worker.pid",
                  log_file: str = "/tmp/sloptimize-worker.log",
-                 max_workers: int = 2):
+                 max_workers: int = WORKER_CONCURRENCY,
+                 profile_dir: str = PROFILE_DIR):
         self.pid_file = pid_file
         self.log_file = log_file
         self.max_workers = max_workers
+        self.profile_dir = profile_dir
         self.db = Database()
         self.workers = {}
         self.shutdown_requested = False
+        self.last_retention_run = 0.0
+        self.retention_thread: Optional[threading.Thread] = None
         
         # Setup logging
         logging.basicConfig(
@@ -51,7 +59,7 @@ class WorkerDaemon:
         
         def worker_target():
             import asyncio
-            processor = RepositoryProcessor(job_id, repo_url)
+            processor = RepositoryProcessor(job_id, repo_url, profile_dir=self.profile_dir)
             asyncio.run(processor.process())
         
         process = multiprocessing.Process(target=worker_target)
@@ -65,6 +73,7 @@ class WorkerDaemon:
         for job_id, process in self.workers.items():
             if not process.is_alive():
                 process.join()
+                mark_worker_dead(process.pid)
                 finished_jobs.append(job_id)
                 self.logger.info(f"Worker process for job {job_id} finished")
         
@@ -72,22 +81,47 @@ class WorkerDaemon:
             del self.workers[job_id]
     
     def check_for_pending_jobs(self):
-        """Check for pending jobs and start workers if available"""
-        if len(self.workers) >= self.max_workers:
-            return
-        
-        pending_jobs = self.db.get_jobs(JobStatus.PENDING)
+        """Check for pending jobs and start workers while fewer than max_workers jobs are processing.
+
+        Jobs processing under the API's workers count too, so the bound holds across processes.
+        """
+        # Workers that haven't claimed their job yet still see it as pending, but will take a slot
+        pending_jobs = self.db.get_pending_jobs(self.max_workers + len(self.workers))
+        unclaimed = sum(job['id'] in self.workers for job in pending_jobs)
+        free_slots = self.max_workers - self.db.count_jobs(JobStatus.PROCESSING) - unclaimed
         
-        for job in pending_jobs:
-            if len(self.workers) >= self.max_workers:
-                break
-            
-            job_id = job['id']
-            repo_url = job['repo_url']
-            
+        for job in [job for job in pending_jobs if job['id'] not in self.workers][:max(free_slots, 0)]:
             # Start worker for this job
-            process = self.start_worker_process(job_id, repo_url)
-            self.workers[job_id] = process
+            process = self.start_worker_process(job['id'], job['repo_url'])
+            self.workers[job['id']] = process
+    
+    def run_retention_if_due(self):
+        """Start archiving old jobs on a background thread when retention is enabled and the interval has elapsed.
+
+        A pass can take minutes on a large database, so it runs beside the loop
+        rather than holding up job dispatch and worker cleanup.
+        """
+        if RETENTION_DAYS <= 0 or time.time() - self.last_retention_run < RETENTION_INTERVAL:
+            return
+        if self.retention_thread and self.retention_thread.is_alive():
+            return
+        
+        self.last_retention_run = time.time()
+        self.retention_thread = threading.Thread(target=self.run_retention, name="sloptimize-retention", daemon=True)
+        self.retention_thread.start()
+    
+    def run_retention(self):
+        """Run one retention pass, logging what it archived"""
+        try:
+            summary = run_retention(self.db, RETENTION_DAYS)
+        except Exception as e:
+            self.logger.error(f"Retention failed: {e}")
+            return
+        if summary['archived_jobs']:
+            self.logger.info(
+                f"Retention archived {summary['archived_jobs']} jobs "
+                f"and deleted {summary['deleted_results']} results"
+            )
     
     def run(self):
         """Main daemon loop"""
@@ -97,6 +131,14 @@ class WorkerDaemon:
         
         self.logger.info("Worker daemon starting...")
         
+        if self.profile_dir:
+            self.logger.info(f"Profiling jobs into {self.profile_dir}")
+        
+        if METRICS_PORT:
+            # The API exports the queue gauges; exporting them here too would duplicate them
+            start_exporter(METRICS_PORT)
+            self.logger.info(f"Serving metrics on port {METRICS_PORT}")
+        
         while not self.shutdown_requested:
             try:
                 # Clean up finished workers
@@ -105,6 +147,9 @@ class WorkerDaemon:
                 # Check for new pending jobs
                 self.check_for_pending_jobs()
                 
+                # Archive old jobs in the background to keep the live database small
+                self.run_retention_if_due()
+                
                 # Sleep before next check
                 time.sleep(5)
                 
@@ -121,6 +166,10 @@ class WorkerDaemon:
                 process.terminate()
                 process.join()
         
+        if self.retention_thread and self.retention_thread.is_alive():
+            self.logger.info("Waiting for the retention pass to finish...")
+            self.retention_thread.join()
+        
         self.logger.info("Worker daemon stopped")
     
     def start_daemon(self):
@@ -197,12 +246,17 @@ class WorkerDaemon:
 
 def main():
     """CLI entry point for daemon management"""
-    if len(sys.argv) < 2:
-        print("Usage: python -m sloptimize.worker.daemon {start|stop|restart|status}")
+    args = sys.argv[1:]
+    profile_dir = PROFILE_DIR
+    if len(args) == 3 and args[1] == "--profile":
+        profile_dir = args.pop()
+        args.pop()
+    if len(args) != 1:
+        print("Usage: python -m sloptimize.worker.daemon {start|stop|restart|status} [--profile DIR]")
         sys.exit(1)
     
-    command = sys.argv[1]
-    daemon = WorkerDaemon()
+    command = args[0]
+    daemon = WorkerDaemon(profile_dir=profile_dir)
     
     if command == "start":
         print("Starting worker daemon...")
@@ -2,26 +2,47 @@
 Background worker for processing repositories with sloptimize
 """
 
-import sys
+import argparse
 import asyncio
 import tempfile
 import shutil
 from pathlib import Path
 from typing import List
 import traceback
+from datetime import datetime, timezone
 
+from ..budget import JobBudget
 from ..database import Database, JobStatus
+from ..environment import PROFILE_DIR, WORKER_CONCURRENCY
+from ..metrics import JOBS_FINISHED, STAGE_DURATION, track_stage
 from ..main import sloptimize
+from ..repository import local_head
+from ..tracing import span
+from .archive import extract_archive
+from .profiling import JobProfiler
+
+# Files larger than this are skipped
+MAX_FILE_SIZE = 1024 * 1024
+
+# Files processed concurrently per job
+FILE_CONCURRENCY = 5
+
+# Code that matters least to optimize, processed last so a budget is spent elsewhere first
+LOW_PRIORITY_DIRS = {"test", "tests", "testing", "examples", "example", "docs", "benchmarks", "scripts"}
 
 
 class RepositoryProcessor:
     """Handles repository checkout and file processing"""
 
-    def __init__(self, job_id: str, repo_url: str):
+    def __init__(self, job_id: str, repo_url: str, profile_dir: str = PROFILE_DIR):
         self.job_id = job_id
         self.repo_url = repo_url
         self.db = Database()
         self.temp_dir = None
+        self.budget = JobBudget()
+        self.routing_policy = None
+        # Profiles are written to <profile_dir>/<job_id> when set
+        self.profile_dir = profile_dir
 
         # File extensions to process
         self.supported_extensions = {
@@ -30,36 +51,80 @@ class RepositoryProcessor:
 
     async def process(self):
         """Main processing function"""
-        try:
-            self.db.update_job_status(self.job_id, JobStatus.PROCESSING)
-
-            # Clone repository
-            await self._clone_repository()
-
-            # Find all code files
-            code_files = self._find_code_files()
+        # The API and the worker daemon may both start a worker for the same job, and
+        # the job stays pending for a later worker while WORKER_CONCURRENCY others are processing
+        if not self.db.claim_job(self.job_id, WORKER_CONCURRENCY):
+            return
+        job = self.db.get_job(self.job_id)
+        self._observe_queue_wait(job)
+        self.budget = JobBudget(job["max_tokens"], job["max_cost_usd"])
+        self.routing_policy = job["routing_policy"]
+
+        profiler = None
+        if self.profile_dir:
+            profiler = JobProfiler(Path(self.profile_dir) / self.job_id)
+            self.db.update_job_profile(self.job_id, str(profiler.directory))
+            profiler.start()
 
-            if not code_files:
+        try:
+            with track_stage("job", job_id=self.job_id, repo_url=self.repo_url):
+                if job["source_archive"]:
+                    # Unpack the uploaded archive instead of cloning
+                    with track_stage("extract"):
+                        await self._extract_archive(Path(job["source_archive"]))
+                else:
+                    # Clone repository
+                    with track_stage("clone"):
+                        await self._clone_repository()
+
+                # Find all code files, most valuable first
+                with track_stage("discover"):
+                    code_files = sorted(self._find_code_files(), key=self._file_priority)
+
+                if not code_files:
+                    self.db.update_job_status(
+                        self.job_id, JobStatus.COMPLETED, "No supported code files found"
+                    )
+                    JOBS_FINISHED.labels(status=JobStatus.COMPLETED.value).inc()
+                    return
+
+                # Update progress
+                self.db.update_job_progress(self.job_id, len(code_files), 0)
+
+                # Process files concurrently
+                skipped = await self._process_files_async(code_files)
+
+            if skipped:
+                processed = len(code_files) - skipped
                 self.db.update_job_status(
-                    self.job_id, JobStatus.COMPLETED, "No supported code files found"
+                    self.job_id, JobStatus.PARTIAL,
+                    f"Budget reached after {processed} of {len(code_files)} files",
                 )
+                JOBS_FINISHED.labels(status=JobStatus.PARTIAL.value).inc()
                 return
 
-            # Update progress
-            self.db.update_job_progress(self.job_id, len(code_files), 0)
-
-            # Process files concurrently
-            await self._process_files_async(code_files)
-
             self.db.update_job_status(self.job_id, JobStatus.COMPLETED)
+            JOBS_FINISHED.labels(status=JobStatus.COMPLETED.value).inc()
 
         except Exception as e:
             error_msg = f"Processing failed: {str(e)}\n{traceback.format_exc()}"
             self.db.update_job_status(self.job_id, JobStatus.FAILED, error_msg)
+            JOBS_FINISHED.labels(status=JobStatus.FAILED.value).inc()
         finally:
             # Cleanup
             if self.temp_dir and self.temp_dir.exists():
                 shutil.rmtree(self.temp_dir)
+            if job["source_archive"]:
+                Path(job["source_archive"]).unlink(missing_ok=True)
+            if profiler:
+                profiler.stop()
+
+    def _observe_queue_wait(self, job: dict):
+        """Record how long the job waited between submission and being claimed"""
+        # created_at is set by SQLite's CURRENT_TIMESTAMP, which is UTC
+        created_at = datetime.fromisoformat(job["created_at"]).replace(tzinfo=timezone.utc)
+        waited = (datetime.now(timezone.utc) - created_at).total_seconds()
+        STAGE_DURATION.labels(stage="queue_wait").observe(max(waited, 0.0))
 
     async def _clone_repository(self):
         """Clone the repository to a temporary directory"""
@@ -81,6 +146,18 @@ class RepositoryProcessor:
         if process.returncode != 0:
             raise Exception(f"Git clone failed: {stderr.decode()}")
 
+        # Record the commit actually processed so resubmissions of it can be deduplicated
+        head_sha = await local_head(self.temp_dir)
+        if head_sha:
+            self.db.update_job_head(self.job_id, head_sha)
+
+    async def _extract_archive(self, archive_path: Path):
+        """Extract supported files from an uploaded archive into a temporary directory"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        await asyncio.to_thread(
+            extract_archive, archive_path, self.temp_dir, self.supported_extensions, MAX_FILE_SIZE
+        )
+
     def _find_code_files(self) -> List[Path]:
         """Find all supported code files in the repository"""
         code_files = []
@@ -122,36 +199,51 @@ class RepositoryProcessor:
 
         # Check file size (skip very large files > 1MB)
         try:
-            if file_path.stat().st_size > 1024 * 1024:
+            if file_path.stat().st_size > MAX_FILE_SIZE:
                 return True
         except:
             return True
 
         return False
 
-    async def _process_files_async(self, code_files: List[Path]):
-        """Process code files asynchronously with concurrency limit"""
-        semaphore = asyncio.Semaphore(5)  # Limit concurrent processing
-
-        async def process_single_file(file_path: Path):
-            async with semaphore:
-                await self._process_single_file(file_path)
+    def _file_priority(self, file_path: Path):
+        """Sort key putting application code before tests, examples and docs, larger files first"""
+        relative = file_path.relative_to(self.temp_dir)
+        low_priority = (
+            any(part.lower() in LOW_PRIORITY_DIRS for part in relative.parts[:-1])
+            or relative.name.startswith("test_")
+            or relative.name.endswith("_test.py")
+            or relative.name == "conftest.py"
+        )
+        return (low_priority, -file_path.stat().st_size, str(relative))
 
-        # Create tasks for all files
-        tasks = [process_single_file(file_path) for file_path in code_files]
+    async def _process_files_async(self, code_files: List[Path]) -> int:
+        """Process code files in order with a concurrency limit, returning how many were skipped.
 
-        # Process with progress updates
+        Files are handed out one at a time as slots free up, so once the job's
+        budget is exhausted no further files are started; files already in flight
+        still finish and are saved.
+        """
+        remaining = iter(code_files)
         completed = 0
-        for task in asyncio.as_completed(tasks):
-            try:
-                await task
-                completed += 1
-                self.db.update_job_progress(self.job_id, len(code_files), completed)
-            except Exception as e:
-                print(f"Error processing file: {e}")
+        skipped = 0
+
+        async def process_files():
+            nonlocal completed, skipped
+            for file_path in remaining:
+                if self.budget.exhausted:
+                    skipped += 1
+                    continue
+                try:
+                    await self._process_single_file(file_path)
+                except Exception as e:
+                    print(f"Error processing file: {e}")
                 completed += 1
                 self.db.update_job_progress(self.job_id, len(code_files), completed)
 
+        await asyncio.gather(*(process_files() for _ in range(FILE_CONCURRENCY)))
+        return skipped
+
     async def _process_single_file(self, file_path: Path):
         """Process a single file with sloptimize."""
         try:
@@ -162,23 +254,42 @@ class RepositoryProcessor:
             if len(original_code.strip()) < 50:
                 return
 
-            # Run sloptimize in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, sloptimize, original_code)
-
             # Get relative path from repo root
             relative_path = file_path.relative_to(self.temp_dir)
 
-            # Save result to database
-            self.db.save_file_result(
-                job_id=self.job_id,
-                file_path=str(relative_path),
-                original_code=original_code,
-                optimized_code=result.source_code,
-                score=result.assessment.score or 0.0,
-                metrics=result.assessment.metrics or {},
-                integration_considerations=result.integration_considerations,
-            )
+            with span("file", file_path=str(relative_path)) as file_span:
+                # Run sloptimize in a thread to avoid blocking; to_thread carries the span along
+                try:
+                    with track_stage("llm"):
+                        result = await asyncio.to_thread(
+                            sloptimize, original_code, routing_policy=self.routing_policy
+                        )
+                except Exception:
+                    # Tokens spent on a failed call still count toward the job's usage and budget
+                    usage = file_span.usage()
+                    self.db.add_job_usage(
+                        self.job_id, usage["input_tokens"], usage["output_tokens"],
+                        usage["cached_tokens"], self.budget.charge(usage, file_span.cost_usd),
+                    )
+                    raise
+                cost_usd = self.budget.charge(file_span.usage(), file_span.cost_usd)
+
+                # Save result to database, with the tokens, retries, cost, time and model spent on this file
+                with track_stage("db_write"):
+                    self.db.save_file_result(
+                        job_id=self.job_id,
+                        file_path=str(relative_path),
+                        original_code=original_code,
+                        optimized_code=result.source_code,
+                        score=result.assessment.score or 0.0,
+                        metrics=result.assessment.metrics or {},
+                        integration_considerations=result.integration_considerations,
+                        **file_span.usage(),
+                        duration_seconds=file_span.elapsed,
+                        cost_usd=cost_usd,
+                        model=result.model,
+                        model_tier=result.model_tier,
+                    )
 
         except Exception as e:
             print(f"Error processing {file_path}: {e}")
@@ -186,14 +297,14 @@ class RepositoryProcessor:
 
 async def main():
     """Entry point for worker process"""
-    if len(sys.argv) != 3:
-        print("Usage: python -m sloptimize.worker.main <job_id> <repo_url>")
-        sys.exit(1)
-
-    job_id = sys.argv[1]
-    repo_url = sys.argv[2]
-
-    processor = RepositoryProcessor(job_id, repo_url)
+    parser = argparse.ArgumentParser(prog="python -m sloptimize.worker.main")
+    parser.add_argument("job_id")
+    parser.add_argument("repo_url")
+    parser.add_argument("--profile", metavar="DIR", default=PROFILE_DIR,
+                        help="Write a sampling profile of the job to DIR/<job_id>")
+    args = parser.parse_args()
+
+    processor = RepositoryProcessor(args.job_id, args.repo_url, profile_dir=args.profile)
     await processor.process()
 
 
@@ -0,0 +1,165 @@
+"""
+Opt-in sampling profiler for repository jobs
+
+While a profiled job runs, a background thread samples the stack of every
+thread in the worker process every `PROFILE_INTERVAL` seconds, which shows time
+spent in pydantic validation, JSON encoding, SQLite commits, file reads and
+blocked on the provider alike. A coroutine on the event loop samples where each
+asyncio task is suspended and how late the loop wakes it, so time tasks spend
+waiting is attributed to the await that held them.
+
+Both are written to the job's profile directory as collapsed stacks, one
+`frame;frame;frame count` line per distinct stack, the input format of
+flamegraph.pl and speedscope:
+
+- `threads.collapsed`: thread stacks, rooted at the thread name
+- `tasks.collapsed`: await stacks of suspended tasks, rooted at their coroutine
+- `summary.json`: sample counts, event loop lag and the hottest frames in seconds
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional
+
+from ..environment import PROFILE_INTERVAL
+
+# Frames listed per section of summary.json
+SUMMARY_TOP_FRAMES = 20
+
+
+def _frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[str]:
+    """Frame names of a thread's stack, outermost first"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return names[::-1]
+
+
+def _task_stack(task: asyncio.Task) -> List[str]:
+    """Frame names of the coroutine chain a suspended task is waiting in, outermost first"""
+    names = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        names.append(_frame_name(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return names
+
+
+def _collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class JobProfiler:
+    """Samples thread stacks and asyncio task waits for one job and writes them to `directory`"""
+
+    directory: Path
+    interval: float
+    thread_stacks: Counter
+    task_stacks: Counter
+    loop_lags: List[float]
+
+    def __init__(self, directory: Path, interval: float = PROFILE_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.thread_stacks = Counter()
+        self.task_stacks = Counter()
+        self.loop_lags = []
+        self._thread_samples = 0
+        self._task_samples = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._monitor = None
+        self._started = 0.0
+
+    def start(self):
+        """Start sampling; must be called from the job's event loop"""
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_threads, name="sloptimize-profiler", daemon=True)
+        self._thread.start()
+        self._monitor = asyncio.get_running_loop().create_task(self._sample_tasks())
+
+    def stop(self) -> Path:
+        """Stop sampling and write the profile artifacts, returning their directory"""
+        duration = time.perf_counter() - self._started
+        self._monitor.cancel()
+        self._stopped.set()
+        self._thread.join()
+        self.write(duration)
+        return self.directory
+
+    def _sample_threads(self):
+        # Runs on its own thread so it keeps sampling while the event loop is blocked
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.thread_stacks[";".join([names.get(ident, str(ident)), *_thread_stack(frame)])] += 1
+            self._thread_samples += 1
+
+    async def _sample_tasks(self):
+        loop = asyncio.get_running_loop()
+        own = asyncio.current_task()
+        while True:
+            scheduled = loop.time()
+            await asyncio.sleep(self.interval)
+            # How much later than requested the loop got back to this task
+            self.loop_lags.append(max(loop.time() - scheduled - self.interval, 0.0))
+            for task in asyncio.all_tasks(loop):
+                if task is own:
+                    continue
+                stack = _task_stack(task)
+                if stack:
+                    self.task_stacks[";".join(stack)] += 1
+            self._task_samples += 1
+
+    def _top_frames(self, stacks: Counter) -> List[Dict[str, float]]:
+        """Innermost frames by sampled seconds"""
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [
+            {"frame": frame, "seconds": round(count * self.interval, 3)}
+            for frame, count in leaves.most_common(SUMMARY_TOP_FRAMES)
+        ]
+
+    def write(self, duration: float):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / "threads.collapsed").write_text(_collapsed(self.thread_stacks))
+        (self.directory / "tasks.collapsed").write_text(_collapsed(self.task_stacks))
+
+        lags = sorted(self.loop_lags)
+        summary = {
+            "duration_seconds": round(duration, 3),
+            "interval_seconds": self.interval,
+            "thread_samples": self._thread_samples,
+            "task_samples": self._task_samples,
+            "loop_lag_seconds": {
+                "p50": round(_percentile(lags, 0.50), 4),
+                "p99": round(_percentile(lags, 0.99), 4),
+                "max": round(lags[-1] if lags else 0.0, 4),
+            },
+            "top_thread_frames": self._top_frames(self.thread_stacks),
+            "top_task_waits": self._top_frames(self.task_stacks),
+        }
+        (self.directory / "summary.json").write_text(json.dumps(summary, indent=2) + "\n")
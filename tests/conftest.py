@@ -0,0 +1,28 @@
+"""
+Shared pytest configuration
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Replay recorded provider responses unless the shell picks a provider; this is
+# set before .env is loaded so a live provider configured there is not used.
+# A missing cassette fails the test rather than calling the provider, keeping
+# the run offline; CASSETTE_MODE=replay records it from CASSETTE_PROVIDER instead
+os.environ.setdefault("LLM_PROVIDER", "cassette")
+os.environ.setdefault("CASSETTE_MODE", "strict")
+os.environ.setdefault("CASSETTE_DIR", str(Path(__file__).parent / "cassettes"))
+
+# Provider clients are built at import time; give offline tests placeholder
+# credentials without masking real keys from the environment or .env
+load_dotenv()
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("XAI_API_KEY", "test")
+
+# Keep the module-level API database out of the working directory
+os.environ.setdefault(
+    "SLOPTIMIZE_DB_PATH", str(Path(tempfile.mkdtemp()) / "sloptimize-test.db")
+)
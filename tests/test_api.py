@@ -0,0 +1,636 @@
+"""
+Tests for the sloptimize FastAPI application
+"""
+
+import asyncio
+import io
+import json
+import time
+import zipfile
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from sloptimize.api import main as api
+from sloptimize.api.admission import AdmissionController
+from sloptimize.api.events import JobEventBroker
+from sloptimize.database import AsyncDatabase, Database, JobStatus
+from sloptimize.main import OptimizationAssessment, SloptimizeResult
+from sloptimize.singleflight import content_hash
+
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)
+
+
+@pytest.fixture
+def db():
+    return api.db.db
+
+
+def create_job_with_results(db, scores: list[float]) -> str:
+    job_id = db.create_job("https://github.com/octocat/Hello-World.git")
+    for index, score in enumerate(scores):
+        db.save_file_result(
+            job_id=job_id,
+            file_path=f"pkg/module_{index}.py",
+            original_code="x = 1\n",
+            optimized_code="x = 1\n",
+            score=score,
+            metrics={"performance_gain": "Faster" if score > 5 else None},
+            integration_considerations=["Signature changed"],
+        )
+    return job_id
+
+
+def test_job_summary(client, db):
+    job_id = create_job_with_results(db, [8.0, 4.0])
+
+    response = client.get(f"/jobs/{job_id}/summary")
+
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["result_count"] == 2
+    assert summary["average_score"] == 6.0
+    assert summary["score_histogram"] == {"8.0": 1, "4.0": 1}
+    assert summary["metric_tallies"] == {"performance_gain": 1}
+
+
+def test_job_summary_not_found(client):
+    assert client.get("/jobs/missing/summary").status_code == 404
+
+
+def test_search_ranks_and_paginates(client, db):
+    job_id = create_job_with_results(db, [1.0, 2.0, 3.0])
+
+    response = client.get("/search", params={"q": '"signature changed"', "job_id": job_id, "limit": 2})
+
+    assert response.status_code == 200
+    page = response.json()
+    assert len(page["results"]) == 2
+    assert page["next_offset"] == 2
+    assert "<mark>Signature changed</mark>" in page["results"][0]["snippet"]
+
+    response = client.get("/search", params={"q": '"signature changed"', "job_id": job_id, "offset": 2})
+    assert len(response.json()["results"]) == 1
+    assert response.json()["next_offset"] is None
+
+
+def test_search_invalid_query(client):
+    assert client.get("/search", params={"q": '"unterminated'}).status_code == 400
+
+
+def test_job_events_stream_updates(db):
+    broker = JobEventBroker(api.db, interval=0.01)
+    job_id = db.create_job("https://github.com/octocat/Hello-World.git")
+    db.update_job_status(job_id, JobStatus.PROCESSING)
+
+    async def collect():
+        events = []
+        async for event in broker.subscribe(job_id):
+            events.append(event)
+            if len(events) == 2:
+                db.update_job_progress(job_id, 1, 0)
+                db.save_file_result(
+                    job_id=job_id,
+                    file_path="pkg/module.py",
+                    original_code="x = 1\n",
+                    optimized_code="x = 1\n",
+                    score=3.0,
+                    metrics={},
+                    integration_considerations=[],
+                )
+                db.update_job_progress(job_id, 1, 1)
+                db.update_job_status(job_id, JobStatus.COMPLETED)
+        return events
+
+    events = asyncio.run(asyncio.wait_for(collect(), timeout=5))
+
+    assert [event for event, _ in events] == ["progress", "status", "file", "progress", "status"]
+    assert events[2][1]["file_path"] == "pkg/module.py"
+    assert events[3][1]["progress_percent"] == 100.0
+    assert events[4][1]["status"] == "completed"
+
+
+def test_job_events_forget_job_left_during_poll(db):
+    job_id = create_job_with_results(db, [3.0])
+    broker = JobEventBroker(api.db, interval=0.01)
+
+    class LeftDuringPoll:
+        async def poll_job_updates(self, cursors):
+            updates = await api.db.poll_job_updates(cursors)
+            # The job's last subscriber leaves while the query runs
+            for watched in (broker._subscribers, broker._jobs, broker._cursors):
+                watched.clear()
+            return updates
+
+    broker.db = LeftDuringPoll()
+    broker._subscribers = {job_id: {asyncio.Queue()}}
+    broker._jobs = {job_id: db.get_job(job_id)}
+    broker._cursors = {job_id: 0}
+
+    asyncio.run(asyncio.wait_for(broker._poll(), timeout=5))
+
+    assert broker._cursors == {}
+
+
+def test_job_events_finished_job_closes(client, db):
+    job_id = db.create_job("https://github.com/octocat/Hello-World.git")
+    db.update_job_status(job_id, JobStatus.FAILED, "Git clone failed")
+
+    response = client.get(f"/jobs/{job_id}/events")
+
+    assert "event: status" in response.text
+    assert "Git clone failed" in response.text
+
+
+def test_export_results_ndjson(client, db):
+    job_id = create_job_with_results(db, [float(score) for score in range(450)])
+
+    response = client.get(f"/jobs/{job_id}/results.ndjson", params={"include_code": True})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-encoding"] == "gzip"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 450
+    assert rows[0]["score"] == 449.0
+    assert rows[0]["optimized_code"] == "x = 1\n"
+
+
+def test_export_results_ndjson_uncompressed(client, db):
+    job_id = create_job_with_results(db, [1.0, 2.0])
+
+    response = client.get(
+        f"/jobs/{job_id}/results.ndjson",
+        params={"order_by_score": False},
+        headers={"Accept-Encoding": "identity"},
+    )
+
+    assert "content-encoding" not in response.headers
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["score"] for row in rows] == [1.0, 2.0]
+    assert "optimized_code" not in rows[0]
+
+
+def make_result(code: str) -> SloptimizeResult:
+    return SloptimizeResult(
+        source_code=code.upper(),
+        assessment=OptimizationAssessment(score=5.0, metrics={}, recommendations=None),
+        integration_considerations=[],
+    )
+
+
+def test_optimize_coalesces_identical_requests(monkeypatch):
+    calls = []
+
+    def fake_sloptimize(code: str) -> SloptimizeResult:
+        calls.append(code)
+        time.sleep(0.2)
+        return make_result(code)
+
+    monkeypatch.setattr(api, "sloptimize", fake_sloptimize)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post("/optimize", json={"code": "x = 1"}) for _ in range(5)),
+                client.post("/optimize", json={"code": "y = 2"}),
+            )
+
+    responses = asyncio.run(burst())
+
+    assert [response.status_code for response in responses] == [200] * 6
+    assert sorted(calls) == ["x = 1", "y = 2"]
+    assert responses[0].json()["source_code"] == "X = 1"
+    assert responses[5].json()["source_code"] == "Y = 2"
+
+
+def test_optimize_failure_reaches_every_waiter(monkeypatch):
+    calls = []
+
+    def failing_sloptimize(code: str) -> SloptimizeResult:
+        calls.append(code)
+        time.sleep(0.2)
+        raise TimeoutError("provider timed out")
+
+    monkeypatch.setattr(api, "sloptimize", failing_sloptimize)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/optimize", json={"code": "x = 1"}) for _ in range(5)))
+
+    responses = asyncio.run(burst())
+
+    # One failing call was shared by every request, and each of them got its error
+    assert calls == ["x = 1"]
+    assert [response.status_code for response in responses] == [502] * 5
+    assert all("provider timed out" in response.json()["detail"] for response in responses)
+    assert not api.optimize_flights.in_flight(content_hash("x = 1"))
+
+
+def test_completed_job_results_are_cached(client, db, monkeypatch):
+    job_id = create_job_with_results(db, [3.0, 9.0])
+    db.update_job_status(job_id, JobStatus.COMPLETED)
+
+    first = client.get(f"/jobs/{job_id}/results")
+    assert first.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag = first.headers["etag"]
+
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("cached responses must not touch the database")
+
+    monkeypatch.setattr(api.db, "get_job", unexpected, raising=False)
+
+    repeat = client.get(f"/jobs/{job_id}/results")
+    assert repeat.content == first.content
+    assert [result["score"] for result in repeat.json()] == [9.0, 3.0]
+
+    conditional = client.get(f"/jobs/{job_id}/results", headers={"If-None-Match": etag})
+    assert conditional.status_code == 304
+    assert conditional.content == b""
+
+
+def test_in_progress_job_is_not_cached(client, db):
+    job_id = create_job_with_results(db, [3.0])
+    db.update_job_status(job_id, JobStatus.PROCESSING)
+
+    response = client.get(f"/jobs/{job_id}/status")
+
+    assert response.headers["cache-control"] == "no-cache"
+    assert "etag" not in response.headers
+    assert response.json()["status"] == "processing"
+
+
+def test_results_pass_stored_json_through(client, db):
+    job_id = create_job_with_results(db, [8.0])
+
+    result = client.get(f"/jobs/{job_id}/results").json()[0]
+
+    assert result["metrics"] == {"performance_gain": "Faster"}
+    assert result["integration_considerations"] == ["Signature changed"]
+    assert set(result) == set(api.FileResult.model_fields)
+
+
+class FakeWorker:
+    """Stands in for a worker subprocess that is still running"""
+
+    pid = 0
+
+    def poll(self):
+        return None
+
+
+@pytest.fixture
+def submissions(monkeypatch, tmp_path):
+    """Give submissions their own database and stub out git and worker processes"""
+    started = []
+    heads = {}
+
+    async def fake_remote_head(repo_url):
+        return heads.get(repo_url)
+
+    def fake_run_worker_process(job_id, repo_url):
+        started.append(job_id)
+        return FakeWorker()
+
+    database = AsyncDatabase(Database(str(tmp_path / "submissions.db")))
+    monkeypatch.setattr(api, "db", database)
+    monkeypatch.setattr(api, "admission", AdmissionController(database))
+    monkeypatch.setattr(api, "worker_processes", {})
+    monkeypatch.setattr(api, "remote_head", fake_remote_head)
+    monkeypatch.setattr(api, "run_worker_process", fake_run_worker_process)
+    return started, heads, database.db
+
+
+def test_submission_returns_active_job(client, submissions):
+    started, _, _ = submissions
+    repo_url = "https://github.com/octocat/active-dedup"
+
+    first = client.post("/process-repository", json={"repo_url": repo_url}).json()
+    second = client.post("/process-repository", json={"repo_url": repo_url}).json()
+    forced = client.post("/process-repository", json={"repo_url": repo_url, "force": True}).json()
+
+    assert second["job_id"] == first["job_id"]
+    assert second["duplicate"] is True
+    assert forced["job_id"] != first["job_id"]
+    assert started == [first["job_id"], forced["job_id"]]
+
+
+def test_submission_returns_completed_job_for_same_head(client, submissions):
+    _, heads, db = submissions
+    repo_url = "https://github.com/octocat/head-dedup"
+    heads[repo_url] = "a" * 40
+
+    first = client.post("/process-repository", json={"repo_url": repo_url}).json()
+    db.update_job_status(first["job_id"], JobStatus.COMPLETED)
+
+    same_head = client.post("/process-repository", json={"repo_url": repo_url}).json()
+    assert same_head["job_id"] == first["job_id"]
+    assert same_head["status"] == JobStatus.COMPLETED
+
+    heads[repo_url] = "b" * 40
+    new_head = client.post("/process-repository", json={"repo_url": repo_url}).json()
+    assert new_head["job_id"] != first["job_id"]
+    assert new_head["duplicate"] is False
+
+
+def test_submissions_over_client_quota_are_rejected(client, submissions, monkeypatch):
+    _, _, db = submissions
+    monkeypatch.setattr(api.admission, "max_jobs_per_client", 2)
+    # Stand in for nginx, whose X-Real-IP names the client
+    monkeypatch.setattr("sloptimize.api.admission.TRUSTED_PROXIES", {"testclient"})
+    finished = db.create_job("https://github.com/octocat/finished")
+    db.update_job_status(finished, JobStatus.COMPLETED)
+
+    for index in range(2):
+        response = client.post("/process-repository", json={"repo_url": f"https://github.com/octocat/quota-{index}"})
+        assert response.status_code == 200
+
+    rejected = client.post("/process-repository", json={"repo_url": "https://github.com/octocat/quota-2"})
+    other_client = client.post(
+        "/process-repository",
+        json={"repo_url": "https://github.com/octocat/quota-3"},
+        headers={"X-Real-IP": "203.0.113.7"},
+    )
+
+    assert rejected.status_code == 429
+    # One job finished in the drain window, so one slot frees up about every window
+    assert int(rejected.headers["Retry-After"]) == api.admission.drain_window
+    assert other_client.status_code == 200
+
+
+def test_full_queue_rejects_and_reports_depth(client, submissions, monkeypatch):
+    _, _, db = submissions
+    monkeypatch.setattr(api.admission, "max_queue_depth", 1)
+
+    assert client.post("/process-repository", json={"repo_url": "https://github.com/octocat/depth-0"}).status_code == 200
+    rejected = client.post("/process-repository", json={"repo_url": "https://github.com/octocat/depth-1"})
+
+    assert rejected.status_code == 429
+    assert rejected.json()["detail"] == "Job queue is full"
+    queue = client.get("/queue").json()
+    assert queue["depth"] == 1
+    assert queue["client_active"] == 1
+    assert queue["estimated_wait_seconds"] is None
+
+
+def test_concurrent_submissions_cannot_overfill_queue(submissions, monkeypatch):
+    monkeypatch.setattr(api.admission, "max_queue_depth", 3)
+    monkeypatch.setattr(api.admission, "max_jobs_per_client", 100)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/process-repository", json={"repo_url": f"https://github.com/octocat/race-{index}"})
+                for index in range(20)
+            ))
+
+    responses = asyncio.run(burst())
+
+    assert sorted(response.status_code for response in responses) == [200] * 3 + [429] * 17
+    assert api.admission.max_queue_depth == len(submissions[2].get_jobs())
+
+
+def test_concurrent_submissions_coalesce_per_client(submissions, monkeypatch):
+    _, heads, db = submissions
+    repo_url = "https://github.com/octocat/coalesced"
+    monkeypatch.setattr(api.admission, "max_jobs_per_client", 1)
+    monkeypatch.setattr("sloptimize.api.admission.TRUSTED_PROXIES", {"127.0.0.1"})
+    lookup = api.remote_head
+
+    async def slow_remote_head(url):
+        # Hold each submission in its lookup so the others arrive while it is in flight
+        await asyncio.sleep(0.05)
+        return await lookup(url)
+
+    monkeypatch.setattr(api, "remote_head", slow_remote_head)
+    db.create_jobs([{'repo_url': "https://github.com/octocat/quota-used"}], client_id="203.0.113.1")
+
+    async def burst():
+        transport = httpx.ASGITransport(app=api.app, client=("127.0.0.1", 123))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/process-repository", json={"repo_url": repo_url}, headers={"X-Real-IP": real_ip})
+                for real_ip in ("203.0.113.1", "203.0.113.2", "203.0.113.2", "203.0.113.2")
+            ))
+
+    over_quota, *accepted = asyncio.run(burst())
+
+    # The client over its quota is refused without refusing the others
+    assert over_quota.status_code == 429
+    assert [response.status_code for response in accepted] == [200] * 3
+    assert len({response.json()["job_id"] for response in accepted}) == 1
+    assert [response.json()["duplicate"] for response in accepted] == [False, True, True]
+
+
+def test_real_ip_is_only_trusted_from_proxies(client, submissions, monkeypatch):
+    _, _, db = submissions
+    monkeypatch.setattr(api.admission, "max_jobs_per_client", 1)
+
+    spoofed = [
+        client.post(
+            "/process-repository",
+            json={"repo_url": f"https://github.com/octocat/spoof-{index}"},
+            headers={"X-Real-IP": f"198.51.100.{index}"},
+        )
+        for index in range(2)
+    ]
+
+    # The header came straight from the client, so both requests count against its own address
+    assert [response.status_code for response in spoofed] == [200, 429]
+    assert {job["client_id"] for job in db.get_jobs()} == {"testclient"}
+
+
+def test_worker_processes_are_bounded(client, submissions, monkeypatch):
+    started, _, db = submissions
+    monkeypatch.setattr(api, "WORKER_CONCURRENCY", 2)
+
+    job_ids = [
+        client.post("/process-repository", json={"repo_url": f"https://github.com/octocat/bounded-{index}"}).json()["job_id"]
+        for index in range(3)
+    ]
+
+    # The third job waits for a free slot and is started oldest-first
+    assert started == job_ids[:2]
+    assert db.claim_job(job_ids[2])
+    assert not db.claim_job(job_ids[2])
+
+
+def test_worker_claims_are_bounded_globally(submissions):
+    _, _, db = submissions
+    job_ids = db.create_jobs([{'repo_url': f"https://github.com/octocat/claim-{index}"} for index in range(3)])
+
+    assert db.claim_job(job_ids[0], max_processing=2)
+    assert db.claim_job(job_ids[1], max_processing=2)
+    # Another process's worker can't start a third job; it stays pending for later
+    assert not db.claim_job(job_ids[2], max_processing=2)
+    db.update_job_status(job_ids[0], JobStatus.COMPLETED)
+    assert db.claim_job(job_ids[2], max_processing=2)
+
+
+def test_finished_workers_are_reaped_without_new_submissions(submissions, monkeypatch):
+    started, _, db = submissions
+    monkeypatch.setattr(api, "WORKER_CONCURRENCY", 1)
+    monkeypatch.setattr(api, "WORKER_REAP_INTERVAL", 0.01)
+
+    async def run():
+        job_ids = db.create_jobs([{'repo_url': f"https://github.com/octocat/reap-{index}"} for index in range(2)])
+        await api.start_pending_workers()
+        assert started == job_ids[:1]
+
+        # The first worker exits; the supervisor notices and starts the second job in its slot
+        api.worker_processes[job_ids[0]].poll = lambda: 0
+        db.update_job_status(job_ids[0], JobStatus.COMPLETED)
+        for _ in range(100):
+            if len(started) == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert started == job_ids
+        api.worker_supervisor.cancel()
+
+    asyncio.run(run())
+
+
+def test_metrics_endpoint(client, submissions):
+    client.post("/process-repository", json={"repo_url": "https://github.com/octocat/metrics"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'sloptimize_submissions_total{outcome="accepted"}' in response.text
+    assert 'sloptimize_queue_depth{status="pending"}' in response.text
+    assert "sloptimize_active_workers" in response.text
+
+
+def test_batch_submission_and_progress(client, submissions):
+    started, _, db = submissions
+    existing = client.post("/process-repository", json={"repo_url": "https://github.com/octocat/batch-0"}).json()
+    repo_urls = [f"https://github.com/octocat/batch-{index}" for index in range(3)]
+
+    response = client.post("/process-repositories", json={"repo_urls": repo_urls + [repo_urls[1]]})
+
+    assert response.status_code == 200
+    batch = response.json()
+    assert [job["repo_url"] for job in batch["jobs"]] == repo_urls
+    assert batch["jobs"][0] == {**batch["jobs"][0], "job_id": existing["job_id"], "duplicate": True}
+    new_ids = [job["job_id"] for job in batch["jobs"][1:]]
+    assert len(set(new_ids)) == 2
+
+    db.update_job_status(new_ids[0], JobStatus.COMPLETED)
+    db.update_job_progress(new_ids[1], 4, 1)
+    progress = client.get(f"/batches/{batch['batch_id']}").json()
+
+    assert [job["job_id"] for job in progress["jobs"]] == new_ids
+    assert progress["status_counts"] == {"completed": 1, "pending": 1}
+    assert progress["progress_percent"] == 50.0
+    assert (progress["total_files"], progress["processed_files"]) == (4, 1)
+
+
+def test_batch_submission_is_admitted_as_a_group(client, submissions, monkeypatch):
+    _, _, db = submissions
+    monkeypatch.setattr(api.admission, "max_jobs_per_client", 2)
+    active = client.post("/process-repository", json={"repo_url": "https://github.com/octocat/group-active"}).json()
+
+    response = client.post(
+        "/process-repositories",
+        json={"repo_urls": [f"https://github.com/octocat/group-{index}" for index in range(2)]},
+    )
+
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert [job["id"] for job in db.get_jobs()] == [active["job_id"]]
+    assert client.get("/batches/missing").status_code == 404
+
+
+def test_batch_larger_than_client_quota_is_refused_outright(client, submissions, monkeypatch):
+    _, _, db = submissions
+    monkeypatch.setattr(api.admission, "max_jobs_per_client", 2)
+
+    response = client.post(
+        "/process-repositories",
+        json={"repo_urls": [f"https://github.com/octocat/oversized-{index}" for index in range(3)]},
+    )
+
+    # No amount of waiting makes room for it, so the client isn't told to retry
+    assert response.status_code == 413
+    assert "Retry-After" not in response.headers
+    assert db.get_jobs() == []
+
+
+def test_upload_repository_archive(client, submissions, tmp_path, monkeypatch):
+    _, _, db = submissions
+    monkeypatch.setattr(api, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("app.py", "print('hello')\n")
+
+    response = client.post("/upload-repository?name=air-gapped", content=archive.getvalue())
+    mismatched = client.post("/upload-repository?format=tar.gz", content=archive.getvalue())
+    garbage = client.post("/upload-repository", content=b"plain text")
+
+    assert response.status_code == 200
+    job = db.get_job(response.json()["job_id"])
+    assert job["repo_url"] == "upload:air-gapped"
+    assert job["source_archive"].endswith(".zip")
+    assert open(job["source_archive"], "rb").read() == archive.getvalue()
+    assert mismatched.status_code == 415
+    assert garbage.status_code == 415
+    assert len(list((tmp_path / "uploads").iterdir())) == 1
+
+
+def test_upload_repository_size_limit(client, submissions, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(api, "MAX_UPLOAD_BYTES", 16)
+
+    declared = client.post("/upload-repository", content=b"PK\x03\x04" + b"0" * 64)
+    streamed = client.post("/upload-repository", content=iter([b"PK\x03\x04", b"0" * 64]))
+
+    assert declared.status_code == 413
+    assert streamed.status_code == 413
+    assert list((tmp_path / "uploads").iterdir()) == []
+
+
+def test_submission_budget(client, submissions, monkeypatch):
+    repo_url = "https://github.com/octocat/budgeted"
+
+    unpriced = client.post("/process-repository", json={"repo_url": repo_url, "max_cost_usd": 1.0})
+    assert unpriced.status_code == 400
+
+    monkeypatch.setattr(api, "pricing_configured", lambda: True)
+    job_id = client.post(
+        "/process-repository", json={"repo_url": repo_url, "max_tokens": 1000, "max_cost_usd": 1.0}
+    ).json()["job_id"]
+    _, _, db = submissions
+    db.add_job_usage(job_id, 400, 100, 50, 0.25)
+    db.update_job_status(job_id, JobStatus.PARTIAL, "Budget reached after 2 of 5 files")
+
+    status = client.get(f"/jobs/{job_id}/status").json()
+    assert status["status"] == JobStatus.PARTIAL
+    assert status["max_tokens"] == 1000
+    assert status["max_cost_usd"] == 1.0
+    assert (status["input_tokens"], status["output_tokens"], status["cached_tokens"]) == (400, 100, 50)
+    assert status["cost_usd"] == 0.25
+
+
+def test_submission_routing_policy(client, submissions):
+    repo_url = "https://github.com/octocat/routed"
+
+    invalid = client.post("/process-repository", json={"repo_url": repo_url, "routing_policy": "cheapest"})
+    job_id = client.post("/process-repository", json={"repo_url": repo_url, "routing_policy": "cascade"}).json()["job_id"]
+    _, _, db = submissions
+    db.save_file_result(
+        job_id=job_id, file_path="app.py", original_code="x = 1\n", optimized_code="x = 1\n", score=1.0,
+        metrics={}, integration_considerations=[], model="gpt-4o-mini", model_tier="fast",
+    )
+
+    assert invalid.status_code == 422
+    assert client.get(f"/jobs/{job_id}/status").json()["routing_policy"] == "cascade"
+    result = client.get(f"/jobs/{job_id}/results").json()[0]
+    assert (result["model"], result["model_tier"]) == ("gpt-4o-mini", "fast")
@@ -0,0 +1,124 @@
+"""
+Tests for uploaded archive extraction
+"""
+
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from sloptimize.database import Database, JobStatus
+from sloptimize.main import OptimizationAssessment, SloptimizeResult
+from sloptimize.worker import main as worker
+from sloptimize.worker.archive import ArchiveError, extract_archive
+
+CODE = "def add(a, b):\n    return a + b\n\n\nprint(add(1, 2))\n"
+
+
+def make_tar(path, members):
+    with tarfile.open(path, "w:gz") as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return path
+
+
+@pytest.mark.parametrize("make", [make_tar, make_zip])
+def test_extracts_only_supported_files(tmp_path, make):
+    archive = make(tmp_path / "upload", [
+        ("repo/pkg/app.py", CODE.encode()),
+        ("repo/README.md", b"# readme"),
+        ("repo/big.py", b"x" * 2048),
+    ])
+    destination = tmp_path / "checkout"
+    destination.mkdir()
+
+    extracted = extract_archive(archive, destination, {".py"}, max_file_size=1024)
+
+    assert extracted == 1
+    assert (destination / "repo" / "pkg" / "app.py").read_text() == CODE
+    assert sorted(p.name for p in destination.rglob("*") if p.is_file()) == ["app.py"]
+
+
+@pytest.mark.parametrize("make", [make_tar, make_zip])
+@pytest.mark.parametrize("name", ["../escape.py", "/etc/escape.py", "C:/escape.py"])
+def test_rejects_path_traversal(tmp_path, make, name):
+    archive = make(tmp_path / "upload", [(name, CODE.encode())])
+    destination = tmp_path / "checkout"
+    destination.mkdir()
+
+    with pytest.raises(ArchiveError):
+        extract_archive(archive, destination, {".py"}, max_file_size=1024)
+
+    assert not (tmp_path / "escape.py").exists()
+
+
+def test_skips_links(tmp_path):
+    archive_path = tmp_path / "upload"
+    with tarfile.open(archive_path, "w:gz") as archive:
+        link = tarfile.TarInfo("repo/passwd.py")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "/etc/passwd"
+        archive.addfile(link)
+    destination = tmp_path / "checkout"
+    destination.mkdir()
+
+    assert extract_archive(archive_path, destination, {".py"}, max_file_size=1024) == 0
+    assert not (destination / "repo" / "passwd.py").exists()
+
+
+def test_rejects_archives_that_expand_too_far(tmp_path):
+    archive = make_zip(tmp_path / "upload", [(f"repo/{i}.txt", b"0" * 4096) for i in range(4)])
+    destination = tmp_path / "checkout"
+    destination.mkdir()
+
+    with pytest.raises(ArchiveError, match="expands"):
+        extract_archive(archive, destination, {".py"}, max_file_size=1024, max_total_bytes=10000)
+    with pytest.raises(ArchiveError, match="entries"):
+        extract_archive(archive, destination, {".py"}, max_file_size=1024, max_files=3)
+
+
+def test_skips_highly_compressed_members(tmp_path):
+    archive = make_zip(tmp_path / "upload", [("repo/zeros.py", b"0" * 100_000)])
+    destination = tmp_path / "checkout"
+    destination.mkdir()
+
+    assert extract_archive(archive, destination, {".py"}, max_file_size=1024 * 1024, max_ratio=100) == 0
+
+
+def test_rejects_unknown_formats(tmp_path):
+    archive = tmp_path / "upload"
+    archive.write_bytes(b"not an archive")
+
+    with pytest.raises(ArchiveError, match="Unsupported"):
+        extract_archive(archive, tmp_path, {".py"}, max_file_size=1024)
+
+
+def test_worker_processes_uploaded_archive(tmp_path, monkeypatch):
+    def fake_sloptimize(code, routing_policy=None):
+        return SloptimizeResult(
+            source_code=code,
+            assessment=OptimizationAssessment(score=3.0, metrics={}, recommendations=None),
+            integration_considerations=[],
+        )
+
+    monkeypatch.setattr(worker, "sloptimize", fake_sloptimize)
+    archive = make_tar(tmp_path / "upload.tar.gz", [("repo/app.py", CODE.encode())])
+    db = Database()
+    job_id = db.create_jobs([{"repo_url": "upload:test", "source_archive": str(archive)}])[0]
+
+    asyncio.run(worker.RepositoryProcessor(job_id, "upload:test").process())
+
+    assert db.get_job(job_id)["status"] == JobStatus.COMPLETED
+    assert [result["file_path"] for result in db.get_job_results(job_id)] == ["repo/app.py"]
+    assert not archive.exists()
@@ -0,0 +1,99 @@
+"""
+Tests for the sloptimize database layer
+"""
+
+import pytest
+
+from sloptimize.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / "sloptimize.db"))
+
+
+def save_result(db: Database, job_id: str, score: float, metrics: dict) -> str:
+    return db.save_file_result(
+        job_id=job_id,
+        file_path=f"module_{score}.py",
+        original_code="def f():\n    pass\n",
+        optimized_code="def f():\n    pass\n",
+        score=score,
+        metrics=metrics,
+        integration_considerations=[],
+    )
+
+
+def test_job_stats_updated_on_save(db):
+    job_id = db.create_job("https://github.com/octocat/Hello-World.git")
+    save_result(db, job_id, 7.5, {"performance_gain": "2x faster", "readability_score": None})
+    save_result(db, job_id, 2.0, {"performance_gain": "None", "readability_score": "Improved"})
+    save_result(db, job_id, 7.9, {"performance_gain": "Fewer allocations"})
+
+    stats = db.get_job_stats(job_id)
+
+    assert stats["result_count"] == 3
+    assert stats["score_sum"] == pytest.approx(17.4)
+    assert stats["score_min"] == 2.0
+    assert stats["score_max"] == 7.9
+    assert stats["score_histogram"] == {"7.0": 2, "2.0": 1}
+    assert stats["metric_tallies"] == {"performance_gain": 2, "readability_score": 1}
+
+
+def test_job_stats_rebuilt_for_legacy_jobs(db):
+    job_id = db.create_job("https://github.com/octocat/Hello-World.git")
+    save_result(db, job_id, 4.0, {"performance_gain": "Minor"})
+    with db._connect() as conn:
+        conn.execute("DELETE FROM job_stats")
+
+    stats = db.get_job_stats(job_id)
+
+    assert stats["result_count"] == 1
+    assert stats["metric_tallies"] == {"performance_gain": 1}
+    with db._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM job_stats").fetchone()[0] == 1
+
+
+def test_job_stats_empty_job(db, monkeypatch):
+    job_id = db.create_job("https://github.com/octocat/Hello-World.git")
+    # New jobs start with a stats row; only legacy jobs are rebuilt
+    monkeypatch.setattr(db, "rebuild_job_stats", None)
+
+    stats = db.get_job_stats(job_id)
+
+    assert stats["result_count"] == 0
+    assert stats["score_min"] is None
+
+
+def test_rate_limit_bucket_refills(db, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("sloptimize.database.time.time", lambda: now)
+
+    assert [db.take_rate_limit_token("llm", rate=1, burst=2) for _ in range(3)] == [0, 0, 1.0]
+    now += 0.5
+    assert db.take_rate_limit_token("llm", rate=1, burst=2) == pytest.approx(0.5)
+    now += 0.5
+    assert db.take_rate_limit_token("llm", rate=1, burst=2) == 0
+
+
+def test_cached_result_expires(db, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("sloptimize.database.time.time", lambda: now)
+
+    db.store_cached_result("key", "value", max_age=10)
+    assert db.get_cached_result("key", max_age=10) == "value"
+    now += 11
+    assert db.get_cached_result("key", max_age=10) is None
+
+
+def test_file_result_usage_is_stored(db):
+    job_id = db.create_job("https://example.com/repo.git")
+    db.save_file_result(
+        job_id=job_id, file_path="a.py", original_code="x = 1\n", optimized_code="x = 1\n",
+        score=1.0, metrics={}, integration_considerations=[],
+        input_tokens=100, output_tokens=40, cached_tokens=20, llm_retries=1, duration_seconds=2.5,
+    )
+
+    result = db.get_job_results(job_id)[0]
+    assert (result["input_tokens"], result["output_tokens"], result["cached_tokens"]) == (100, 40, 20)
+    assert (result["llm_retries"], result["duration_seconds"]) == (1, 2.5)
@@ -0,0 +1,189 @@
+"""
+Tests for the LLM client wrappers
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+from sloptimize.llm import (
+    CancelToken,
+    CassetteClient,
+    CassetteMiss,
+    CompletionCancelled,
+    FakeClient,
+    FakeProviderError,
+    LLMClient,
+)
+from sloptimize.main import LLMOptimizationResponse
+from sloptimize.tracing import span
+
+
+class Answer(BaseModel):
+    value: int
+
+
+class FakeStream:
+    """Stands in for the OpenAI responses stream, yielding text deltas until closed"""
+
+    def __init__(self, deltas, on_delta=None):
+        self.deltas = deltas
+        self.on_delta = on_delta
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def __iter__(self):
+        for index in range(self.deltas):
+            if self.closed:
+                raise ConnectionError("stream closed")
+            if self.on_delta:
+                self.on_delta(index)
+            yield SimpleNamespace(type="response.output_text.delta", delta="x")
+
+    def close(self):
+        self.closed = True
+
+    def get_final_response(self):
+        return SimpleNamespace(output_parsed=Answer(value=42), usage=None)
+
+
+def make_client(stream):
+    responses = SimpleNamespace(stream=lambda **kwargs: stream)
+    return LLMClient(client=SimpleNamespace(responses=responses), model="test")
+
+
+def test_stream_reports_progress():
+    stream = FakeStream(3)
+    progress = []
+
+    answer = make_client(stream)([], Answer, on_progress=lambda message, tokens: progress.append((message, tokens)))
+
+    assert answer == Answer(value=42)
+    assert progress == [
+        ("Request sent", 0),
+        ("Streaming response", 1),
+        ("Streaming response", 2),
+        ("Streaming response", 3),
+    ]
+
+
+def test_cancel_closes_stream():
+    cancel_token = CancelToken()
+    stream = FakeStream(10, on_delta=lambda index: index == 2 and cancel_token.cancel())
+
+    with pytest.raises(CompletionCancelled):
+        make_client(stream)([], Answer, cancel_token=cancel_token)
+
+    assert stream.closed
+
+
+def test_cancel_before_request():
+    cancel_token = CancelToken()
+    cancel_token.cancel()
+    called = threading.Event()
+
+    with pytest.raises(CompletionCancelled):
+        make_client(FakeStream(1, on_delta=lambda index: called.set()))([], Answer, cancel_token=cancel_token)
+
+    assert not called.is_set()
+
+
+def fake_messages(code):
+    return [{"role": "system", "content": "prompt"}, {"role": "user", "content": code}]
+
+
+def test_fake_client_is_deterministic():
+    client = FakeClient(latency_median=0, tokens_per_second=0, seed=7)
+    progress = []
+
+    first = client(fake_messages("x = 1\n" * 8), LLMOptimizationResponse,
+                   on_progress=lambda message, tokens: progress.append((message, tokens)))
+    second = client(fake_messages("x = 1\n" * 8), LLMOptimizationResponse)
+
+    assert first == second
+    assert first.optimized_code == "x = 1\n" * 8
+    assert progress[0] == ("Request sent", 0)
+    assert progress[-1] == ("Streaming response", 12)
+
+
+def test_fake_client_injects_errors():
+    client = FakeClient(latency_median=0, error_rate=0.5)
+    outcomes = []
+    for index in range(200):
+        try:
+            client(fake_messages(f"x = {index}"), LLMOptimizationResponse)
+            outcomes.append(True)
+        except FakeProviderError:
+            outcomes.append(False)
+
+    assert 60 < outcomes.count(False) < 140
+
+
+def test_fake_client_cancel_interrupts_latency():
+    cancel_token = CancelToken()
+    threading.Timer(0.05, cancel_token.cancel).start()
+
+    with pytest.raises(CompletionCancelled):
+        FakeClient(latency_median=30, latency_sigma=0)(
+            fake_messages("x = 1"), LLMOptimizationResponse, cancel_token=cancel_token
+        )
+
+
+class CountingClient:
+    """Recording provider that answers with the number of calls made so far"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, messages, response_model, **kwargs):
+        self.calls += 1
+        return response_model(value=self.calls)
+
+
+def test_cassette_records_then_replays(tmp_path):
+    provider = CountingClient()
+    recorder = CassetteClient(str(tmp_path), "replay", "openai", client=provider)
+
+    first = recorder(fake_messages("x = 1\n"), Answer)
+    # Trailing whitespace does not change the request key
+    replayed = CassetteClient(str(tmp_path), "strict", "openai")(fake_messages("x = 1   \n\n"), Answer)
+
+    assert first == replayed == Answer(value=1)
+    assert provider.calls == 1
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    assert not list(tmp_path.glob(".*.partial"))
+
+
+def test_cassette_replays_recorded_usage(tmp_path):
+    recorder = CassetteClient(str(tmp_path), "replay", "openai", client=FakeClient(latency_median=0))
+
+    with span("record") as recorded:
+        recorder(fake_messages("x = 1\n" * 8), LLMOptimizationResponse)
+    with span("replay") as replayed:
+        CassetteClient(str(tmp_path), "strict", "openai")(fake_messages("x = 1\n" * 8), LLMOptimizationResponse)
+
+    assert recorded.usage()["output_tokens"] > 0
+    assert replayed.usage() == recorded.usage()
+
+
+def test_cassette_strict_mode_fails_on_miss(tmp_path):
+    with pytest.raises(CassetteMiss):
+        CassetteClient(str(tmp_path), "strict", "openai")(fake_messages("x = 1"), Answer)
+
+
+def test_cassette_record_mode_overwrites(tmp_path):
+    provider = CountingClient()
+    recorder = CassetteClient(str(tmp_path), "record", "openai", client=provider)
+
+    recorder(fake_messages("x = 1"), Answer)
+    recorder(fake_messages("x = 1"), Answer)
+
+    assert provider.calls == 2
+    assert CassetteClient(str(tmp_path), "strict", "openai")(fake_messages("x = 1"), Answer) == Answer(value=2)
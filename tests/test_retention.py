@@ -0,0 +1,77 @@
+"""
+Tests for job retention, archival and re-hydration
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from sloptimize.database import Database, JobStatus
+from sloptimize.retention import rehydrate_job, run_retention
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / "sloptimize.db"))
+
+
+def create_finished_job(db: Database, results: int, age_days: float) -> str:
+    job_id = db.create_job("https://github.com/octocat/Hello-World.git")
+    for index in range(results):
+        db.save_file_result(
+            job_id=job_id,
+            file_path=f"pkg/module_{index}.py",
+            original_code="x = 1\n" * 100,
+            optimized_code="x = 1\n",
+            score=float(index),
+            metrics={"performance_gain": "Faster"},
+            integration_considerations=["Signature changed"],
+        )
+    db.update_job_status(job_id, JobStatus.COMPLETED)
+    with db._connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET completed_at = ? WHERE id = ?",
+            (datetime.now() - timedelta(days=age_days), job_id),
+        )
+    return job_id
+
+
+def test_retention_archives_only_old_jobs(db, tmp_path):
+    old_job = create_finished_job(db, results=7, age_days=40)
+    new_job = create_finished_job(db, results=3, age_days=1)
+
+    summary = run_retention(db, max_age_days=30, batch_size=2, archive_dir=tmp_path / "archives")
+
+    assert summary == {"archived_jobs": 1, "deleted_results": 7}
+    assert db.get_job_results(old_job) == []
+    assert len(db.get_job_results(new_job)) == 3
+    job = db.get_job(old_job)
+    assert job["archived_at"] is not None
+    assert os.path.exists(job["archive_path"])
+    assert db.get_job_stats(old_job)["result_count"] == 7
+
+
+def test_rehydrate_restores_results(db, tmp_path):
+    job_id = create_finished_job(db, results=5, age_days=40)
+    expected = db.get_job_results(job_id)
+    run_retention(db, max_age_days=30, archive_dir=tmp_path / "archives")
+
+    assert rehydrate_job(db, job_id) == 5
+    assert db.get_job_results(job_id) == expected
+    assert db.get_job(job_id)["archived_at"] is None
+
+    # Re-hydrated jobs are not immediately archived again
+    assert run_retention(db, max_age_days=30, archive_dir=tmp_path / "archives")["archived_jobs"] == 0
+
+
+def test_purge_stops_once_job_is_rehydrated(db, tmp_path):
+    job_id = create_finished_job(db, results=5, age_days=40)
+    expected = db.get_job_results(job_id)
+    db.mark_job_archived(job_id, "unused.jsonl.gz")
+    assert db.delete_job_results(job_id, batch_size=2) == 5
+
+    # A re-hydration between batches clears archived_at, so the remaining batches delete nothing
+    db.restore_job_results(job_id, iter(expected))
+    assert db.delete_job_results(job_id, batch_size=2) == 0
+    assert len(db.get_job_results(job_id)) == 5
@@ -0,0 +1,105 @@
+"""
+Tests for model cascade routing
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from sloptimize import budget, main
+from sloptimize.llm import FakeClient, FakeProviderError
+from sloptimize.routing import FAST_TIER, STRONG_TIER, ModelRouter, escalation_reason, route
+from sloptimize.tracing import span
+
+CODE = "def double(items):\n    return [item * 2 for item in items]\n"
+
+
+class EditingClient(FakeClient):
+    """A fake model that changes the code it is given, so its answers are not escalated as unchanged"""
+
+    def __call__(self, *args, **kwargs):
+        completion = super().__call__(*args, **kwargs)
+        return completion.model_copy(update={"optimized_code": completion.optimized_code + "DOUBLED = double\n"})
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """Route between instant fake models, so tests see which tier answered"""
+    router = ModelRouter("fake")
+    router.fast = EditingClient(latency_median=0, model="fake-fast")
+    router.strong = FakeClient(latency_median=0, model="fake-strong")
+    monkeypatch.setattr(main, "router", router)
+    return router
+
+
+def test_route_by_policy_size_and_complexity():
+    branchy = "".join(f"if x == {index}:\n    y = {index}\n" for index in range(50))
+
+    assert route(CODE, "strong") == (STRONG_TIER, None)
+    assert route("x = 1\n" * 5000, "fast") == (FAST_TIER, None)
+    assert route(CODE, "cascade") == (FAST_TIER, None)
+    assert route("x = 1\n" * 5000, "cascade") == (STRONG_TIER, "size")
+    assert route(branchy, "cascade") == (STRONG_TIER, "complexity")
+    with pytest.raises(ValueError):
+        route(CODE, "cheapest")
+
+
+def test_escalation_reasons():
+    def answer(optimized_code):
+        return SimpleNamespace(optimized_code=optimized_code)
+
+    assert escalation_reason(CODE, answer("def double(items):\n    return [item + item for item in items]\n")) is None
+    assert escalation_reason(CODE, None) == "invalid"
+    assert escalation_reason(CODE, answer("  \n")) == "empty"
+    assert escalation_reason(CODE, answer("def double(items:\n")) == "syntax"
+    # Reformatting and comments are not a change
+    assert escalation_reason(CODE, answer(CODE)) == "unchanged"
+    assert escalation_reason(CODE, answer("def double( items ):\n    # Twice each\n    return [item*2 for item in items]\n")) == "unchanged"
+    # Snippets that are not Python to begin with are not syntax checked, only compared ignoring whitespace
+    assert escalation_reason("fn main() {}", answer("fn main( {}")) is None
+    assert escalation_reason("fn main() {}", answer("fn main()  {\n}")) == "unchanged"
+
+
+def test_cascade_answers_from_fast_model(router):
+    result = main.sloptimize(CODE, routing_policy="cascade")
+
+    assert (result.model, result.model_tier) == ("fake-fast", FAST_TIER)
+
+
+def test_cascade_escalates_unchanged_fast_answer(router):
+    router.fast = FakeClient(latency_median=0, model="fake-fast")
+
+    result = main.sloptimize(CODE, routing_policy="cascade")
+
+    assert (result.model, result.model_tier) == ("fake-strong", STRONG_TIER)
+
+
+def test_escalated_request_pays_each_tier_its_price(router, monkeypatch):
+    monkeypatch.setattr(budget, "PRICES", {STRONG_TIER: (10.0, 10.0, 20.0), FAST_TIER: (1.0, 1.0, 2.0)})
+    router.fast = FakeClient(latency_median=0, model="fake-fast")
+
+    with span("file") as file:
+        result = main.sloptimize(CODE, routing_policy="cascade")
+
+    # Both models answered the same prompt, so each spent half of the tokens
+    input_tokens, output_tokens = result.usage.input_tokens // 2, result.usage.output_tokens // 2
+    assert file.cost_usd == pytest.approx(
+        (input_tokens * 1.0 + output_tokens * 2.0 + input_tokens * 10.0 + output_tokens * 20.0) / 1_000_000
+    )
+
+
+def test_cascade_escalates_failed_fast_answer(router):
+    router.fast.error_rate = 1.0
+
+    result = main.sloptimize(CODE, routing_policy="cascade")
+
+    assert (result.model, result.model_tier) == ("fake-strong", STRONG_TIER)
+    # The failed call reported no usage, so only the strong model's tokens are counted
+    assert result.usage == main.sloptimize(CODE, routing_policy="strong").usage
+
+
+def test_fast_policy_does_not_escalate(router):
+    router.fast.error_rate = 1.0
+
+    with pytest.raises(FakeProviderError):
+        main.sloptimize(CODE, routing_policy="fast")
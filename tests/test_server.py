@@ -0,0 +1,261 @@
+"""
+Tests for the sloptimize MCP server tools
+"""
+
+import asyncio
+import subprocess
+import threading
+import time
+
+import pytest
+from fastmcp import Client
+
+from sloptimize import server
+from sloptimize.database import AsyncDatabase, Database
+from sloptimize.main import OptimizationAssessment, SloptimizeResult
+from sloptimize.server.shared import SharedRateLimiter, SharedResultCache
+
+
+@pytest.fixture(autouse=True)
+def shared_db(monkeypatch, tmp_path):
+    db = AsyncDatabase(Database(str(tmp_path / "sloptimize.db")))
+    monkeypatch.setattr(server, "result_cache", SharedResultCache(db, ttl=60))
+    monkeypatch.setattr(server, "rate_limiter", SharedRateLimiter(db, "llm:test", per_minute=0, burst=1))
+    return db
+
+
+def optimized(code: str) -> SloptimizeResult:
+    return SloptimizeResult(
+        source_code=code.upper(),
+        assessment=OptimizationAssessment(score=2.0, metrics={}, recommendations=None),
+        integration_considerations=[],
+    )
+
+
+def call_tool(name: str, arguments: dict):
+    async def call():
+        async with Client(server.mcp) as client:
+            return await client.call_tool(name, arguments)
+
+    return asyncio.run(call())
+
+
+def test_batch_returns_results_and_errors_by_name(monkeypatch):
+    def fake_sloptimize(code, *args):
+        if "boom" in code:
+            raise RuntimeError("provider unavailable")
+        return optimized(code)
+
+    monkeypatch.setattr(server, "sloptimize", fake_sloptimize)
+
+    result = call_tool("sloptimize_batch", {"snippets": {"a": "x = 1", "b": "boom", "c": "y = 2"}})
+
+    items = result.structured_content
+    assert items["a"]["result"]["source_code"] == "X = 1"
+    assert items["b"] == {"result": None, "error": "RuntimeError: provider unavailable"}
+    assert items["c"]["result"]["source_code"] == "Y = 2"
+
+
+def test_batch_concurrency_is_bounded(monkeypatch):
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_sloptimize(code, *args):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return optimized(code)
+
+    monkeypatch.setattr(server, "sloptimize", slow_sloptimize)
+    monkeypatch.setattr(server, "MCP_BATCH_CONCURRENCY", 2)
+
+    result = call_tool("sloptimize_batch", {"snippets": {str(i): f"x = {i}" for i in range(6)}})
+
+    assert len(result.structured_content) == 6
+    assert peak == 2
+
+
+def test_batch_size_limit(monkeypatch):
+    monkeypatch.setattr(server, "MCP_BATCH_MAX_SNIPPETS", 1)
+
+    with pytest.raises(Exception, match="At most 1"):
+        call_tool("sloptimize_batch", {"snippets": {"a": "x = 1", "b": "y = 2"}})
+
+
+def test_sloptimize_reports_progress(monkeypatch):
+    def streaming_sloptimize(code, on_progress, cancel_token):
+        on_progress("Request sent", 0)
+        for tokens in range(1, 4):
+            on_progress("Streaming response", tokens)
+        return optimized(code)
+
+    monkeypatch.setattr(server, "sloptimize", streaming_sloptimize)
+    monkeypatch.setattr(server, "MCP_PROGRESS_INTERVAL", 0)
+    updates = []
+
+    async def progress_handler(progress, total, message):
+        updates.append((progress, message))
+
+    async def call():
+        async with Client(server.mcp, progress_handler=progress_handler) as client:
+            return await client.call_tool("sloptimize", {"code": "x = 1"})
+
+    result = asyncio.run(call())
+
+    assert result.structured_content["source_code"] == "X = 1"
+    assert updates[:2] == [(0, "Queued"), (1, "Request sent")]
+    assert updates[-1] == (4, "Streaming response (3 tokens)")
+
+
+def test_cancelled_call_cancels_llm_request(monkeypatch):
+    tokens = []
+
+    def blocking_sloptimize(code, on_progress, cancel_token):
+        tokens.append(cancel_token)
+        deadline = time.monotonic() + 5
+        while not cancel_token.cancelled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        cancel_token.raise_if_cancelled()
+
+    class FakeContext:
+        async def report_progress(self, progress, total=None, message=None):
+            pass
+
+    monkeypatch.setattr(server, "sloptimize", blocking_sloptimize)
+
+    async def call_and_cancel():
+        task = asyncio.create_task(server.sloptimize_tool("x = 1", FakeContext()))
+        while not tokens:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(call_and_cancel())
+
+    assert tokens[0].cancelled
+
+
+def test_batch_reports_progress_per_snippet(monkeypatch):
+    def streaming_sloptimize(code, on_progress, cancel_token):
+        on_progress("Request sent", 0)
+        return optimized(code)
+
+    monkeypatch.setattr(server, "sloptimize", streaming_sloptimize)
+    monkeypatch.setattr(server, "MCP_BATCH_CONCURRENCY", 1)
+    updates = []
+
+    async def progress_handler(progress, total, message):
+        updates.append((progress, total, message))
+
+    async def call():
+        async with Client(server.mcp, progress_handler=progress_handler) as client:
+            return await client.call_tool("sloptimize_batch", {"snippets": {"a": "x = 1", "b": "y = 2"}})
+
+    asyncio.run(call())
+
+    assert updates == [
+        (0, 2, "Queued"),
+        (0, 2, "a: Request sent"),
+        (1, 2, "a: done"),
+        (1, 2, "b: Request sent"),
+        (2, 2, "b: done"),
+    ]
+
+
+def test_cancelled_batch_cancels_llm_requests(monkeypatch):
+    tokens = []
+
+    def blocking_sloptimize(code, on_progress, cancel_token):
+        tokens.append(cancel_token)
+        deadline = time.monotonic() + 5
+        while not cancel_token.cancelled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        cancel_token.raise_if_cancelled()
+
+    class FakeContext:
+        async def report_progress(self, progress, total=None, message=None):
+            pass
+
+    monkeypatch.setattr(server, "sloptimize", blocking_sloptimize)
+
+    async def call_and_cancel():
+        task = asyncio.create_task(server.sloptimize_batch({"a": "x = 1", "b": "y = 2"}, FakeContext()))
+        while len(tokens) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Let the flights observe their cancellation
+        await asyncio.sleep(0.05)
+
+    asyncio.run(call_and_cancel())
+
+    assert all(token.cancelled for token in tokens)
+
+
+def test_diff_format_returns_applicable_patch(monkeypatch, tmp_path):
+    original = "".join(f"value_{i} = {i}\n" for i in range(40))
+    updated = original.replace("value_20 = 20", "value_20 = 21")
+    monkeypatch.setattr(server, "sloptimize", lambda code, *args: optimized(code).model_copy(update={"source_code": updated}))
+
+    result = call_tool("sloptimize", {"code": original, "format": "diff"}).structured_content
+
+    assert result["format"] == "diff"
+    assert result["source_code"] is None
+    assert len(result["diff"]) < len(updated)
+    target = tmp_path / "snippet.py"
+    target.write_text(original)
+    subprocess.run(["patch", "-s", "-p1", "-d", str(tmp_path)], input=result["diff"], text=True, check=True)
+    assert target.read_text() == updated
+
+
+def test_diff_format_falls_back_to_full_code(monkeypatch):
+    monkeypatch.setattr(server, "sloptimize", lambda code, *args: optimized(code))
+
+    result = call_tool("sloptimize", {"code": "x = 1", "format": "diff"}).structured_content
+
+    assert result["format"] == "full"
+    assert result["source_code"] == "X = 1"
+    assert result["diff"] is None
+
+
+def test_cached_result_skips_provider(monkeypatch):
+    calls = []
+
+    def counting_sloptimize(code, *args):
+        calls.append(code)
+        return optimized(code)
+
+    monkeypatch.setattr(server, "sloptimize", counting_sloptimize)
+
+    first = call_tool("sloptimize", {"code": "x = 1"}).structured_content
+    batch = call_tool("sloptimize_batch", {"snippets": {"a": "x = 1", "b": "y = 2"}}).structured_content
+
+    assert calls == ["x = 1", "y = 2"]
+    assert first["source_code"] == batch["a"]["result"]["source_code"] == "X = 1"
+
+
+def test_rate_limiter_waits_for_tokens(shared_db):
+    limiter = SharedRateLimiter(shared_db, "llm:test", per_minute=600, burst=1)
+
+    async def acquire_twice():
+        await limiter.acquire()
+        started = time.monotonic()
+        await limiter.acquire()
+        return time.monotonic() - started
+
+    # The second request waits for the bucket to refill; the upper bound leaves room for parallel test runs
+    assert 0.05 <= asyncio.run(acquire_twice()) < 0.5
+
+
+def test_http_app_serves_stateless_streamable_http():
+    app = server.create_http_app()
+
+    assert app.state.path == "/"
+    assert app.state.transport_type == "streamable-http"
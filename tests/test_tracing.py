@@ -0,0 +1,68 @@
+"""
+Tests for sloptimize tracing spans
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from sloptimize import tracing
+from sloptimize.llm import FakeClient
+from sloptimize.main import LLMOptimizationResponse
+from sloptimize.tracing import SpanExporter, record_retry, record_usage, span
+
+
+@pytest.fixture
+def trace_file(monkeypatch, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(tracing, "_exporter", SpanExporter(trace_file=str(path), otlp_endpoint=""))
+    return path
+
+
+def read_spans(path):
+    return {record["name"]: record for record in map(json.loads, path.read_text().splitlines())}
+
+
+def test_usage_rolls_up_to_enclosing_spans(trace_file):
+    with span("job", job_id="job-1") as job:
+        for tokens in (10, 20):
+            with span("file") as file:
+                with span("provider.call"):
+                    record_usage(tokens, tokens // 2, cached_tokens=tokens // 10)
+                    record_retry()
+                assert file.usage() == {
+                    "input_tokens": tokens, "output_tokens": tokens // 2,
+                    "cached_tokens": tokens // 10, "llm_retries": 1,
+                }
+
+    assert job.usage() == {"input_tokens": 30, "output_tokens": 15, "cached_tokens": 3, "llm_retries": 2}
+    spans = read_spans(trace_file)
+    assert spans["provider.call"]["parent_id"] == spans["file"]["span_id"]
+    assert spans["file"]["parent_id"] == spans["job"]["span_id"]
+    assert {record["trace_id"] for record in spans.values()} == {job.trace_id}
+    assert spans["job"]["attributes"]["job_id"] == "job-1"
+
+
+def test_span_records_errors(trace_file):
+    with pytest.raises(ValueError):
+        with span("parse"):
+            raise ValueError("bad response")
+
+    record = read_spans(trace_file)["parse"]
+    assert record["error"] == "ValueError: bad response"
+    assert record["duration"] >= 0
+
+
+def test_spans_follow_threads_and_tasks(trace_file):
+    client = FakeClient(latency_median=0)
+
+    async def process():
+        with span("file") as file:
+            await asyncio.to_thread(client, [{"role": "user", "content": "x = 1\n" * 8}], LLMOptimizationResponse)
+            return file.usage()
+
+    assert asyncio.run(process())["output_tokens"] == 12
+    spans = read_spans(trace_file)
+    assert spans["provider.call"]["parent_id"] == spans["file"]["span_id"]
+    assert spans["provider.call"]["attributes"]["model"] == "fake"
@@ -0,0 +1,103 @@
+"""
+Tests for the repository worker
+"""
+
+import asyncio
+import functools
+import json
+import zipfile
+
+import pytest
+
+from sloptimize.database import Database, JobStatus
+from sloptimize.main import OptimizationAssessment, SloptimizeResult
+from sloptimize.tracing import record_usage
+from sloptimize.worker import main as worker
+from sloptimize.worker.main import RepositoryProcessor
+from sloptimize.worker.profiling import JobProfiler
+
+FILES = {
+    "app/core.py": "x = 1\n" * 50,
+    "app/util.py": "x = 1\n" * 10,
+    "app/big.py": "x = 1\n" * 100,
+    "tests/test_core.py": "x = 1\n" * 500,
+    "examples/demo.py": "x = 1\n" * 400,
+}
+
+
+@pytest.fixture
+def db():
+    return Database()
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Stub sloptimize to spend 100 input tokens per file, recording the files in the order they ran"""
+    calls = []
+
+    def fake_sloptimize(code: str, routing_policy=None) -> SloptimizeResult:
+        calls.append(code)
+        record_usage(100, 0)
+        return SloptimizeResult(
+            source_code=code,
+            assessment=OptimizationAssessment(score=5.0, metrics={}, recommendations=None),
+            integration_considerations=[],
+        )
+
+    monkeypatch.setattr(worker, "sloptimize", fake_sloptimize)
+    monkeypatch.setattr(worker, "FILE_CONCURRENCY", 1)
+    return calls
+
+
+def upload_job(db, tmp_path, **budget) -> str:
+    archive = tmp_path / "repo.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for name, code in FILES.items():
+            zf.writestr(name, code)
+    return db.create_jobs([{'repo_url': "upload:budget", 'source_archive': str(archive), **budget}])[0]
+
+
+def test_budget_stops_job_with_highest_priority_files(db, processed, tmp_path):
+    job_id = upload_job(db, tmp_path, max_tokens=250)
+
+    asyncio.run(RepositoryProcessor(job_id, "upload:budget").process())
+
+    job = db.get_job(job_id)
+    assert job["status"] == JobStatus.PARTIAL
+    assert job["error_message"] == "Budget reached after 3 of 5 files"
+    assert job["input_tokens"] == 300
+    # Application code runs first, largest first; tests and examples were never started
+    assert sorted(result["file_path"] for result in db.get_job_results(job_id)) == [
+        "app/big.py", "app/core.py", "app/util.py",
+    ]
+    assert processed == [FILES["app/big.py"], FILES["app/core.py"], FILES["app/util.py"]]
+
+
+def test_job_without_budget_completes(db, processed, tmp_path):
+    job_id = upload_job(db, tmp_path)
+
+    asyncio.run(RepositoryProcessor(job_id, "upload:budget").process())
+
+    job = db.get_job(job_id)
+    assert job["status"] == JobStatus.COMPLETED
+    assert job["input_tokens"] == 500
+    assert len(processed) == 5
+
+
+def test_profiled_job_writes_artifacts(db, processed, tmp_path, monkeypatch):
+    # Sample often enough that even this short job is sampled
+    monkeypatch.setattr(worker, "JobProfiler", functools.partial(JobProfiler, interval=0.001))
+    job_id = upload_job(db, tmp_path)
+    processor = RepositoryProcessor(job_id, "upload:budget", profile_dir=str(tmp_path / "profiles"))
+
+    asyncio.run(processor.process())
+
+    profile_dir = tmp_path / "profiles" / job_id
+    assert db.get_job(job_id)["profile_path"] == str(profile_dir)
+    summary = json.loads((profile_dir / "summary.json").read_text())
+    assert summary["thread_samples"] > 0
+    assert set(summary["loop_lag_seconds"]) == {"p50", "p99", "max"}
+    for line in (profile_dir / "threads.collapsed").read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+    assert (profile_dir / "tasks.collapsed").exists()